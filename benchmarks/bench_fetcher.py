@@ -0,0 +1,64 @@
+"""
+Sequential requests versus the concurrent pooled Fetcher, against the local stub API.
+
+Run from the repository root:
+    python -m benchmarks.bench_fetcher
+"""
+import time
+
+import numpy as np
+import requests
+
+from src.fetcher import Fetcher
+from benchmarks.stub_foursquare import StubFoursquare
+
+CATEGORIES = 20
+CITIES = 50
+LATENCY = 0.02  # seconds per response
+CONCURRENCY = [8, 32, 64]
+# The sequential baseline is timed on a sample and extrapolated to the whole sweep
+SEQUENTIAL_SAMPLE = 100
+
+def sweep():
+    rng = np.random.default_rng(0)
+    cities = list(zip(rng.uniform(-60, 60, CITIES), rng.uniform(-180, 180, CITIES)))
+    return [{"query": f"category{c}", "lat": lat, "lon": lon, "radius": 500}
+            for c in range(CATEGORIES) for lat, lon in cities]
+
+def sequential(url, searches):
+    # The original request_4sq: one blocking requests.get (and one new connection) per call
+    for search in searches:
+        requests.get(f"{url}?query={search['query']}&ll={search['lat']}%2C{search['lon']}"
+                     f"&radius={search['radius']}&sort=DISTANCE&limit=50").json()
+
+def main():
+    searches = sweep()
+    print(f"{len(searches)} searches ({CATEGORIES} categories x {CITIES} cities), {LATENCY * 1000:.0f} ms latency")
+
+    with StubFoursquare(latency=LATENCY) as stub:
+        start = time.perf_counter()
+        sequential(stub.url, searches[:SEQUENTIAL_SAMPLE])
+        elapsed = (time.perf_counter() - start) * len(searches) / SEQUENTIAL_SAMPLE
+        print(f"{'sequential (extrapolated)':>28}: {elapsed:7.2f} s")
+
+        for workers in CONCURRENCY:
+            connections = stub.connections
+            fetcher = Fetcher(max_workers=workers, base_url=stub.url, token="stub")
+            start = time.perf_counter()
+            responses = fetcher.search_many(searches)
+            elapsed = time.perf_counter() - start
+            fetcher.close()
+            assert len(responses) == len(searches)
+            print(f"{f'fetcher, {workers} workers':>28}: {elapsed:7.2f} s "
+                  f"({stub.connections - connections} connections opened)")
+
+    with StubFoursquare(latency=LATENCY, throttle_rate=0.1) as stub:
+        fetcher = Fetcher(max_workers=32, base_url=stub.url, token="stub", retries=5)
+        start = time.perf_counter()
+        fetcher.search_many(searches)
+        elapsed = time.perf_counter() - start
+        fetcher.close()
+        print(f"{'fetcher, 10% throttled':>28}: {elapsed:7.2f} s ({stub.throttled} responses retried)")
+
+if __name__ == "__main__":
+    main()
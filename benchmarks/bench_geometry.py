@@ -0,0 +1,62 @@
+"""
+Scaling benchmark for the city midpoint/radius computation.
+
+Run from the repository root:
+    python -m benchmarks.bench_geometry
+"""
+import itertools
+import time
+
+import geopy.distance
+import numpy as np
+
+from src import geometry
+
+SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+# The all-pairs geopy loop is only timed up to this size (1,000 offices already take over a minute)
+BRUTE_FORCE_MAX = 100
+
+def random_offices(n, seed=0):
+    """
+    Generates n office coordinates scattered around San Francisco.
+    """
+    rng = np.random.default_rng(seed)
+    lat = 37.7749 + rng.normal(0, 0.02, n)
+    lon = -122.4194 + rng.normal(0, 0.02, n)
+    return lat, lon
+
+def brute_force(lat, lon):
+    """
+    The original O(n^2) loop: geopy distance for every pair of offices.
+    """
+    max_distance = 0
+    point1, point2 = None, None
+    for (lat1, lon1), (lat2, lon2) in itertools.combinations(zip(lat, lon), 2):
+        distance = geopy.distance.distance((lat1, lon1), (lat2, lon2)).meters
+        if distance > max_distance:
+            max_distance, point1, point2 = distance, (lat1, lon1), (lat2, lon2)
+    return (point1[0] + point2[0]) / 2, (point1[1] + point2[1]) / 2, max_distance / 2
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    print(f"{'n':>10} {'brute force (s)':>16} {'diameter (s)':>13} {'mec (s)':>9} {'radius (m)':>11}")
+    for n in SIZES:
+        lat, lon = random_offices(n)
+        (_, _, radius), diameter_time = timed(geometry.midpoint_and_radius, lat, lon, method="diameter")
+        _, mec_time = timed(geometry.midpoint_and_radius, lat, lon, method="mec")
+
+        if n <= BRUTE_FORCE_MAX:
+            (_, _, brute_radius), brute_time = timed(brute_force, lat, lon)
+            assert abs(brute_radius - radius) < 1e-6 * radius, "hull diameter disagrees with brute force"
+            brute = f"{brute_time:16.3f}"
+        else:
+            brute = f"{'-':>16}"
+
+        print(f"{n:>10} {brute} {diameter_time:13.4f} {mec_time:9.4f} {radius:11.1f}")
+
+if __name__ == "__main__":
+    main()
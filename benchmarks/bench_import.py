@@ -0,0 +1,81 @@
+"""
+Import-time regression guard for the src package.
+
+Importing the modules must not open connections, query MongoDB or compute city
+geometry. The script imports src.visualization in a fresh interpreter with
+-X importtime and reports the real cold-import time, the heaviest third-party
+packages behind it and the time spent executing our own module bodies. It exits
+with a non-zero status if the budget of our own bodies is exceeded, a side effect
+is detected or a deferred dependency (MongoDB driver, plotting, HTTP, geodesics)
+is imported at module level.
+
+Most of the cold import is pandas (with numpy), which nearly every module uses at
+module level as its data type and which is therefore not deferred.
+
+Run from the repository root:
+    python -m benchmarks.bench_import
+"""
+import subprocess
+import sys
+
+# Time allowed for executing the bodies of our own modules (third-party imports excluded)
+OWN_BUDGET_MS = 50
+
+# Modules that must not be loaded just by importing the package
+FORBIDDEN_MODULES = ["pymongo", "folium", "matplotlib.pyplot", "requests", "geopy"]
+
+# Third-party packages listed in the report
+TOP_PACKAGES = 5
+
+CHECK = f"""
+import sys
+import src.visualization
+from src import config
+assert config._context is None, "a context (and MongoDB client) was created at import"
+loaded = [name for name in {FORBIDDEN_MODULES!r} if name in sys.modules]
+assert not loaded, f"imported at module level: {{loaded}}"
+"""
+
+def parse_importtime(stderr):
+    """
+    Parses the output of -X importtime.
+    Returns:
+    - Dictionary {module: (self_us, cumulative_us)}.
+    """
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def main():
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHECK], capture_output=True, text=True)
+    timings = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1])
+        return 1
+
+    own = {name: times for name, times in timings.items() if name == "src" or name.startswith("src.")}
+    own_ms = sum(self_us for self_us, _ in own.values()) / 1000
+    total_ms = timings.get("src.visualization", (0, 0))[1] / 1000
+    # Top-level packages loaded on the way (cumulative: a package includes what it imported first)
+    packages = sorted(((times[1], name) for name, times in timings.items()
+                       if "." not in name and name != "src" and not name.startswith("_")), reverse=True)
+
+    for name, (self_us, cumulative_us) in sorted(own.items()):
+        print(f"{name:<25} self {self_us / 1000:8.2f} ms   cumulative {cumulative_us / 1000:8.2f} ms")
+    print()
+    for cumulative_us, name in packages[:TOP_PACKAGES]:
+        print(f"{name:<25} cumulative {cumulative_us / 1000:8.2f} ms")
+    print(f"\ncold import src.visualization: {total_ms:.1f} ms "
+          f"(own module bodies {own_ms:.2f} ms, budget {OWN_BUDGET_MS} ms)")
+
+    if own_ms > OWN_BUDGET_MS:
+        print("FAIL: import-time budget exceeded")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
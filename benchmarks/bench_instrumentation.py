@@ -0,0 +1,54 @@
+"""
+Overhead of the instrumentation layer on a traced function, disabled and enabled, and the cost
+of tracing a real stage (venue loading on mongomock).
+
+Run from the repository root:
+    python -m benchmarks.bench_instrumentation
+"""
+import tempfile
+import time
+import timeit
+
+import mongomock
+
+from src import config
+from src import foursquare
+from src import instrumentation
+from benchmarks import synthetic
+
+CALLS = 1_000_000
+VENUES = 20_000  # per category
+
+def noop():
+    pass
+
+traced_noop = instrumentation.traced(noop)
+
+def per_call_ns(func):
+    return min(timeit.repeat(func, number=CALLS, repeat=3)) / CALLS * 1e9
+
+def main():
+    instrumentation.disable()
+    base = per_call_ns(noop)
+    disabled = per_call_ns(traced_noop)
+    instrumentation.enable()
+    enabled = per_call_ns(traced_noop)
+    instrumentation.disable()
+    instrumentation.reset()
+    print(f"plain call: {base:6.0f} ns, traced (disabled): {disabled:6.0f} ns, traced (enabled): {enabled:6.0f} ns")
+
+    with tempfile.TemporaryDirectory() as directory:
+        context = config.Context(cache_dir=directory, client=mongomock.MongoClient())
+        config.set_context(context)
+        synthetic.load(context, 0, VENUES)
+        for enabled in (False, True):
+            (instrumentation.enable if enabled else instrumentation.disable)()
+            start = time.perf_counter()
+            foursquare.load_venues()
+            print(f"load_venues ({4 * VENUES:,} venues), instrumentation {'on ' if enabled else 'off'}: "
+                  f"{time.perf_counter() - start:.3f} s")
+        instrumentation.disable()
+        print(f"spans recorded: {sum(stats['count'] for stats in instrumentation.report()['spans'].values())}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Map rendering of many points of interest: one folium.Marker per row versus the layer modes
+of visualization.add_points, timing the Python side and measuring the HTML written.
+
+Run from the repository root:
+    python -m benchmarks.bench_map
+"""
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+
+from src.visualization import add_points
+
+SIZES = [1_000, 10_000, 100_000]
+# The per-row markers are timed up to this size and extrapolated above it
+MARKERS_MAX = 10_000
+CENTER = (40.7128, -74.0060)
+
+def random_pois(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Latitude': CENTER[0] + rng.normal(0, 0.05, n),
+        'Longitude': CENTER[1] + rng.normal(0, 0.05, n),
+        'Name': [f'Venue {i}' for i in range(n)],
+    })
+
+def render(df, **kwargs):
+    start = time.perf_counter()
+    map = folium.Map(location=CENTER, zoom_start=12)
+    add_points(map, df, 'POIs', popup=df['Name'], **kwargs)
+    html = map.get_root().render()
+    return time.perf_counter() - start, len(html.encode())
+
+def main():
+    cases = [
+        ("markers (per row)", {"mode": "markers"}),
+        ("cluster", {"mode": "cluster"}),
+        ("geojson", {"mode": "geojson"}),
+        ("cluster, zoom 14", {"mode": "cluster", "zoom": 14}),
+        ("geojson, cap 5000", {"mode": "geojson", "max_points": 5000}),
+    ]
+    for n in SIZES:
+        df = random_pois(n)
+        print(f"{n:,} POIs")
+        for label, kwargs in cases:
+            if kwargs["mode"] == "markers" and n > MARKERS_MAX:
+                elapsed, size = render(df.iloc[:MARKERS_MAX], **kwargs)
+                elapsed, size = elapsed * n / MARKERS_MAX, size * n / MARKERS_MAX
+                label += " (extrapolated)"
+            else:
+                elapsed, size = render(df, **kwargs)
+            print(f"{label:>34}: {elapsed:6.2f} s, {size / 2 ** 20:7.2f} MiB of HTML")
+
+if __name__ == "__main__":
+    main()
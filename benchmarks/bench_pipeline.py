@@ -0,0 +1,197 @@
+"""
+End-to-end benchmark of the office-location pipeline on synthetic data (see benchmarks.synthetic).
+
+For every size n the database is loaded with n companies and n venues (spread over the
+Foursquare categories), then each stage is timed: ranking the cities, extracting the offices,
+the city geometry, the Foursquare query against the stub API, loading the venues, scoring
+and building the map. Every stage reports its time, throughput (documents per second), peak
+traced memory and, across sizes, its scaling exponent (slope of log time over log n: 1 is
+linear). Results can be saved as JSON and compared with a previous run, so a slower stage
+fails the run instead of going unnoticed.
+
+The in-process backend is mongomock, which cannot run bulk upserts: there the Foursquare
+stage fetches, normalizes and aggregates the venues without storing them. Pass --mongo-uri
+to benchmark a local mongod instead.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --output results.json
+    python -m benchmarks.bench_pipeline --sizes 1e3 1e4 1e5 1e6 --mongo-uri localhost:27017
+    python -m benchmarks.bench_pipeline --baseline results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import folium  # noqa: F401 (imported up front so the first map does not pay for it)
+import numpy as np
+import pandas as pd
+
+from src import companies_gaming
+from src import config
+from src import foursquare
+from src import ingest
+from src import visualization
+from src.scoring import ScoringEngine
+from src.snapshot import Snapshot
+from benchmarks import synthetic
+from benchmarks.stub_foursquare import StubFoursquare
+
+SIZES = [1_000, 3_000, 10_000]
+LATENCY = 0.02  # seconds per stub API response
+# A stage is reported as a regression when it is this much slower than in the baseline
+TOLERANCE = 0.25
+
+def measure(func, memory=True):
+    """
+    Runs func once; returns its result, the seconds it took and its peak traced memory in MiB.
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+def city_snapshot(offices, venues, scores):
+    # The snapshot create_snapshot would save, built from the synthetic data
+    cities, frames = {}, []
+    for city in companies_gaming.TOP_3_CITIES:
+        geometry = companies_gaming.city_geometry(city)
+        cities[city] = geometry.to_dict()
+        frames.append(offices[offices['City'] == city].assign(Inlier=geometry.inliers))
+    venues = venues.assign(City=venues['Locality'])
+    return Snapshot(scores, cities, pd.concat(frames, ignore_index=True), venues)
+
+def run_size(n, stub_url, mongo_uri=None, memory=True):
+    """
+    Loads n companies and n venues and times every stage.
+    Returns:
+    - Dictionary {stage: {"seconds", "items", "throughput", "peak_mb"}}.
+    """
+    results = {}
+
+    def stage(name, func, items=None):
+        result, seconds, peak = measure(func, memory)
+        count = items(result) if items else n
+        results[name] = {"seconds": seconds, "items": count, "throughput": count / seconds if seconds else None,
+                         "peak_mb": peak}
+        return result
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = None
+        if mongo_uri is None:
+            import mongomock
+            client = mongomock.MongoClient()
+        context = config.Context(mongo_uri=mongo_uri, cache_dir=cache_dir, token="stub", foursquare_url=stub_url,
+                                 client=client)
+        config.set_context(context)
+        try:
+            per_category = max(n // len(foursquare.CATEGORIES), 1)
+            stage("load", lambda: synthetic.load(context, n, per_category), items=lambda counts: sum(counts.values()))
+            stage("top cities", companies_gaming.find_top_3_gaming_cities)
+            offices = stage("offices", lambda: companies_gaming.cities_location(companies_gaming.TOP_3_CITIES,
+                                                                                 use_cache=False))
+            stage("geometry", lambda: [companies_gaming.get_city_midpoint_and_radius(offices, city)
+                                       for city in companies_gaming.TOP_3_CITIES], items=lambda _: len(offices))
+
+            # The search areas come from the offices: computed here so the stage only times the API part
+            areas = foursquare.city_search_areas()
+            if mongo_uri is None:
+                stage("foursquare (no store)", lambda: ingest.ingest({'Bar': 'Bar'}, areas, store=False)[0].to_frame(),
+                      items=lambda df: int(df['Count'].sum()))
+            else:
+                stage("foursquare", lambda: foursquare.foursq_top3_cities_query('Bar', 'Bar'),
+                      items=lambda df: int(df['Bar Count'].sum()))
+
+            venues = stage("venues", foursquare.load_venues, items=len)
+            counts = venues.pivot_table(index='Locality', columns='Category', aggfunc='size', fill_value=0)
+            counts = counts.reindex(companies_gaming.TOP_3_CITIES, fill_value=0).add_suffix(' Count')
+            counts = counts.rename_axis('City').reset_index()
+            scores = stage("scoring", lambda: ScoringEngine().fit(counts).to_frame(), items=len)
+
+            snapshot = city_snapshot(offices, venues, scores)
+            stage("map", lambda: visualization.build_map(city_name='New York', snapshot=snapshot).get_root().render(),
+                  items=lambda _: int((snapshot.venues['City'] == 'New York').sum()))
+        finally:
+            context.close()
+    return results
+
+def scaling(sizes, seconds):
+    """
+    Slope of log(seconds) over log(n), or None with fewer than two sizes.
+    """
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(seconds), 1)[0])
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Stages (and sizes) that got slower than the baseline by more than the tolerance.
+    Returns:
+    - List of (stage, n, baseline seconds, seconds).
+    """
+    regressions = []
+    for name, runs in results["stages"].items():
+        previous = {run["n"]: run for run in baseline["stages"].get(name, [])}
+        for run in runs:
+            old = previous.get(run["n"])
+            if old and run["seconds"] > old["seconds"] * (1 + tolerance):
+                regressions.append((name, run["n"], old["seconds"], run["seconds"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Times every stage of the pipeline on synthetic data.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=SIZES, help="numbers of companies (and venues)")
+    parser.add_argument("--mongo-uri", default=None, help="benchmark a MongoDB server instead of mongomock")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, which slows the stages down several times (no peak memory)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="slowdown allowed before failing")
+    args = parser.parse_args()
+    sizes = [int(n) for n in args.sizes]
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": "mongod" if args.mongo_uri else "mongomock",
+        "memory": not args.no_memory,
+        "stages": {},
+    }
+    with StubFoursquare(latency=LATENCY) as stub:
+        for n in sizes:
+            for name, run in run_size(n, stub.url, args.mongo_uri, memory=not args.no_memory).items():
+                results["stages"].setdefault(name, []).append({"n": n, **run})
+
+    print(f"{'stage':>22} {'n':>9} {'time (s)':>9} {'items/s':>11} {'peak (MiB)':>11}")
+    for name, runs in results["stages"].items():
+        for run in runs:
+            peak = f"{run['peak_mb']:11.1f}" if run["peak_mb"] is not None else f"{'-':>11}"
+            print(f"{name:>22} {run['n']:>9} {run['seconds']:9.3f} {run['throughput'] or 0:11,.0f} {peak}")
+    results["scaling"] = {name: scaling([run["n"] for run in runs], [run["seconds"] for run in runs])
+                          for name, runs in results["stages"].items()}
+    exponents = [f"{name} {exponent:.2f}" for name, exponent in results["scaling"].items() if exponent is not None]
+    if exponents:
+        print("\nScaling exponents (1 = linear): " + ", ".join(exponents))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, n, old, new in regressions:
+            print(f"REGRESSION {name} (n={n}): {old:.3f} s -> {new:.3f} s")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
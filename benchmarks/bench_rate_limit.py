@@ -0,0 +1,57 @@
+"""
+Several worker processes sharing the API through the host-wide rate limiter, against a local
+stub that answers 429 above its maximum rate.
+
+Run from the repository root:
+    python -m benchmarks.bench_rate_limit
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.stub_foursquare import StubFoursquare
+from src.fetcher import Fetcher
+from src.rate_limit import RateLimiter
+
+MAX_RATE = 100  # requests per second allowed by the stub
+PROCESSES = 4
+WORKERS = 8  # threads per process
+SEARCHES = 150  # per process
+LATENCY = 0.01
+
+def worker(url, limiter_path, retries):
+    limiter = RateLimiter("bench", rate=MAX_RATE, burst=MAX_RATE // 10, path=limiter_path) if limiter_path else None
+    fetcher = Fetcher(max_workers=WORKERS, base_url=url, token="stub", retries=retries, backoff=0.05, limiter=limiter)
+    searches = [{"query": "Bar", "lat": 40 + i * 1e-3, "lon": -74.0, "radius": 200} for i in range(SEARCHES)]
+    failed = 0
+    for future in [fetcher.executor.submit(fetcher.search, **search) for search in searches]:
+        try:
+            future.result()
+        except Exception:
+            failed += 1
+    fetcher.close()
+    return failed
+
+def run(label, limiter_path, retries=5):
+    with StubFoursquare(latency=LATENCY, max_rate=MAX_RATE, retry_after=0.2) as stub:
+        start = time.perf_counter()
+        with multiprocessing.get_context("fork").Pool(PROCESSES) as pool:
+            failed = sum(pool.starmap(worker, [(stub.url, limiter_path, retries)] * PROCESSES))
+        elapsed = time.perf_counter() - start
+        served = stub.requests - stub.throttled
+        print(f"{label:>22}: {elapsed:6.2f} s, {served / elapsed:6.1f} req/s served, "
+              f"{stub.throttled:5d} throttled (429), {failed} failed")
+
+def main():
+    print(f"{PROCESSES} processes x {WORKERS} threads, {PROCESSES * SEARCHES} searches, "
+          f"API ceiling {MAX_RATE} req/s")
+    run("no limiter", None)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "rate_limit.sqlite")
+        run("shared limiter", path)
+        limiter = RateLimiter("bench", rate=MAX_RATE, burst=MAX_RATE // 10, path=path)
+        print(limiter.usage().to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Full report (pie charts plus one map per city) rendered from a synthetic metrics snapshot of
+50 cities on a process pool, with every network connection refused.
+
+Run from the repository root:
+    python -m benchmarks.bench_report
+"""
+import os
+import socket
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import config
+from src.snapshot import Snapshot
+from src.visualization import render_report
+
+CITIES = 50
+OFFICES = 50  # per city
+VENUES = 100  # per city and category
+CATEGORIES = ['Schools', 'Starbucks', 'Club', 'Bar']
+
+def synthetic_snapshot(seed=0):
+    rng = np.random.default_rng(seed)
+    cities, offices, venues, scores = {}, [], [], []
+    for c in range(CITIES):
+        city = f'City {c:02d}'
+        lat, lon = rng.uniform(-50, 60), rng.uniform(-170, 170)
+        o_lat, o_lon = lat + rng.normal(0, 0.03, OFFICES), lon + rng.normal(0, 0.03, OFFICES)
+        cities[city] = {"city": city, "latitude": lat, "longitude": lon, "radius": 8000.0,
+                        "farthest": [[o_lat.min(), o_lon.min()], [o_lat.max(), o_lon.max()]], "search_radius": 2000}
+        offices.append(pd.DataFrame({'Company Name': [f'Company {i}' for i in range(OFFICES)], 'City': city,
+                                     'Street': 'Main Street', 'Latitude': o_lat, 'Longitude': o_lon,
+                                     'Inlier': rng.random(OFFICES) < 0.95}))
+        for category in CATEGORIES:
+            venues.append(pd.DataFrame({'Name': [f'{category} {i}' for i in range(VENUES)], 'Address': 'Somewhere',
+                                        'Locality': city, 'Latitude': lat + rng.normal(0, 0.01, VENUES),
+                                        'Longitude': lon + rng.normal(0, 0.01, VENUES), 'Category': category,
+                                        'City': city}))
+        scores.append({'City': city, **{f'{category} Count': int(rng.integers(1, 50)) for category in CATEGORIES}})
+
+    scores = pd.DataFrame(scores)
+    scores['Weighted Score'] = rng.random(CITIES)
+    return Snapshot(scores, cities, pd.concat(offices, ignore_index=True), pd.concat(venues, ignore_index=True))
+
+def refuse(*args, **kwargs):
+    raise OSError("network access during rendering")
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        config.set_context(config.Context(cache_dir=directory))
+        snapshot = synthetic_snapshot()
+        start = time.perf_counter()
+        snapshot.save()
+        print(f"snapshot: {CITIES} cities, {len(snapshot.offices):,} offices, {len(snapshot.venues):,} venues, "
+              f"saved in {time.perf_counter() - start:.2f} s")
+
+        # Forked workers inherit the patch: any connection attempt fails the run
+        socket.socket.connect = refuse
+        for processes in sorted({1, os.cpu_count()}):
+            start = time.perf_counter()
+            files = render_report(os.path.join(directory, "report"), snapshot=snapshot, processes=processes)
+            elapsed = time.perf_counter() - start
+            size = sum(os.path.getsize(file) for file in files)
+            print(f"{processes:>3} processes: {len(files)} files ({size / 2 ** 20:.1f} MiB) in {elapsed:.2f} s")
+
+if __name__ == "__main__":
+    main()
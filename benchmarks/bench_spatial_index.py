@@ -0,0 +1,66 @@
+"""
+Spatial index versus brute force for radius and k-nearest-neighbour queries.
+
+Run from the repository root:
+    python -m benchmarks.bench_spatial_index
+"""
+import pickle
+import time
+
+import numpy as np
+
+from src.geometry import haversine
+from src.spatial_index import SpatialIndex
+
+SIZES = [100_000, 1_000_000]
+QUERIES = 1_000
+# Brute force is timed on a subset of the queries and reported per query
+BRUTE_QUERIES = 50
+RADIUS = 2_000  # meters
+K = 10
+
+# Office clusters around the three project cities
+CITY_CENTERS = [(37.7749, -122.4194), (40.7128, -74.0060), (51.5074, -0.1278)]
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.array(CITY_CENTERS)[rng.integers(0, len(CITY_CENTERS), n)]
+    return centers[:, 0] + rng.normal(0, 0.05, n), centers[:, 1] + rng.normal(0, 0.05, n)
+
+def brute_within_radius(lat, lon, q_lat, q_lon, radius):
+    return [np.flatnonzero(haversine(a, b, lat, lon) <= radius) for a, b in zip(q_lat, q_lon)]
+
+def brute_k_nearest(lat, lon, q_lat, q_lon, k):
+    return np.array([np.sort(haversine(a, b, lat, lon))[:k] for a, b in zip(q_lat, q_lon)])
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    print(f"Per-query times in milliseconds ({QUERIES} indexed queries, {BRUTE_QUERIES} brute-force queries)")
+    print(f"{'n':>9} {'build (s)':>10} {'pickle (MB)':>12} {'radius idx':>11} {'radius brute':>13} "
+          f"{'knn idx':>8} {'knn brute':>10}")
+    for n in SIZES:
+        lat, lon = random_points(n)
+        q_lat, q_lon = random_points(QUERIES, seed=1)
+
+        index, build_time = timed(SpatialIndex, lat, lon)
+        size_mb = len(pickle.dumps(index)) / 1024 ** 2
+
+        found, radius_time = timed(index.within_radius, q_lat, q_lon, RADIUS)
+        b_lat, b_lon = q_lat[:BRUTE_QUERIES], q_lon[:BRUTE_QUERIES]
+        expected, radius_brute_time = timed(brute_within_radius, lat, lon, b_lat, b_lon, RADIUS)
+        assert all(np.array_equal(np.sort(a), b) for a, b in zip(found, expected))
+
+        (distances, _), knn_time = timed(index.k_nearest, q_lat, q_lon, K)
+        expected_distances, knn_brute_time = timed(brute_k_nearest, lat, lon, b_lat, b_lon, K)
+        assert np.allclose(distances[:BRUTE_QUERIES], expected_distances)
+
+        per_query, per_brute_query = 1000 / QUERIES, 1000 / BRUTE_QUERIES
+        print(f"{n:>9} {build_time:10.3f} {size_mb:12.1f} {radius_time * per_query:11.3f} "
+              f"{radius_brute_time * per_brute_query:13.3f} {knn_time * per_query:8.3f} {knn_brute_time * per_brute_query:10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Suitability surface on a 10^6-cell grid with 10^5 venues per layer, against a brute-force
+kernel sum on a sample of cells.
+
+Run from the repository root:
+    python -m benchmarks.bench_suitability
+"""
+import time
+import tracemalloc
+
+import numpy as np
+
+from src import config
+from src.geometry import haversine
+from src.suitability import SuitabilitySurface
+
+CENTER = (40.7128, -74.0060)
+RADIUS = 50_000  # meters: a 1000 x 1000 grid of 100 m cells
+VENUES = 100_000
+BANDWIDTH = 400
+# Cells checked against the brute-force kernel sum
+CHECK_CELLS = 200
+
+def random_venues(n, seed):
+    rng = np.random.default_rng(seed)
+    # Clustered around a few hot spots, like real amenities
+    spots = rng.normal(0, 0.15, (20, 2)) + CENTER
+    picked = spots[rng.integers(0, len(spots), n)]
+    return picked[:, 0] + rng.normal(0, 0.01, n), picked[:, 1] + rng.normal(0, 0.01, n)
+
+def main():
+    layers = {name: random_venues(VENUES, seed) for seed, name in enumerate(config.SUITABILITY_CRITERIA)}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    surface = SuitabilitySurface(*CENTER, RADIUS, bandwidth=BANDWIDTH)
+    for name, (lat, lon) in layers.items():
+        surface.add_layer(name, lat, lon)
+    surface.evaluate()
+    sites = surface.top_cells(10)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"grid {surface.size} x {surface.size} = {surface.size ** 2:,} cells, "
+          f"{len(layers)} layers x {VENUES:,} venues")
+    print(f"surface + top 10: {elapsed:.2f} s, peak memory {peak / 2 ** 20:.0f} MiB")
+
+    # Brute force: Gaussian sum over every venue for a sample of cells (the kernel is truncated
+    # and points are snapped to cell centers, hence the tolerance)
+    rng = np.random.default_rng(0)
+    rows, cols = np.nonzero(surface.mask)
+    sample = rng.choice(len(rows), CHECK_CELLS, replace=False)
+    name = next(iter(layers))
+    lat, lon = layers[name]
+    c_lat, c_lon = surface.cell_centers(rows[sample], cols[sample])
+    start = time.perf_counter()
+    expected = np.array([np.exp(-0.5 * (haversine(a, b, lat, lon) / BANDWIDTH) ** 2).sum()
+                         for a, b in zip(c_lat, c_lon)])
+    brute = (time.perf_counter() - start) / CHECK_CELLS
+    got = surface.layers[name][rows[sample], cols[sample]]
+    error = np.abs(got - expected) / np.maximum(expected, 1)
+    print(f"brute force: {brute * 1000:.1f} ms per cell "
+          f"({brute * surface.mask.sum() * len(layers) / 3600:.1f} h for the whole surface)")
+    print(f"relative error vs brute force: median {np.median(error):.3f}, max {error.max():.3f}")
+    print(sites.round(4).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Local stand-in for the Foursquare place search API, used to benchmark and test the fetchers offline.
+
+The server answers /v3/places/search with deterministic fake venues scattered inside the
+requested circle, after a configurable latency, and can throttle a fraction of the calls
+with 429 + Retry-After, or every call above a maximum rate (like the real API), or answer
+a scripted sequence of error statuses first.
+
+Usage:
+    with StubFoursquare(latency=0.02) as stub:
+        Fetcher(base_url=stub.url).search("Bar", 40.71, -74.0)
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+def fake_venues(query, lat, lon, radius, limit, total=None):
+    """
+    Deterministic fake venues inside a circle; the same circle always yields the same venues.
+    Args:
+    - total: Venues that exist in the circle (defaults to a density of one per hectare, capped).
+    Returns:
+    - List of Foursquare-shaped venue dictionaries (at most limit).
+    """
+    seed = int(hashlib.sha1(f"{query}|{lat:.5f}|{lon:.5f}|{radius}".encode()).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    if total is None:
+        total = min(int(math.pi * radius ** 2 / 10_000), 500)
+    venues = []
+    for i in range(min(total, limit)):
+        distance = radius * math.sqrt(rng.random())
+        angle = rng.random() * 2 * math.pi
+        v_lat = lat + distance * math.cos(angle) / 111_320
+        v_lon = lon + distance * math.sin(angle) / (111_320 * math.cos(math.radians(lat)))
+        venues.append({
+            "fsq_id": f"{seed:08x}{i:04d}",
+            "name": f"{query} {i}",
+            "chains": [],
+            "distance": int(distance),
+            "geocodes": {"main": {"latitude": v_lat, "longitude": v_lon}},
+            "location": {"formatted_address": f"{i} Stub Street", "locality": "Stub City"},
+        })
+    return venues
+
+class StubFoursquare:
+    """
+    Threaded HTTP server on localhost speaking the Foursquare search API.
+    Args:
+    - latency: Seconds every response is delayed by.
+    - throttle_rate: Fraction of the requests answered with 429.
+    - retry_after: Value of the Retry-After header on throttled responses.
+    - max_rate: Requests per second served before answering 429 (None for no limit).
+    - statuses: Statuses answered to the first requests, in order (e.g. [503, 429]); 429 and 503
+      carry the Retry-After header.
+    """
+
+    def __init__(self, latency=0.02, throttle_rate=0.0, retry_after=0.05, port=0, max_rate=None, statuses=()):
+        stub = self
+        self.latency = latency
+        self.statuses = list(statuses)
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_rate = max_rate
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                time.sleep(stub.latency)
+                with stub._lock:
+                    stub.requests += 1
+                    status = stub.statuses.pop(0) if stub.statuses else None
+                    throttle = stub._rng.random() < stub.throttle_rate
+                    if stub.max_rate:
+                        # Token bucket with a one-second burst
+                        now = time.monotonic()
+                        stub._tokens = min(stub.max_rate, stub._tokens + (now - stub._updated) * stub.max_rate)
+                        stub._updated = now
+                        if stub._tokens < 1:
+                            throttle = True
+                        else:
+                            stub._tokens -= 1
+                    stub.throttled += throttle
+
+                if status is not None:
+                    headers = {"Retry-After": str(stub.retry_after)} if status in (429, 503) else None
+                    self._send(status, {"message": f"Scripted {status}"}, headers)
+                    return
+                if throttle:
+                    self._send(429, {"message": "Quota exceeded"}, {"Retry-After": str(stub.retry_after)})
+                    return
+                lat, lon = (float(value) for value in params["ll"].split(","))
+                results = fake_venues(params.get("query", ""), lat, lon, int(params.get("radius", 1000)),
+                                      int(params.get("limit", 50)))
+                self._send(200, {"results": results})
+
+            def _send(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                try:
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client timed out and closed the connection
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v3/places/search"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,225 @@
+"""
+Synthetic Crunchbase companies and Foursquare venues at any size, for benchmarking the
+pipeline without the original datasets.
+
+Companies have the shape of the Crunchbase dump (name, comma-separated tag_list, offices
+with city, address and coordinates) and venues the shape of the Foursquare place search
+results, normalized as the ingestion stores them. Offices and venues are scattered around
+a fixed set of city centers, with a share of gaming companies and of offices without
+coordinates. Documents are generated lazily and inserted in batches, so 10^7 of them
+never sit in memory at once. The same seed always yields the same documents (ids included).
+
+Load them into a local mongod:
+    python -m benchmarks.synthetic --companies 1e6 --venues 1e6 --mongo-uri localhost:27017
+or into an in-process mongomock client (see load()).
+"""
+import argparse
+import time
+
+import numpy as np
+from bson import ObjectId
+
+from src import companies_gaming
+from src import config
+from src import foursquare
+from src import ingest
+
+# City centers; the first three are the project's cities and get most of the offices
+CITIES = {
+    'San Francisco': (37.7749, -122.4194),
+    'New York': (40.7128, -74.0060),
+    'London': (51.5074, -0.1278),
+    'Los Angeles': (34.0522, -118.2437),
+    'Seattle': (47.6062, -122.3321),
+    'Austin': (30.2672, -97.7431),
+    'Boston': (42.3601, -71.0589),
+    'Chicago': (41.8781, -87.6298),
+    'Berlin': (52.5200, 13.4050),
+    'Paris': (48.8566, 2.3522),
+    'Tokyo': (35.6762, 139.6503),
+    'Toronto': (43.6532, -79.3832),
+}
+CITY_WEIGHTS = np.array([6, 6, 4, 2, 2, 1, 1, 1, 1, 1, 1, 1], dtype=float)
+
+# Spread of the offices and venues around a city center (degrees)
+CITY_SPREAD = 0.03
+
+TAGS = ['social', 'mobile', 'iphone', 'android', 'saas', 'analytics', 'advertising', 'ecommerce',
+        'music', 'video', 'education', 'health', 'finance', 'travel', 'search', 'security']
+GAMING_TAGS = ['gaming', 'games', 'social-gaming', 'online-games', 'casual-games', 'mmo']
+
+# Share of gaming companies and of offices without coordinates (as in the Crunchbase dump)
+GAMING_SHARE = 0.15
+MISSING_COORDINATES = 0.1
+
+# Share of the venues that belong to a chain
+CHAIN_SHARE = 0.2
+
+# Documents per insert_many call
+BATCH_SIZE = 10_000
+
+def _city_names(rng, n):
+    names = list(CITIES)
+    return [names[i] for i in rng.choice(len(names), size=n, p=CITY_WEIGHTS / CITY_WEIGHTS.sum())]
+
+def _scatter(rng, city, n):
+    lat, lon = CITIES[city]
+    return lat + rng.normal(0, CITY_SPREAD, n), lon + rng.normal(0, CITY_SPREAD, n)
+
+def tag_tokens(tag_list):
+    """
+    The tokens companies_gaming.build_tag_index derives from a tag_list, computed client side
+    for stores that cannot run its update pipeline (mongomock has no $reduce).
+    """
+    tokens = set()
+    for tag in (tag_list or "").lower().split(","):
+        tag = tag.strip()
+        tokens.update([tag, *tag.split("-")])
+    tokens.discard("")
+    return sorted(tokens)
+
+def companies(n, seed=0, tokens=False):
+    """
+    Generates Crunchbase-shaped company documents.
+    Args:
+    - n: Number of companies.
+    - seed: Random seed.
+    - tokens: Also store the tag tokens (see tag_tokens), as build_tag_index would.
+    Yields:
+    - Company dictionaries with one to three offices each.
+    """
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        tags = list(rng.choice(TAGS, size=rng.integers(1, 4), replace=False))
+        if rng.random() < GAMING_SHARE:
+            tags.append(GAMING_TAGS[rng.integers(len(GAMING_TAGS))])
+        n_offices = int(rng.integers(1, 4))
+        offices = []
+        for city in _city_names(rng, n_offices):
+            lat, lon = _scatter(rng, city, 1)
+            located = rng.random() >= MISSING_COORDINATES
+            offices.append({
+                "description": "",
+                "address1": f"{int(rng.integers(1, 2000))} Market Street",
+                "address2": "",
+                "zip_code": f"{int(rng.integers(10000, 99999))}",
+                "city": city,
+                "state_code": None,
+                "country_code": "USA",
+                "latitude": float(lat[0]) if located else None,
+                "longitude": float(lon[0]) if located else None,
+            })
+        company = {
+            # Deterministic ids: the same data always has the same collection fingerprint
+            "_id": ObjectId(f"{seed:08x}{i:016x}"),
+            "name": f"Company {i}",
+            "permalink": f"company-{i}",
+            "category_code": "games_video" if set(tags) & set(GAMING_TAGS) else "web",
+            "number_of_employees": int(rng.integers(1, 500)),
+            "founded_year": int(rng.integers(1990, 2014)),
+            "tag_list": ", ".join(tags),
+            "offices": offices,
+        }
+        if tokens:
+            company[companies_gaming.TAG_FIELD] = tag_tokens(company["tag_list"])
+        yield company
+
+def venues(n, c_name, query=None, seed=0):
+    """
+    Generates Foursquare-shaped venues of a category, normalized as ingest.normalize_venue stores them.
+    Args:
+    - n: Number of venues.
+    - c_name: Collection name (e.g. 'Bar').
+    - query: Foursquare query the venues answer (defaults to foursquare.CATEGORIES[c_name]).
+    - seed: Random seed.
+    Yields:
+    - Venue dictionaries ready to be inserted.
+    """
+    query = query or foursquare.CATEGORIES.get(c_name, c_name)
+    rng = np.random.default_rng([seed, sum(map(ord, c_name))])
+    cities = _city_names(rng, n)
+    for i, city in enumerate(cities):
+        lat, lon = _scatter(rng, city, 1)
+        chain = rng.random() < CHAIN_SHARE
+        venue = {
+            "fsq_id": f"{c_name.lower()}{seed:04d}{i:010d}",
+            "name": f"{query} {i}",
+            "categories": [{"id": 13000 + len(c_name), "name": query}],
+            "chains": [{"id": f"chain-{c_name.lower()}", "name": f"{query} Chain"}] if chain else [],
+            "distance": int(rng.integers(0, 5000)),
+            "geocodes": {"main": {"latitude": float(lat[0]), "longitude": float(lon[0])}},
+            "location": {
+                "address": f"{i} {query} Avenue",
+                "formatted_address": f"{i} {query} Avenue, {city}",
+                "locality": city,
+                "country": "US",
+            },
+        }
+        yield ingest.normalize_venue(venue, c_name, city)
+
+def _insert(collection, docs, batch_size):
+    batch, count = [], 0
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == batch_size:
+            collection.insert_many(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        count += len(batch)
+    return count
+
+def load(context, n_companies, n_venues, c_names=tuple(foursquare.CATEGORIES), seed=0, batch_size=BATCH_SIZE,
+         tokens=None):
+    """
+    Replaces the companies collection and the venue collections of a context with synthetic data.
+    Args:
+    - context: config.Context to load into (its client may be a mongomock client).
+    - n_companies: Number of companies.
+    - n_venues: Number of venues per collection.
+    - c_names: Venue collections.
+    - seed: Random seed.
+    - batch_size: Documents per insert_many call.
+    - tokens: Store the tag tokens and their index with the companies (defaults to True for mongomock).
+    Returns:
+    - Dictionary {collection: documents inserted}.
+    """
+    if tokens is None:
+        tokens = type(context.client).__module__.startswith("mongomock")
+    counts = {}
+    collection = context.companies
+    collection.drop()
+    # The dropped indexes must be rebuilt by the next run
+    companies_gaming._tag_indexed.discard(collection.full_name)
+    counts[collection.name] = _insert(collection, companies(n_companies, seed, tokens), batch_size)
+    if tokens:
+        collection.create_index(companies_gaming.TAG_FIELD)
+
+    for c_name in c_names:
+        collection = context.venues_db[c_name]
+        collection.drop()
+        foursquare._geo_indexed.discard(collection.full_name)
+        foursquare._key_indexed.discard(collection.full_name)
+        counts[c_name] = _insert(collection, venues(n_venues, c_name, seed=seed), batch_size)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Loads synthetic companies and venues into MongoDB.")
+    parser.add_argument("--companies", type=float, default=1e4, help="number of companies")
+    parser.add_argument("--venues", type=float, default=1e4, help="number of venues per category")
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB connection string (defaults to $MONGO_URI)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    context = config.Context(mongo_uri=args.mongo_uri)
+    start = time.perf_counter()
+    counts = load(context, int(args.companies), int(args.venues), seed=args.seed)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    for name, count in counts.items():
+        print(f"{name:>12}: {count:,}")
+    print(f"{total:,} documents in {elapsed:.1f} s ({total / elapsed:,.0f} documents/s)")
+
+if __name__ == "__main__":
+    main()
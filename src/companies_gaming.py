@@ -1,23 +1,105 @@
-import os
-from dotenv import load_dotenv
-from pymongo import MongoClient
+import re
+
 import pandas as pd
-from collections import defaultdict
-from shapely.geometry import Polygon, Point
-import itertools
-import geopy.distance
+import numpy as np
+from . import config
+from . import geometry
+from . import instrumentation
+from . import office_cache
 
-# Load environment variables from a .env file
-load_dotenv()
+def get_collection():
+    """
+    Returns the companies collection of the current context (the client is created on first use).
+    """
+    return config.get_context().companies
 
-# Connect to MongoDB client
-client = MongoClient("localhost:27017")
+# Field holding the normalized tags, one lowercase token per tag (and per hyphenated part)
+TAG_FIELD = "tag_tokens"
 
-# Access the specified database and collection
-db = client["Ironhack"]
-c = db.get_collection("companies")
+# Collections whose tag index is known to exist in this context (saves listing the indexes per ranking);
+# emptied when the context changes, since another client may reuse the same collection names
+_tag_indexed = config.memoized_set()
+
+@instrumentation.traced
+def build_tag_index(collection=None, rebuild=False):
+    """
+    Normalizes the comma-separated tag_list of every company into an indexed array of tokens,
+    so tag lookups scan the index instead of the whole collection.
+    "Social-Gaming, iPhone" becomes ["social-gaming", "social", "gaming", "iphone"].
+    Every company is tokenized once; later calls only tokenize the companies inserted since
+    (those without the field), which is one indexed update.
+    Args:
+    - collection: MongoDB collection with the companies (defaults to the context's).
+    - rebuild: Recompute the tokens even if the index already exists.
+    Returns:
+    - Name of the index.
+    """
+    if collection is None:
+        collection = get_collection()
+    index_name = f"{TAG_FIELD}_1"
+    indexed = not rebuild and (collection.full_name in _tag_indexed or index_name in collection.index_information())
+
+    # Lowercase, split on commas and trim every tag
+    tags = {
+        "$map": {
+            "input": {"$split": [{"$toLower": {"$ifNull": ["$tag_list", ""]}}, ","]},
+            "as": "tag",
+            "in": {"$trim": {"input": "$$tag"}},
+        }
+    }
+    # Keep each tag plus its hyphenated parts, dropping empty strings and duplicates
+    tokens = {
+        "$reduce": {
+            "input": tags,
+            "initialValue": [],
+            "in": {"$concatArrays": ["$$value", ["$$this"], {"$split": ["$$this", "-"]}]},
+        }
+    }
+    collection.update_many({TAG_FIELD: {"$exists": False}} if indexed else {}, [
+        {"$set": {TAG_FIELD: {"$setUnion": [{"$filter": {"input": tokens, "cond": {"$ne": ["$$this", ""]}}}]}}}
+    ])
+    if not indexed:
+        index_name = collection.create_index(TAG_FIELD)
+    _tag_indexed.add(collection.full_name)
+    return index_name
+
+def tag_filter(tag):
+    """
+    Query matching the companies with a tag containing the given text (case-insensitive), like the
+    original regex over tag_list: "gaming" also matches "socialgaming" and "online-gaming".
+    The regex runs over the keys of the tag index rather than over every document.
+    """
+    return {TAG_FIELD: {"$regex": re.escape(tag.lower())}}
+
+@instrumentation.traced
+def top_cities(tag, n=3, collection=None):
+    """
+    Ranks cities by the number of offices of companies carrying a given tag.
+    Grouping, sorting and limiting run inside MongoDB, so only N rows travel back.
+    Args:
+    - tag: Text the tags must contain (case-insensitive), e.g. "gaming" (see tag_filter).
+    - n: Number of cities to return.
+    - collection: MongoDB collection with the companies (defaults to the context's).
+    Returns:
+    - DataFrame with the top N cities and their respective counts.
+    """
+    if collection is None:
+        collection = get_collection()
+    build_tag_index(collection)
+
+    pipeline = [
+        {"$match": tag_filter(tag)},
+        {"$unwind": "$offices"},
+        {"$match": {"offices.city": {"$nin": ["", None]}}},  # Exclude empty city entries
+        {"$group": {"_id": "$offices.city", "Count": {"$sum": 1}}},
+        {"$sort": {"Count": -1, "_id": 1}},
+        {"$limit": n},
+        {"$project": {"_id": 0, "City": "$_id", "Count": 1}},
+    ]
+    return pd.DataFrame(list(collection.aggregate(pipeline)), columns=['City', 'Count'])
 
 # Function to find the top 3 cities with the most gaming companies
+@instrumentation.traced
 def find_top_3_gaming_cities():
     """
     Retrieves and counts the number of gaming companies in each city,
@@ -25,78 +107,90 @@ def find_top_3_gaming_cities():
     Returns:
     - DataFrame with the top 3 cities and their respective counts.
     """
-    # MongoDB query filter for gaming companies
-    filter_1 = {
-        "tag_list": {"$regex": "gaming", "$options": "i"}
-    }
-
-    # Projection to retrieve only city information
-    projection = {"_id": 0, "offices.city": 1}
-
-    # Execute the query
-    query = list(c.find(filter_1, projection).sort("name", -1))
+    return top_cities("gaming", n=3)
 
-    # Count the occurrences of each city
-    city_counts = defaultdict(int)
-    for item in query:
-        for office in item['offices']:
-            city = office.get('city', '')
-            if city:  # Exclude empty city entries
-                city_counts[city] += 1
+# Cities analysed in the project
+TOP_3_CITIES = ['San Francisco', 'New York', 'London']
 
-    # Sort cities by count in descending order and extract top 3
-    sorted_city_counts = {k: v for k, v in sorted(city_counts.items(), key=lambda item: item[1], reverse=True)}
-    top_10_cities = dict(list(sorted_city_counts.items())[:3])
-
-    return pd.DataFrame(list(top_10_cities.items()), columns=['City', 'Count'])
+@instrumentation.traced
+def cities_location(cities, tag="gaming", collection=None, batch_size=10000, use_cache=True):
+    """
+    Retrieves the offices (with coordinates) that companies carrying a tag have in the given cities.
+    Offices are unwound and filtered by city on the server and only the five needed fields are
+    projected; the cursor is streamed straight into columns instead of a list of dicts.
+    Results are kept in the local extraction cache (see office_cache) until the collection changes.
+    Args:
+    - cities: List of city names, or the DataFrame returned by top_cities.
+    - tag: Text the tags of the companies must contain (case-insensitive, see tag_filter).
+    - collection: MongoDB collection with the companies (defaults to the context's).
+    - batch_size: Number of offices per cursor batch.
+    - use_cache: Read from / write to the extraction cache.
+    Returns:
+    - DataFrame with the company names, cities, and their location data.
+    """
+    if isinstance(cities, pd.DataFrame):
+        cities = cities['City']
+    cities = list(cities)
+
+    if collection is None:
+        collection = get_collection()
+    build_tag_index(collection)
+
+    pipeline = [
+        {"$match": {**tag_filter(tag), "offices.city": {"$in": cities}}},
+        {"$unwind": "$offices"},
+        {"$match": {
+            "offices.city": {"$in": cities},
+            # $type "number" alone also matches NaN doubles
+            "offices.latitude": {"$type": "number", "$nin": [float("nan")]},
+            "offices.longitude": {"$type": "number", "$nin": [float("nan")]},
+        }},
+        {"$project": {
+            "_id": 0,
+            "name": 1,
+            "city": "$offices.city",
+            "street": "$offices.address1",
+            "latitude": "$offices.latitude",
+            "longitude": "$offices.longitude",
+        }},
+    ]
+
+    def extract():
+        # Stream the cursor into columns
+        names, city_column, streets, latitudes, longitudes = [], [], [], [], []
+        for office in collection.aggregate(pipeline, batchSize=batch_size):
+            names.append(office.get('name'))
+            city_column.append(office['city'])
+            streets.append(office.get('street'))
+            latitudes.append(office['latitude'])
+            longitudes.append(office['longitude'])
+
+        df = pd.DataFrame({
+            'Company Name': names,
+            'City': city_column,
+            'Street': streets,
+            'Latitude': np.array(latitudes, dtype=float),
+            'Longitude': np.array(longitudes, dtype=float),
+        })
+
+        # No NaN coordinates, like the former dropna() (in case the server let one through),
+        # then remove duplicated offices and sort by city
+        df = df.dropna(subset=['Latitude', 'Longitude']).drop_duplicates()
+        return df.sort_values(by="City", kind="stable").reset_index(drop=True)
+
+    if not use_cache:
+        return extract()
+    return office_cache.load_or_extract(collection, pipeline, extract)
 
 # Function to retrieve location data of top 3 gaming cities
+@instrumentation.traced
 def top_3_cities_location():
     """
     Retrieves the location data (latitude and longitude) of gaming companies in the top 3 gaming cities.
     Returns:
     - DataFrame with the company names, cities, and their location data.
     """
-    # Filters for gaming companies in the top 3 cities
-    filter_1 = {
-        "tag_list": {"$regex": "gaming", "$options": "i"},
-    }
-    filter_2 = {
-        "offices": {"$elemMatch": {"city": "San Francisco"}},
-    }
-    filter_3 = {
-        "offices": {"$elemMatch": {"city": "New York"}},
-    }
-    filter_4 = {
-        "offices": {"$elemMatch": {"city": "London"}},
-    }
-
-    # Projection to retrieve relevant fields
-    projection = {"_id": 0, "name": 1, "offices.address1": 1, "offices.city": 1, "offices.latitude": 1, "offices.longitude": 1}
-
-    # Execute the query
-    query_top_3_gaming = list(c.find({"$and": [filter_1, {"$or": [filter_2, filter_3, filter_4]}]}, projection))
-
-    # Flatten the data for ease of analysis
-    flattened_data = []
-    for company in query_top_3_gaming:
-        for office in company['offices']:
-            flattened_data.append({
-                'Company Name': company['name'],
-                'City': office['city'],
-                'Street': office['address1'],
-                'Latitude': office['latitude'],
-                'Longitude': office['longitude']
-            })
-
-    # Convert to DataFrame, remove duplicates and NaN values
-    df = pd.DataFrame(flattened_data).drop_duplicates().dropna(subset=['Latitude', 'Longitude'])
-
-    # Filter for the top 3 gaming cities
-    cities_to_include = ['San Francisco', 'New York', 'London']
-    df_filtered_top_3 = df[df['City'].isin(cities_to_include)].sort_values(by="City")
-
-    return df_filtered_top_3
+    return cities_location(TOP_3_CITIES, tag="gaming")
 
 """
 
@@ -148,14 +242,21 @@ CODE NOT NEEDED ABOVE
 ---------------------------------------------------------------------
 """
 
-def get_city_midpoint_and_radius(df, city_name):
+@instrumentation.traced
+def get_city_midpoint_and_radius(df, city_name, method="diameter"):
     """
     Calculates the midpoint and radius for a specified city based on the two farthest points within a threshold distance.
+    The farthest pair is found on the convex hull with rotating calipers (see geometry.farthest_pair),
+    so the cost grows with n log n instead of with the number of office pairs.
+    Same computation as city_geometry (geometry.CityGeometry), for any DataFrame of offices;
+    use geometry.compute_city_geometry to get every city at once.
     Args:
     - df: DataFrame containing the data.
     - city_name: Name of the city.
+    - method: "diameter" (midpoint of the two farthest points) or "mec" (minimum enclosing circle).
     Returns:
-    - Tuple containing the latitude and longitude of the midpoint and the radius in meters.
+    - Tuple containing the latitude and longitude of the midpoint and the radius in meters,
+      or (None, None, None) if the city has no offices or all of them are outliers.
     """
 
     # Filter DataFrame for entries corresponding to the specified city
@@ -164,69 +265,103 @@ def get_city_midpoint_and_radius(df, city_name):
     # Return None if there is no data for the city
     if city_df.empty:
         print(f"No data available for {city_name}.")
-        return None, None
-
-    # Initialize initial centroid
-    initial_centroid = Point(city_df['Longitude'].mean(), city_df['Latitude'].mean())
+        return None, None, None
 
-    # Set threshold for maximum allowable distance from initial centroid (for filtering outliers)
-    threshold_distance = 0.05  # Equivalent to approximately 5 km
-
-    # Exclude points beyond the threshold distance from initial centroid
-    filtered_df = city_df[city_df.apply(lambda row: Point(row['Longitude'], row['Latitude']).distance(initial_centroid) < threshold_distance, axis=1)]
-
-    # Identify two points in the filtered dataset that are farthest from each other
-    max_distance = 0
-    point1, point2 = None, None
-    for (lat1, lon1), (lat2, lon2) in itertools.combinations(filtered_df[['Latitude', 'Longitude']].values, 2):
-        distance = geopy.distance.distance((lat1, lon1), (lat2, lon2)).meters
-        if distance > max_distance:
-            max_distance, point1, point2 = distance, (lat1, lon1), (lat2, lon2)
-
-    # Compute midpoint of the two farthest points
-    midpoint_lat = (point1[0] + point2[0]) / 2
-    midpoint_lon = (point1[1] + point2[1]) / 2
+    # Outliers (more than geometry.OUTLIER_THRESHOLD meters from the centroid) are excluded
+    result = geometry.CityGeometry.from_dataframe(city_df, city_name, method=method)
+    if not result.located:
+        print(f"No data available for {city_name}.")
+        return None, None, None
+    return result.latitude, result.longitude, result.radius
 
-    # The radius is half the distance between the two farthest points
-    radius = max_distance / 2
+@config.memoize
+@instrumentation.traced
+def get_offices():
+    """
+    Office locations of the top 3 gaming cities, queried once and memoized.
+    Returns:
+    - DataFrame as returned by top_3_cities_location (shared, do not modify in place).
+    """
+    return top_3_cities_location()
 
-    return (midpoint_lat, midpoint_lon, radius)
+@config.memoize
+@instrumentation.traced
+def city_geometry(city_name):
+    """
+    Geometry of a city's offices in get_offices() (midpoint, radius, farthest pair, inlier mask and
+    search radius), computed once per city and dataset: config.clear_memoized() drops it with the offices.
+    Returns:
+    - geometry.CityGeometry, or None if the city has no offices or all of them are outliers.
+    """
+    offices = get_offices()
+    if not (offices['City'] == city_name).any():
+        return None
+    result = geometry.CityGeometry.from_dataframe(offices, city_name)
+    return result if result.located else None
 
-df = top_3_cities_location()
+@instrumentation.traced
+def get_city_geometry(city_name):
+    """
+    Midpoint and radius of a city, taken from city_geometry().
+    Returns:
+    - Tuple containing the latitude and longitude of the midpoint and the radius in meters,
+      or (None, None, None) if the city has no offices or all of them are outliers.
+    """
+    result = city_geometry(city_name)
+    if result is None:
+        print(f"No data available for {city_name}.")
+        return None, None, None
+    return result.latitude, result.longitude, result.radius
 
+@instrumentation.traced
 def midpoint_coordinates_radius_sf():
     """
     Retrieves the latitude and longitude of the midpoint for San Francisco.
     Returns:
     - Tuple containing the latitude and longitude of the midpoint.
     """
-    # Call get_city_midpoint to compute the midpoint for San Francisco
-    sflat, sflon, radius = get_city_midpoint_and_radius(df, "San Francisco")
+    # Compute (once) the midpoint for San Francisco
+    sflat, sflon, radius = get_city_geometry("San Francisco")
 
     # Return the computed midpoint coordinates
     return sflat, sflon, radius
 
 
+@instrumentation.traced
 def midpoint_coordinates_radius_ny():
     """
     Retrieves the latitude and longitude of the midpoint for New York.
     Returns:
     - Tuple containing the latitude and longitude of the midpoint.
     """
-    # Call get_city_midpoint to compute the midpoint for New York
-    nylat, nylon, radius = get_city_midpoint_and_radius(df, "New York")
+    # Compute (once) the midpoint for New York
+    nylat, nylon, radius = get_city_geometry("New York")
     
     # Return the computed midpoint coordinates
     return nylat, nylon, radius
 
+@instrumentation.traced
 def midpoint_coordinates_radius_ldn():
     """
     Retrieves the latitude and longitude of the midpoint for London.
     Returns:
     - Tuple containing the latitude and longitude of the midpoint.
     """
-    # Call get_city_midpoint to compute the midpoint for London
-    ldnlat, ldnlon, radius = get_city_midpoint_and_radius(df, "London")
+    # Compute (once) the midpoint for London
+    ldnlat, ldnlon, radius = get_city_geometry("London")
 
     # Return the computed midpoint coordinates
-    return ldnlat, ldnlon, radius
\ No newline at end of file
+    return ldnlat, ldnlon, radius
+
+# Former module-level globals, now computed on first access
+_lazy_globals = {
+    "client": lambda: config.get_context().client,
+    "db": lambda: config.get_context().client[config.get_context().companies_db],
+    "c": get_collection,
+    "df": get_offices,
+}
+
+def __getattr__(name):
+    if name in _lazy_globals:
+        return _lazy_globals[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,130 @@
+import functools
+import os
+
+from dotenv import load_dotenv
+
+# Criteria of the office location score (see scoring.ScoringEngine): for each column of the
+# city x category count matrix, its weight, normalization ("max", "minmax", "zscore" or "rank")
+# and direction (1 when more is better, -1 when less is better)
+SCORING_CRITERIA = {
+    'Schools Count': {"weight": 0.20, "normalization": "max", "direction": 1},
+    'Starbucks Count': {"weight": 0.20, "normalization": "max", "direction": 1},
+    'Club Count': {"weight": 0.20, "normalization": "max", "direction": 1},
+    'Bar Count': {"weight": 0.40, "normalization": "max", "direction": 1},
+}
+
+# Layers of the suitability surface (see suitability.py): the amenity criteria above plus the
+# density of gaming company offices, each measured as a kernel-weighted count around every cell
+SUITABILITY_CRITERIA = {
+    **SCORING_CRITERIA,
+    'Gaming Companies Count': {"weight": 0.20, "normalization": "max", "direction": 1},
+}
+
+# Memoized accessors registered with @memoize, and sets made by memoized_set; cleared whenever the context changes
+_memoized = []
+_memoized_sets = []
+
+def memoize(func):
+    """
+    Memoizes an accessor (results are keyed by its arguments) and registers it,
+    so set_context() can invalidate every cached result at once.
+    """
+    cached = functools.lru_cache(maxsize=None)(func)
+    _memoized.append(cached)
+    return cached
+
+def memoized_set():
+    """
+    Returns an empty set that clear_memoized() (and so set_context()) empties, for facts that
+    hold for the current context only, e.g. the collections whose index is known to exist.
+    """
+    values = set()
+    _memoized_sets.append(values)
+    return values
+
+class Context:
+    """
+    Connection settings of the project plus the lazily created MongoDB client.
+    Nothing here touches the network until a collection is actually used.
+    Args:
+    - mongo_uri: MongoDB connection string (defaults to $MONGO_URI or localhost:27017).
+    - companies_db: Database with the Crunchbase companies collection.
+    - companies_collection: Name of the companies collection.
+    - venues_db: Database where the Foursquare venues are stored.
+    - token: Foursquare API key (defaults to $token).
+    - cache_dir: Directory for the local caches (defaults to $CACHE_DIR or .cache).
+    - foursquare_url: Foursquare place search endpoint (defaults to $FOURSQUARE_URL or the public API).
+    - offline: Serve API responses only from the local cache (defaults to $OFFLINE).
+    - client: MongoClient-compatible client to use instead of connecting to mongo_uri (e.g. mongomock).
+    """
+
+    def __init__(self, mongo_uri=None, companies_db="Ironhack", companies_collection="companies",
+                 venues_db="Project_III", token=None, cache_dir=None, foursquare_url=None, offline=None,
+                 client=None):
+        # Load environment variables from a .env file
+        load_dotenv()
+        self.mongo_uri = mongo_uri or os.getenv("MONGO_URI", "localhost:27017")
+        self.companies_db = companies_db
+        self.companies_collection = companies_collection
+        self.venues_db_name = venues_db
+        self.token = token or os.getenv("token")
+        self.cache_dir = cache_dir or os.getenv("CACHE_DIR", ".cache")
+        self.foursquare_url = foursquare_url or os.getenv("FOURSQUARE_URL", "https://api.foursquare.com/v3/places/search")
+        self.offline = offline if offline is not None else os.getenv("OFFLINE", "").lower() in ("1", "true", "yes")
+        self._client = client
+
+    @property
+    def client(self):
+        # pymongo is only imported (and the client only created) on first use
+        if self._client is None:
+            from pymongo import MongoClient
+            from . import instrumentation
+            # The command listener records nothing unless instrumentation is enabled
+            self._client = MongoClient(self.mongo_uri, event_listeners=[instrumentation.command_listener()])
+        return self._client
+
+    @property
+    def companies(self):
+        return self.client[self.companies_db].get_collection(self.companies_collection)
+
+    @property
+    def venues_db(self):
+        return self.client[self.venues_db_name]
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+_context = None
+
+def get_context():
+    """
+    Returns the current context, creating the default one on first use.
+    """
+    global _context
+    if _context is None:
+        _context = Context()
+    return _context
+
+def set_context(context):
+    """
+    Replaces the current context and clears every memoized result computed with the old one.
+    Args:
+    - context: Context instance to use from now on.
+    Returns:
+    - The previous context (or None).
+    """
+    global _context
+    previous, _context = _context, context
+    clear_memoized()
+    return previous
+
+def clear_memoized():
+    """
+    Clears every memoized result and memoized set, e.g. after the underlying data changed in place.
+    """
+    for cached in _memoized:
+        cached.cache_clear()
+    for values in _memoized_sets:
+        values.clear()
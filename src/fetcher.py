@@ -0,0 +1,153 @@
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import config
+from . import instrumentation
+from . import http_cache
+from . import rate_limit
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class Fetcher:
+    """
+    Concurrent HTTP fetch engine for the Foursquare API.
+    All requests share one keep-alive connection pool, run on a thread pool capped at
+    max_workers, time out individually and are retried with exponential backoff
+    (honoring Retry-After) on connection errors, 429 and 5xx responses. With a rate limiter every
+    attempt takes a token first, and a 429 pauses the limiter for all workers, in every process.
+    Args:
+    - max_workers: Maximum number of requests in flight.
+    - timeout: Timeout of every request in seconds.
+    - retries: Number of retries after the first attempt.
+    - backoff: Base delay of the exponential backoff in seconds.
+    - base_url: Foursquare search endpoint (defaults to the context's).
+    - token: Foursquare API key (defaults to the context's).
+    - cache: http_cache.ResponseCache answering repeated searches, or None.
+    - limiter: rate_limit.RateLimiter spacing the requests, or None.
+    """
+
+    def __init__(self, max_workers=8, timeout=10, retries=3, backoff=0.5, base_url=None, token=None, cache=None,
+                 limiter=None):
+        context = config.get_context()
+        self.cache = cache
+        self.limiter = limiter
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.base_url = base_url or context.foursquare_url
+        self.headers = {"accept": "application/json", "Authorization": token or context.token}
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _delay(self, attempt, response=None):
+        # Retry-After (seconds) wins over the exponential backoff
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff * 2 ** attempt * (0.5 + random.random())
+
+    def get(self, url, params=None):
+        """
+        GET request with timeout and retries.
+        Returns:
+        - Decoded JSON body.
+        """
+        import requests
+
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=self.headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                instrumentation.record_http("foursquare", 0, start, time.perf_counter() - start)
+                if attempt == self.retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+            instrumentation.record_http("foursquare", response.status_code, start, time.perf_counter() - start)
+            if response.status_code == 429 and self.limiter is not None:
+                # Every worker backs off, not only this one; the next acquire() waits for the end of the block
+                self.limiter.block(self._delay(attempt, response))
+                if attempt < self.retries:
+                    continue
+            elif response.status_code in RETRY_STATUSES and attempt < self.retries:
+                time.sleep(self._delay(attempt, response))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    def search(self, query, lat, lon, radius=3700, sort_by="DISTANCE", limit=50):
+        """
+        Foursquare place search around a point.
+        Returns:
+        - Decoded JSON response (venues under 'results').
+        """
+        params = {"query": query, "ll": f"{lat},{lon}", "radius": radius, "sort": sort_by, "limit": limit}
+        if self.cache is None:
+            return self.get(self.base_url, params=params)
+        key = {"url": self.base_url, "query": query, "lat": float(lat), "lon": float(lon),
+               "radius": radius, "sort": sort_by, "limit": limit}
+        return self.cache.fetch("foursquare", key, lambda: self.get(self.base_url, params=params),
+                                cacheable=lambda body: isinstance(body, dict) and "results" in body)
+
+    def search_many(self, searches):
+        """
+        Runs many place searches concurrently.
+        Args:
+        - searches: Iterable of dictionaries with the keyword arguments of search().
+        Returns:
+        - List of responses in the order of the searches.
+        """
+        return list(self.executor.map(lambda kwargs: self.search(**kwargs), searches))
+
+    def iter_search(self, searches, window=None):
+        """
+        Runs many place searches concurrently and yields the responses as they complete.
+        Searches are consumed lazily and at most window of them are in flight, so responses never
+        pile up in memory whatever the number of searches.
+        Args:
+        - searches: Iterable of dictionaries with the keyword arguments of search().
+        - window: Maximum number of searches submitted and not yet consumed (defaults to 2 x max_workers).
+        Yields:
+        - Tuples (position of the search, response), in completion order.
+        """
+        window = window or 2 * self.max_workers
+        searches = enumerate(searches)
+        pending = {}
+        while True:
+            for i, kwargs in searches:
+                pending[self.executor.submit(self.search, **kwargs)] = i
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+@config.memoize
+def get_fetcher():
+    """
+    Shared fetcher of the current context (one connection pool per process), behind the response
+    cache and the host-wide Foursquare rate limiter.
+    """
+    return Fetcher(cache=http_cache.get_response_cache(), limiter=rate_limit.get_limiter("foursquare"))
@@ -1,135 +1,398 @@
-import os
-import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from pymongo import MongoClient
-from dotenv import load_dotenv
-load_dotenv()
+import numpy as np
+from . import config
 from . import companies_gaming
+from . import fetcher
+from . import geocoding
+from . import instrumentation
+from . import scoring
+from .geometry import EARTH_RADIUS
 
-# Connect DB Database
-token = os.getenv("token")
-# Connect to MongoDB client
-client = MongoClient("localhost:27017")
-client.list_database_names()
-db = client["Project_III"]
-# Access the specified database and collection
-starbucks = db.get_collection("Starbucks")
+# MongoDB collection and Foursquare query of every venue category
+CATEGORIES = {"Starbucks": "Starbucks", "Schools": "School", "Club": "Club", "Bar": "Bar"}
+
+# Connections are created lazily through the context (see config.Context)
+def get_db():
+    """
+    Returns the Project_III database of the current context.
+    """
+    return config.get_context().venues_db
 
 # Geocoding: Converting a place name / address into geographic coordinates
 
+@instrumentation.traced
 def url_geocode(where):
-    url_geocode = f"https://geocode.xyz/{where}?json=1"
-    response = requests.get(url_geocode)
-    return response.json()
+    # Shared session and response cache; see geocoding.geocode_many to geocode in bulk
+    return geocoding.geocode(where)
+
+# Field holding the GeoJSON location of every venue (2dsphere indexed)
+GEO_FIELD = "point"
+
+# Venue collections whose geo index is known to exist in this context (emptied when it changes)
+_geo_indexed = config.memoized_set()
+
+def venue_point(venue):
+    """
+    Builds the GeoJSON point of a Foursquare venue from its main geocode.
+    Returns:
+    - {"type": "Point", "coordinates": [lon, lat]} or None if the venue has no coordinates.
+    """
+    main = venue.get('geocodes', {}).get('main', {})
+    if main.get('latitude') is None or main.get('longitude') is None:
+        return None
+    return {"type": "Point", "coordinates": [main['longitude'], main['latitude']]}
+
+@instrumentation.traced
+def build_geo_index(collection):
+    """
+    Adds the GeoJSON point to the venues stored before it existed and creates the 2dsphere index.
+    Runs once per collection and context.
+    Args:
+    - collection: MongoDB collection with Foursquare venues.
+    """
+    if collection.full_name in _geo_indexed:
+        return
+    collection.update_many(
+        {GEO_FIELD: {"$exists": False}, "geocodes.main.latitude": {"$type": "number"}, "geocodes.main.longitude": {"$type": "number"}},
+        [{"$set": {GEO_FIELD: {"type": "Point", "coordinates": ["$geocodes.main.longitude", "$geocodes.main.latitude"]}}}],
+    )
+    collection.create_index([(GEO_FIELD, "2dsphere")])
+    _geo_indexed.add(collection.full_name)
+
+def _within(lat, lon, radius):
+    # $centerSphere takes the radius in radians
+    return {GEO_FIELD: {"$geoWithin": {"$centerSphere": [[lon, lat], radius / EARTH_RADIUS]}}}
+
+@instrumentation.traced
+def venue_coordinates(collection, lat, lon, radius):
+    """
+    Coordinates of the venues of a collection inside a circle, streamed into arrays.
+    Args:
+    - collection: MongoDB collection with Foursquare venues.
+    - lat, lon: Center of the circle.
+    - radius: Radius of the circle in meters.
+    Returns:
+    - Tuple of latitude and longitude arrays.
+    """
+    build_geo_index(collection)
+    cursor = collection.find(_within(lat, lon, radius), {"_id": 0, f"{GEO_FIELD}.coordinates": 1}, batch_size=10000)
+    coordinates = np.array([venue[GEO_FIELD]["coordinates"] for venue in cursor], dtype=float).reshape(-1, 2)
+    return coordinates[:, 1], coordinates[:, 0]
+
+# Only these fields are read back when venues are loaded into DataFrames
+VENUE_PROJECTION = {
+    "_id": 0,
+    "name": 1,
+    "chains.name": 1,
+    "geocodes.main": 1,
+    "location.formatted_address": 1,
+    "location.locality": 1,
+}
+
+@instrumentation.traced
+def venues_frame(collection, category=None, query=None, batch_size=10000):
+    """
+    Loads the venues of a collection into a DataFrame. Only the fields in VENUE_PROJECTION leave
+    the server, in large cursor batches decoded straight into columns.
+    Args:
+    - collection: MongoDB collection with Foursquare venues.
+    - category: Value of the 'Category' column (defaults to the collection name).
+    - query: MongoDB filter (e.g. a $geoWithin), or None for every venue.
+    - batch_size: Number of venues per cursor batch.
+    Returns:
+    - DataFrame with 'Name' (the chain name when the venue belongs to one), 'Address', 'Locality',
+      'Latitude', 'Longitude' and 'Category', for the venues where all of them are known.
+    """
+    names, addresses, localities, latitudes, longitudes = [], [], [], [], []
+    # Each cursor gets its own copy of the projection (collections are read from several threads)
+    for doc in collection.find(query or {}, dict(VENUE_PROJECTION), batch_size=batch_size):
+        main = doc.get('geocodes', {}).get('main', {})
+        location = doc.get('location', {})
+        chains = doc.get('chains') or []
+        names.append(chains[0].get('name') if chains else doc.get('name'))
+        addresses.append(location.get('formatted_address'))
+        localities.append(location.get('locality'))
+        latitudes.append(main.get('latitude'))
+        longitudes.append(main.get('longitude'))
+
+    df = pd.DataFrame({
+        'Name': names,
+        'Address': addresses,
+        'Locality': localities,
+        'Latitude': np.array(latitudes, dtype=float),
+        'Longitude': np.array(longitudes, dtype=float),
+    })
+    # Keep the venues where all the information is present (empty strings count as missing)
+    df = df[(df[['Name', 'Address', 'Locality']] != '').all(axis=1)].dropna().reset_index(drop=True)
+    df['Category'] = category or collection.name
+    return df
+
+@instrumentation.traced
+def load_venues(c_names=tuple(CATEGORIES), area=None, batch_size=10000, max_workers=None):
+    """
+    Loads several venue collections concurrently (see venues_frame) into one DataFrame whose
+    'Category' column holds the collection each venue comes from.
+    Args:
+    - c_names: Collection names.
+    - area: (latitude, longitude, radius) to load only the venues inside this circle, or None.
+    - batch_size: Number of venues per cursor batch.
+    - max_workers: Collections loaded at the same time (defaults to all of them).
+    Returns:
+    - DataFrame as returned by venues_frame.
+    """
+    db = get_db()
+    collections = [db[c_name] for c_name in c_names]
+    query = None
+    if area is not None:
+        for collection in collections:
+            build_geo_index(collection)
+        query = _within(*area)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(collections), 1)) as executor:
+        frames = list(executor.map(lambda collection: venues_frame(collection, query=query, batch_size=batch_size), collections))
+    if not frames:
+        return pd.DataFrame(columns=['Name', 'Address', 'Locality', 'Latitude', 'Longitude', 'Category'])
+    return pd.concat(frames, ignore_index=True)
+
+# Venue collections whose unique fsq_id index is known to exist in this context (emptied when it changes)
+_key_indexed = config.memoized_set()
+
+@instrumentation.traced
+def build_key_index(collection):
+    """
+    Creates the unique index on fsq_id that makes venue uploads idempotent.
+    Duplicates left by earlier insert-only runs are removed first (the oldest copy is kept).
+    Runs once per collection and context.
+    Args:
+    - collection: MongoDB collection with Foursquare venues.
+    """
+    if collection.full_name in _key_indexed:
+        return
+    duplicates = collection.aggregate([
+        {"$match": {"fsq_id": {"$type": "string"}}},
+        {"$group": {"_id": "$fsq_id", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+        {"$match": {"n": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    extra_ids = [_id for group in duplicates for _id in sorted(group["ids"])[1:]]
+    if extra_ids:
+        collection.delete_many({"_id": {"$in": extra_ids}})
+    collection.create_index("fsq_id", unique=True, partialFilterExpression={"fsq_id": {"$type": "string"}})
+    _key_indexed.add(collection.full_name)
+
+class VenueWriter:
+    """
+    Buffered writer of venues into a MongoDB collection: venues are upserted on fsq_id in
+    unordered bulk batches of buffer_size, so memory stays bounded whatever the number of venues.
+    Use as a context manager (or call flush) so the last partial batch is written.
+    Args:
+    - c_name: Name of the MongoDB collection.
+    - buffer_size: Number of venues per bulk_write call.
+    """
+
+    def __init__(self, c_name, buffer_size=1000):
+        self.collection = get_db()[c_name]
+        self.buffer_size = buffer_size
+        self.counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        self._batch = []
+        build_geo_index(self.collection)
+        build_key_index(self.collection)
+
+    def write(self, item):
+        from pymongo import InsertOne, UpdateOne
+
+        venue = {key: value for key, value in item.items() if key != '_id'}
+        if GEO_FIELD not in venue:
+            point = venue_point(venue)
+            if point:
+                venue[GEO_FIELD] = point
+        if venue.get('fsq_id'):
+            self._batch.append(UpdateOne({"fsq_id": venue['fsq_id']}, {"$set": venue}, upsert=True))
+        else:
+            self._batch.append(InsertOne(venue))  # Without a key the venue cannot be deduplicated
+        if len(self._batch) >= self.buffer_size:
+            self.flush()
+
+    @instrumentation.traced
+    def flush(self):
+        if not self._batch:
+            return
+        result = self.collection.bulk_write(self._batch, ordered=False)
+        self.counts["inserted"] += result.upserted_count + result.inserted_count
+        self.counts["updated"] += result.modified_count
+        self.counts["unchanged"] += result.matched_count - result.modified_count
+        self._batch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
 
 #In case you want to save the Starbucks data in MongoDB you will have to create a Databse called: Project_III and a Collection called: Starbucks
-def upload_collection(c_name, list_):
-    db = client.get_database("Project_III")
-    c = db[c_name]
-    for item in list_:
-        c.insert_one(item)
+@instrumentation.traced
+def upload_collection(c_name, list_, batch_size=1000):
+    """
+    Upserts venues into a MongoDB collection keyed on fsq_id, in unordered bulk batches.
+    Uploading the same venues again changes nothing, so reruns do not inflate the counts.
+    Args:
+    - c_name: Name of the MongoDB collection.
+    - list_: Iterable of Foursquare venues.
+    - batch_size: Number of venues per bulk_write call.
+    Returns:
+    - Dictionary with the number of venues inserted, updated and unchanged.
+    """
+    with VenueWriter(c_name, batch_size) as writer:
+        for item in list_:
+            writer.write(item)
+    return writer.counts
+
 # Save downloaded infromation into a JSON and work locally
+@instrumentation.traced
 def save_to_json(data, file_path):
     with open(file_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
 
-# Retrieve the midpoint coordinates for San Francisco
-sf_lat, sf_lon, sf_radius = companies_gaming.midpoint_coordinates_radius_sf()
-# Retrieve the midpoint coordinates for New York
-ny_lat,nylon, ny_radius  = companies_gaming.midpoint_coordinates_radius_ny()
-# Retrieve the midpoint coordinates for London
-ldn_lat, ldn_lon, ld_radius = companies_gaming.midpoint_coordinates_radius_ldn()
-
 #Create a connection to Foursquare API in order to find out about what we have around a given radius
 
+@instrumentation.traced
 def request_4sq(query, lat, lon, radius = 3700, sort_by = "DISTANCE", limit = 50):
-    url = f"https://api.foursquare.com/v3/places/search?query={query}&ll={lat}%2C{lon}&radius={radius}&sort={sort_by}&limit={limit}"
-    headers = {"accept": "application/json", "Authorization": token}
-    try:
-        return requests.get(url, headers = headers).json()
-    except:
-        print("Request not found")
+    # Goes through the shared fetcher (pooled keep-alive connections, timeouts, retries and the host-wide rate limiter).
+    # Failures raise (requests.RequestException, rate_limit.QuotaExceeded) instead of returning None
+    return fetcher.get_fetcher().search(query, lat, lon, radius=radius, sort_by=sort_by, limit=limit)
 
-def foursq_top3_cities_query(query,c_name):
-    request_sf = request_4sq(query, sf_lat, sf_lon, radius=int(sf_radius/ 4))
-    request_ny = request_4sq(query, ny_lat, nylon, radius=int(ny_radius/ 4))
-    request_ld = request_4sq(query, ldn_lat, ldn_lon, radius=int(ld_radius/ 4))
-    #In case you want to save the query data in MongoDB you will have to create a Databse called: Project_III and a Collection called: quer_name
-
-    list_of_query_sf = request_sf['results']  
-    upload_collection(c_name, list_=list_of_query_sf)
-    list_of_query_ny = request_ny['results']  
-    upload_collection(c_name, list_=list_of_query_ny)
-    list_of_query_ld = request_ld['results']  
-    upload_collection(c_name, list_=list_of_query_ld) 
-    
-    """
-    Counts the occurrences of documents in a specified MongoDB collection for each given city.
+@instrumentation.traced
+def city_search_areas(cities=companies_gaming.TOP_3_CITIES):
+    """
+    Search circle of each city: its midpoint and a quarter of its radius.
     Args:
-    - collection_name: Name of the MongoDB collection.
-    - cities: List of cities to count occurrences in.
+    - cities: List of city names.
     Returns:
-    - DataFrame with counts for each city.
+    - Dictionary {city: (latitude, longitude, radius in meters)}, without the cities that have
+      no geometry (no offices, or only outliers).
     """
-    
-    client = MongoClient("localhost:27017")
-    db = client["Project_III"]
-    collection = db.get_collection(c_name)
-    cities = ['San Francisco', 'New York', 'London']
+    # The same memoized geometry the city maps draw (see companies_gaming.city_geometry)
+    areas = {}
+    for city in cities:
+        city_geometry = companies_gaming.city_geometry(city)
+        if city_geometry is None:
+            print(f"No data available for {city}.")
+            continue
+        areas[city] = city_geometry.search_area
+    return areas
 
-    # Dictionary to store the counts for each city
-    city_counts = {city: 0 for city in cities}
+@instrumentation.traced
+def count_matrix(c_names, areas):
+    """
+    Counts the venues of several collections inside each city's search circle with a single
+    aggregation: every collection is pre-filtered with an index-backed $geoWithin on the union of
+    the circles, the collections are merged with $unionWith, and one $facet per city groups the
+    (already small) result by category. The number of round trips does not grow with the number
+    of cities or categories.
+    Args:
+    - c_names: List of collection names (categories).
+    - areas: Dictionary {city: (latitude, longitude, radius)} as returned by city_search_areas.
+    Returns:
+    - DataFrame with a 'City' column and one '<collection> Count' column per collection
+      (zero-filled when c_names is empty; no rows when areas is empty).
+    """
+    cities = list(areas)
+    columns = [f'{c_name} Count' for c_name in c_names]
+    if not c_names or not cities:
+        # MongoDB rejects an empty $or and an empty $facet
+        return pd.DataFrame({'City': cities, **{column: np.zeros(len(cities), dtype=int) for column in columns}},
+                            columns=['City'] + columns)
 
-    # Query the collection and count the locations for each city
-    for city in cities:
-        count = collection.count_documents({"location.locality": city})
-        city_counts[city] = count
+    db = get_db()
+    for c_name in c_names:
+        build_geo_index(db.get_collection(c_name))
+
+    def category_stages(c_name):
+        return [
+            {"$match": {"$or": [_within(lat, lon, radius) for lat, lon, radius in areas.values()]}},
+            {"$project": {"_id": 0, GEO_FIELD: 1, "category": {"$literal": c_name}}},
+        ]
+
+    pipeline = category_stages(c_names[0])
+    for c_name in c_names[1:]:
+        pipeline.append({"$unionWith": {"coll": c_name, "pipeline": category_stages(c_name)}})
+    # Facet names must not contain dots, so cities are referred to by position
+    pipeline.append({"$facet": {
+        f"city{i}": [{"$match": _within(*areas[city])}, {"$group": {"_id": "$category", "n": {"$sum": 1}}}]
+        for i, city in enumerate(cities)
+    }})
+    facets = next(db.get_collection(c_names[0]).aggregate(pipeline))
+
+    # Dense (city x category) matrix
+    counts = np.zeros((len(cities), len(c_names)), dtype=int)
+    positions = {c_name: j for j, c_name in enumerate(c_names)}
+    for i in range(len(cities)):
+        for group in facets[f"city{i}"]:
+            counts[i, positions[group["_id"]]] = group["n"]
 
-    # Convert the dictionary to a DataFrame
-    return pd.DataFrame(list(city_counts.items()), columns=['City', f'{c_name} Count'])
+    df = pd.DataFrame(counts, columns=columns)
+    df.insert(0, 'City', cities)
+    return df
 
-def weighted_count_merged_df():
+@instrumentation.traced
+def foursq_top3_cities_query(query,c_name):
+    """
+    Queries Foursquare around each city, stores the venues in a MongoDB collection and
+    counts the venues of that collection inside each city's search circle.
+    Args:
+    - query: Foursquare search query.
+    - c_name: Name of the MongoDB collection.
+    Returns:
+    - DataFrame with counts for each city.
+    """
+    from . import ingest
+
+    # Venues stream from the API into MongoDB; the counts are read back from everything stored,
+    # so venues of earlier or interrupted runs are counted once (writes are upserts on the venue id)
+    areas = city_search_areas()
+    ingest.ingest({c_name: query}, areas)
+    return count_matrix([c_name], areas)
+
+@instrumentation.traced
+def weighted_count_merged_df(complete=False, cities=companies_gaming.TOP_3_CITIES):
     """
     Aggregates and normalizes the counts of various categories (Starbucks, Schools, Clubs, and Bars)
     across three major cities. This function queries data for each category, merges them into a single DataFrame,
-    and then normalizes these counts on a scale of 0 to 1. An average percentage score is then calculated 
-    for each city based on these normalized values.
+    and then normalizes these counts on a scale of 0 to 1. A weighted score is then calculated 
+    for each city based on these normalized values and the weights in config.SCORING_CRITERIA.
 
-    The function relies on the foursq_top3_cities_query function to fetch the count of each category in the cities.
+    The function fetches and stores every category in every city concurrently (ingest.ingest), then counts
+    the stored venues inside each city's search circle with a single aggregation (count_matrix).
     The normalization helps in comparing the prevalence of each category relative to the city with the highest count.
 
+    Args:
+    - complete: Crawl every city with adaptive tiling so the counts are not capped by the 50-result page.
+    - cities: List of city names.
     Returns:
-    - A DataFrame sorted by the average percentage (weighted score) of the normalized counts for each category.
-    """
-    df_Starbucks_count = foursq_top3_cities_query(query="Starbucks",c_name="Starbucks")
-    df_School_count = foursq_top3_cities_query(query="School",c_name="Schools")
-    df_Club_count = foursq_top3_cities_query(query="Club",c_name="Club")
-    df_Bar_count = foursq_top3_cities_query(query="Bar",c_name="Bar")
-    
-    #API has a limit of 50, so the redundancy of this infromation is low. As there could be a clear inner here. One thing is sure, London has less in the radius given
-    df_merged = df_School_count.merge(df_Starbucks_count, on='City')
-    df_merged = df_merged.merge(df_Club_count, on='City')
-    df_merged = df_merged.merge(df_Bar_count, on='City')
-
-    df_merged['Schools Count Normalized'] = df_merged['Schools Count'] / df_merged['Schools Count'].max()
-    df_merged['Starbucks Count Normalized'] = df_merged['Starbucks Count'] / df_merged['Starbucks Count'].max()
-    df_merged['Clubs Count Normalized'] = df_merged['Club Count'] / df_merged['Club Count'].max()
-    df_merged['Bars Count Normalized'] = df_merged['Bar Count'] / df_merged['Bar Count'].max()
-
-    # Apply weights
-    weights = {
-        'Schools': 0.20,
-        'Starbucks': 0.20,
-        'Clubs': 0.20,
-        'Bars': 0.40
-    }
-    # Calculate average percentage
-    df_merged['Weighted Score'] = (df_merged['Schools Count Normalized'] + 
-                                   df_merged['Starbucks Count Normalized'] + 
-                                   df_merged['Clubs Count Normalized'] + 
-                                   df_merged['Bars Count Normalized']) / 4
-
-    # Sort by the weighted score
-    return df_merged.sort_values(by='Weighted Score', ascending=False)
+    - A DataFrame sorted by the weighted score of the normalized counts for each category.
+    """
+    from . import ingest
+
+    # All (category x city) requests run concurrently and stream into MongoDB
+    areas = city_search_areas(cities)
+    ingest.ingest(CATEGORIES, areas, complete=complete)
+
+    #API has a limit of 50, so without complete=True every dense city saturates at 50 and the counts say little
+    df_merged = count_matrix(["Schools", "Starbucks", "Club", "Bar"], areas)
+
+    # Normalization and weights come from config.SCORING_CRITERIA
+    return scoring.ScoringEngine().fit(df_merged).to_frame()
+
+# Former module-level globals, now computed on first access
+_lazy_globals = {
+    "token": lambda: config.get_context().token,
+    "client": lambda: config.get_context().client,
+    "db": get_db,
+    "starbucks": lambda: get_db().get_collection("Starbucks"),
+}
 
+def __getattr__(name):
+    if name in _lazy_globals:
+        return _lazy_globals[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,219 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from . import companies_gaming
+from . import config
+from . import http_cache
+from .fetcher import RETRY_STATUSES
+from . import instrumentation
+from . import office_cache
+from . import rate_limit
+
+GEOCODE_URL = "https://geocode.xyz/{}?json=1"
+
+@config.memoize
+def _session():
+    # One keep-alive session for all geocoding calls
+    import requests
+
+    return requests.Session()
+
+def geocode(where, timeout=10, retries=2, backoff=1.0):
+    """
+    Geocodes a place name or address with geocode.xyz, through the response cache.
+    Requests that reach the API wait for the host-wide geocoding rate limiter; 429 and 5xx
+    responses are retried with exponential backoff (honoring Retry-After). Only responses
+    with coordinates are cached: error and throttling bodies are asked again next time.
+    Args:
+    - where: Place name or address.
+    - timeout: Request timeout in seconds.
+    - retries: Number of retries after the first attempt.
+    - backoff: Base delay of the exponential backoff in seconds.
+    Returns:
+    - Decoded JSON response.
+    """
+    from requests.utils import quote
+
+    def request():
+        limiter = rate_limit.get_limiter("geocode")
+        for attempt in range(retries + 1):
+            limiter.acquire()
+            start = time.perf_counter()
+            response = _session().get(GEOCODE_URL.format(quote(where)), timeout=timeout)
+            instrumentation.record_http("geocode", response.status_code, start, time.perf_counter() - start)
+            delay = backoff * 2 ** attempt
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.replace(".", "", 1).isdigit():
+                delay = float(retry_after)
+            if response.status_code == 429:
+                # Slow down every geocoding worker on the host, not only this one; the next acquire() waits
+                limiter.block(delay)
+                if attempt < retries:
+                    continue
+            elif response.status_code in RETRY_STATUSES and attempt < retries:
+                time.sleep(delay)
+                continue
+            response.raise_for_status()
+            return response.json()
+    return http_cache.get_response_cache().fetch("geocode", {"where": where}, request,
+                                                 cacheable=lambda body: parse_coordinates(body) is not None)
+
+def parse_coordinates(response):
+    """
+    Extracts (latitude, longitude) from a geocode.xyz response, or None if the place was not found.
+    """
+    if not response or "error" in response:
+        return None
+    try:
+        lat, lon = float(response["latt"]), float(response["longt"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return None if lat == 0 and lon == 0 else (lat, lon)
+
+def normalize_address(address):
+    """
+    Canonical form of an address used to deduplicate and match addresses:
+    lowercase, single spaces, no spaces around commas.
+    """
+    address = re.sub(r"\s+", " ", str(address).strip().lower())
+    return re.sub(r"\s*,\s*", ", ", address).strip(", ")
+
+def office_address(office):
+    """
+    Geocodable address of a Crunchbase office (street, city, state and country).
+    """
+    parts = [office.get(field) for field in ("address1", "city", "state_code", "country_code")]
+    return ", ".join(str(part).strip() for part in parts if part and str(part).strip())
+
+def known_coordinates(collection=None):
+    """
+    Coordinates already present in the companies collection, keyed by normalized office address.
+    The extraction goes through the office cache.
+    Args:
+    - collection: MongoDB collection with the companies (defaults to the context's).
+    Returns:
+    - Dictionary {normalized address: (latitude, longitude)}.
+    """
+    if collection is None:
+        collection = companies_gaming.get_collection()
+    pipeline = [
+        {"$match": {"offices.latitude": {"$type": "number"}}},
+        {"$unwind": "$offices"},
+        {"$match": {"offices.latitude": {"$type": "number"}, "offices.longitude": {"$type": "number"},
+                    "offices.address1": {"$nin": ["", None]}}},
+        {"$project": {"_id": 0, "address1": "$offices.address1", "city": "$offices.city",
+                      "state_code": "$offices.state_code", "country_code": "$offices.country_code",
+                      "latitude": "$offices.latitude", "longitude": "$offices.longitude"}},
+    ]
+
+    def extract():
+        rows = [(normalize_address(office_address(office)), office["latitude"], office["longitude"])
+                for office in collection.aggregate(pipeline, batchSize=10000)]
+        return pd.DataFrame(rows, columns=["Address", "Latitude", "Longitude"]).drop_duplicates("Address")
+
+    df = office_cache.load_or_extract(collection, pipeline, extract)
+    return dict(zip(df["Address"], zip(df["Latitude"], df["Longitude"])))
+
+def geocode_many(addresses, known=None, max_workers=4):
+    """
+    Geocodes many addresses at once. Addresses are normalized and deduplicated, answered from
+    the known office coordinates or the response cache first, and only the remainder is sent to
+    geocode.xyz, concurrently but under the shared rate limit (rate_limit.DEFAULT_LIMITS).
+    Args:
+    - addresses: Iterable of addresses.
+    - known: Dictionary {normalized address: (latitude, longitude)} (see known_coordinates), or None.
+    - max_workers: Maximum number of requests in flight.
+    Returns:
+    - DataFrame aligned with addresses: 'Address', 'Latitude', 'Longitude' and 'Source'
+      ('offices', 'cache', 'geocode', or None when the address could not be geocoded).
+    """
+    addresses = list(addresses)
+    unique = {normalize_address(address) for address in addresses if address}
+    known = known or {}
+    cache = http_cache.get_response_cache()
+
+    resolved = {}
+    remaining = []
+    for address in unique:
+        if address in known:
+            resolved[address] = (*known[address], "offices")
+            continue
+        # Error bodies cached by older versions are asked again instead of pinning the failure
+        coordinates = parse_coordinates(cache.get("geocode", {"where": address}))
+        if coordinates:
+            resolved[address] = (*coordinates, "cache")
+        else:
+            remaining.append(address)
+
+    # Only unseen addresses reach the network
+    if remaining and not cache.offline:
+        import requests
+
+        def request(address):
+            try:
+                return parse_coordinates(geocode(address))
+            except requests.RequestException:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for address, coordinates in zip(remaining, executor.map(request, remaining)):
+                resolved[address] = (*coordinates, "geocode") if coordinates else (None, None, None)
+
+    rows = [(address, *resolved.get(normalize_address(address) if address else None, (None, None, None)))
+            for address in addresses]
+    return pd.DataFrame(rows, columns=["Address", "Latitude", "Longitude", "Source"])
+
+def backfill_office_coordinates(cities=None, collection=None, batch_size=500, **kwargs):
+    """
+    Geocodes the offices without coordinates (the ones top_3_cities_location has to drop)
+    and writes the coordinates back to the companies collection in bulk.
+    Args:
+    - cities: Only backfill offices in these cities (None for all).
+    - collection: MongoDB collection with the companies (defaults to the context's).
+    - batch_size: Number of updates per bulk_write call.
+    - kwargs: Passed to geocode_many (max_workers).
+    Returns:
+    - Dictionary with the number of offices missing coordinates, geocoded and updated.
+    """
+    from pymongo import UpdateOne
+
+    if collection is None:
+        collection = companies_gaming.get_collection()
+
+    missing = {"latitude": {"$not": {"$type": "number"}}, "address1": {"$nin": ["", None]}}
+    if cities is not None:
+        missing["city"] = {"$in": list(cities)}
+    pipeline = [
+        {"$match": {"offices": {"$elemMatch": missing}}},
+        {"$unwind": "$offices"},
+        {"$match": {f"offices.{field}": condition for field, condition in missing.items()}},
+        {"$project": {"address1": "$offices.address1", "city": "$offices.city",
+                      "state_code": "$offices.state_code", "country_code": "$offices.country_code"}},
+    ]
+    offices = list(collection.aggregate(pipeline, batchSize=10000))
+    geocoded = geocode_many([office_address(office) for office in offices], known=known_coordinates(collection), **kwargs)
+
+    updates = []
+    for office, latitude, longitude, source in zip(offices, geocoded["Latitude"], geocoded["Longitude"],
+                                                   geocoded["Source"]):
+        if pd.isna(source):
+            continue
+        updates.append(UpdateOne(
+            {"_id": office["_id"]},
+            {"$set": {"offices.$[office].latitude": latitude, "offices.$[office].longitude": longitude}},
+            array_filters=[{"office.address1": office["address1"], "office.city": office.get("city"),
+                            "office.latitude": {"$not": {"$type": "number"}}}],
+        ))
+
+    updated = 0
+    for start in range(0, len(updates), batch_size):
+        updated += collection.bulk_write(updates[start:start + batch_size], ordered=False).modified_count
+
+    # The fingerprint does not see in-place updates: drop the cached extractions
+    if updated:
+        office_cache.invalidate(collection)
+        config.clear_memoized()
+    return {"missing": len(offices), "geocoded": int(geocoded["Source"].notna().sum()), "updated": updated}
@@ -0,0 +1,383 @@
+import numpy as np
+import pandas as pd
+
+# Mean Earth radius in meters (IUGG), used by the haversine formula
+EARTH_RADIUS = 6371008.8
+
+# Offices farther than this from their city centroid are treated as outliers (meters)
+OUTLIER_THRESHOLD = 5000
+
+# Foursquare searches around a city cover this fraction of its radius
+SEARCH_RADIUS_FRACTION = 1 / 4
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Vectorized great-circle distance between two sets of points.
+    Args:
+    - lat1, lon1: Latitude and longitude of the first points (degrees, scalars or arrays).
+    - lat2, lon2: Latitude and longitude of the second points (degrees, broadcastable to the first).
+    Returns:
+    - Array of distances in meters.
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def project(lat, lon, lat0):
+    """
+    Local equirectangular projection (meters) around the reference latitude lat0.
+    At city scale the distortion is negligible, which lets us run planar hull algorithms.
+    """
+    x = EARTH_RADIUS * np.radians(lon) * np.cos(np.radians(lat0))
+    y = EARTH_RADIUS * np.radians(lat)
+    return x, y
+
+def unproject(x, y, lat0):
+    """
+    Inverse of project.
+    """
+    lat = np.degrees(y / EARTH_RADIUS)
+    lon = np.degrees(x / (EARTH_RADIUS * np.cos(np.radians(lat0))))
+    return lat, lon
+
+def _cross(ox, oy, ax, ay, bx, by):
+    # 2D cross product of vectors OA and OB (positive for a counter-clockwise turn)
+    return (ax - ox) * (by - oy) - (ay - oy) * (bx - ox)
+
+def convex_hull(x, y):
+    """
+    Computes the convex hull of a planar point set (Andrew's monotone chain).
+    Points strictly inside the quadrilateral spanned by the four extreme points are
+    discarded first with a vectorized test (Akl-Toussaint), so the Python-level chain
+    only walks the few points that can be on the hull.
+    Args:
+    - x, y: Arrays with the point coordinates.
+    Returns:
+    - Array of indices into x/y of the hull vertices in counter-clockwise order.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) < 3:
+        return np.arange(len(x))
+
+    # Drop points strictly inside the polygon of extreme points
+    extremes = [np.argmin(x), np.argmin(y), np.argmax(x), np.argmax(y)]
+    ex = x[extremes]
+    ey = y[extremes]
+    inside = np.ones(len(x), dtype=bool)
+    for i in range(4):
+        j = (i + 1) % 4
+        inside &= _cross(ex[i], ey[i], ex[j], ey[j], x, y) > 0
+    candidates = np.flatnonzero(~inside)
+
+    # Sort the remaining candidates lexicographically and build both chains
+    order = candidates[np.lexsort((y[candidates], x[candidates]))]
+    points = [(x[i], y[i], i) for i in order]
+
+    def half_chain(sequence):
+        chain = []
+        for px, py, idx in sequence:
+            while len(chain) >= 2 and _cross(chain[-2][0], chain[-2][1], chain[-1][0], chain[-1][1], px, py) <= 0:
+                chain.pop()
+            chain.append((px, py, idx))
+        return chain
+
+    lower = half_chain(points)
+    upper = half_chain(reversed(points))
+    hull = [idx for _, _, idx in lower[:-1] + upper[:-1]]
+
+    # Degenerate input (all points identical or collinear)
+    if not hull:
+        hull = [order[0]]
+    return np.array(hull)
+
+def _antipodal_pairs(hx, hy):
+    """
+    Rotating calipers over a counter-clockwise convex polygon.
+    Returns the O(h) antipodal vertex pairs, which always include the diameter.
+    """
+    m = len(hx)
+    if m == 1:
+        return np.array([[0, 0]])
+    if m == 2:
+        return np.array([[0, 1]])
+
+    pairs = []
+    j = 1
+    for i in range(m):
+        ni = (i + 1) % m
+        # Advance the opposite caliper while it moves away from edge (i, ni)
+        while abs(_cross(hx[i], hy[i], hx[ni], hy[ni], hx[(j + 1) % m], hy[(j + 1) % m])) > \
+                abs(_cross(hx[i], hy[i], hx[ni], hy[ni], hx[j], hy[j])):
+            j = (j + 1) % m
+        pairs.append((i, j))
+        pairs.append((ni, j))
+        # Edge (j, j + 1) parallel to edge (i, ni): both of its ends are antipodal to both ends of
+        # (i, ni). Compared with a relative tolerance, since rounding can break the tie either way.
+        nj = (j + 1) % m
+        area = abs(_cross(hx[i], hy[i], hx[ni], hy[ni], hx[j], hy[j]))
+        if nj != i and np.isclose(abs(_cross(hx[i], hy[i], hx[ni], hy[ni], hx[nj], hy[nj])), area, rtol=1e-9):
+            pairs.append((i, nj))
+            pairs.append((ni, nj))
+    return np.array(pairs)
+
+def farthest_pair(lat, lon):
+    """
+    Finds the two points that are farthest apart: convex hull, rotating calipers,
+    and a vectorized haversine over the antipodal candidate pairs.
+    Args:
+    - lat, lon: Arrays with the point coordinates in degrees.
+    Returns:
+    - Tuple (index1, index2) into lat/lon of the farthest pair.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    x, y = project(lat, lon, lat.mean())
+    hull = convex_hull(x, y)
+    pairs = hull[_antipodal_pairs(x[hull], y[hull])]
+    distances = haversine(lat[pairs[:, 0]], lon[pairs[:, 0]], lat[pairs[:, 1]], lon[pairs[:, 1]])
+    best = np.argmax(distances)
+    return int(pairs[best, 0]), int(pairs[best, 1])
+
+def _circle_from(points):
+    # Smallest circle through one, two or three boundary points
+    if len(points) == 1:
+        (ax, ay), = points
+        return ax, ay, 0.0
+    if len(points) == 2:
+        (ax, ay), (bx, by) = points
+        return (ax + bx) / 2, (ay + by) / 2, np.hypot(ax - bx, ay - by) / 2
+    (ax, ay), (bx, by), (cx, cy) = points
+    d = 2 * (ax * (by - cy) + bx * (cy - ay) + cx * (ay - by))
+    if d == 0:
+        # Collinear: the circle is defined by the two extreme points
+        pairs = [(points[0], points[1]), (points[0], points[2]), (points[1], points[2])]
+        return max((_circle_from(list(p)) for p in pairs), key=lambda circle: circle[2])
+    a2, b2, c2 = ax * ax + ay * ay, bx * bx + by * by, cx * cx + cy * cy
+    ux = (a2 * (by - cy) + b2 * (cy - ay) + c2 * (ay - by)) / d
+    uy = (a2 * (cx - bx) + b2 * (ax - cx) + c2 * (bx - ax)) / d
+    return ux, uy, np.hypot(ax - ux, ay - uy)
+
+def _in_circle(circle, px, py):
+    cx, cy, r = circle
+    return np.hypot(px - cx, py - cy) <= r * (1 + 1e-9) + 1e-9
+
+def minimum_enclosing_circle(x, y, seed=0):
+    """
+    Smallest circle enclosing a planar point set (Welzl's algorithm, iterative
+    move-to-front form with expected linear time on shuffled input).
+    Args:
+    - x, y: Arrays with the point coordinates.
+    - seed: Seed for the shuffle, so results are reproducible.
+    Returns:
+    - Tuple (center_x, center_y, radius).
+    """
+    points = list(zip(np.asarray(x, dtype=float), np.asarray(y, dtype=float)))
+    np.random.default_rng(seed).shuffle(points)
+
+    circle = None
+    for i, p in enumerate(points):
+        if circle is not None and _in_circle(circle, *p):
+            continue
+        circle = _circle_from([p])
+        for j in range(i):
+            q = points[j]
+            if _in_circle(circle, *q):
+                continue
+            circle = _circle_from([p, q])
+            for k in range(j):
+                r = points[k]
+                if not _in_circle(circle, *r):
+                    circle = _circle_from([p, q, r])
+    return circle
+
+def midpoint_and_radius(lat, lon, method="diameter", pair=None):
+    """
+    Computes a midpoint and a radius (in meters) that describe a set of points.
+    Args:
+    - lat, lon: Arrays with the point coordinates in degrees.
+    - method: "diameter" uses the midpoint of the two farthest points and half their
+      geodesic distance; "mec" uses the true minimum enclosing circle.
+    - pair: Indices of the farthest pair when the caller already has them (see farthest_pair),
+      used by the "diameter" method instead of searching again.
+    Returns:
+    - Tuple containing the latitude and longitude of the midpoint and the radius in meters.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+
+    if method == "diameter":
+        import geopy.distance
+
+        i, j = farthest_pair(lat, lon) if pair is None else pair
+        midpoint_lat = (lat[i] + lat[j]) / 2
+        midpoint_lon = (lon[i] + lon[j]) / 2
+        # Only the winning pair goes through the (slow, exact) geodesic solve
+        radius = geopy.distance.distance((lat[i], lon[i]), (lat[j], lon[j])).meters / 2
+        return float(midpoint_lat), float(midpoint_lon), radius
+
+    if method == "mec":
+        lat0 = lat.mean()
+        x, y = project(lat, lon, lat0)
+        hull = convex_hull(x, y)
+        cx, cy, _ = minimum_enclosing_circle(x[hull], y[hull])
+        midpoint_lat, midpoint_lon = unproject(cx, cy, lat0)
+        # Measure the radius on the sphere so it really encloses every point
+        radius = haversine(midpoint_lat, midpoint_lon, lat[hull], lon[hull]).max()
+        return float(midpoint_lat), float(midpoint_lon), float(radius)
+
+    raise ValueError(f"Unknown method: {method}")
+
+def inlier_mask(lat, lon, groups=None, threshold=OUTLIER_THRESHOLD):
+    """
+    Flags the points that lie within a distance of the centroid of their group.
+    All groups are handled in one vectorized pass (bincount centroids + haversine).
+    Args:
+    - lat, lon: Arrays with the point coordinates in degrees.
+    - groups: Integer group code of every point (e.g. from pd.factorize); None for a single group.
+    - threshold: Maximum distance to the centroid in meters.
+    Returns:
+    - Boolean array, True for the points kept.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    groups = np.zeros(len(lat), dtype=int) if groups is None else np.asarray(groups)
+
+    counts = np.bincount(groups)
+    centroid_lat = np.bincount(groups, weights=lat) / np.maximum(counts, 1)
+    centroid_lon = np.bincount(groups, weights=lon) / np.maximum(counts, 1)
+    return haversine(lat, lon, centroid_lat[groups], centroid_lon[groups]) < threshold
+
+class CityGeometry:
+    """
+    Geometry of the offices of one city, computed once and shared by everything that needs it
+    (search areas, suitability surfaces, maps), so they all agree on the same circle.
+    Args:
+    - city: City name.
+    - lat, lon: Arrays with the office coordinates in degrees.
+    - threshold: Outlier distance to the centroid in meters.
+    - method: "diameter" or "mec" (see midpoint_and_radius).
+    - inliers: Precomputed inlier mask (e.g. from one inlier_mask pass over many cities), or None.
+    Attributes:
+    - latitude, longitude, radius: Midpoint and radius in meters (NaN when every office is an outlier).
+    - farthest: The two farthest inliers as ((lat, lon), (lat, lon)), or None.
+    - inliers: Boolean array aligned with lat/lon, True for the offices within the threshold.
+    - search_radius: Radius of the Foursquare searches in meters (radius x SEARCH_RADIUS_FRACTION).
+    A city whose offices are all outliers has no circle: check located before drawing or searching it.
+    """
+
+    def __init__(self, city, lat, lon, threshold=OUTLIER_THRESHOLD, method="diameter", inliers=None):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        self.city = city
+        if inliers is not None:
+            self.inliers = np.asarray(inliers, dtype=bool)
+        else:
+            self.inliers = inlier_mask(lat, lon, threshold=threshold) if len(lat) else np.zeros(0, dtype=bool)
+        self.latitude = self.longitude = self.radius = np.nan
+        self.farthest = None
+        self.search_radius = 0
+
+        inlier_lat, inlier_lon = lat[self.inliers], lon[self.inliers]
+        if len(inlier_lat):
+            i, j = farthest_pair(inlier_lat, inlier_lon)
+            self.farthest = ((float(inlier_lat[i]), float(inlier_lon[i])), (float(inlier_lat[j]), float(inlier_lon[j])))
+            self.latitude, self.longitude, self.radius = midpoint_and_radius(inlier_lat, inlier_lon, method=method,
+                                                                             pair=(i, j))
+            self.search_radius = int(self.radius * SEARCH_RADIUS_FRACTION)
+
+    @classmethod
+    def from_dataframe(cls, df, city, **kwargs):
+        """
+        Geometry of a city from a DataFrame with 'City', 'Latitude' and 'Longitude' columns.
+        """
+        city_df = df[df['City'] == city]
+        return cls(city, city_df['Latitude'], city_df['Longitude'], **kwargs)
+
+    def to_dict(self):
+        """
+        JSON-serializable form (without the inlier mask, which belongs with the offices).
+        """
+        return {
+            "city": self.city,
+            "latitude": float(self.latitude),
+            "longitude": float(self.longitude),
+            "radius": float(self.radius),
+            "farthest": self.farthest,
+            "search_radius": self.search_radius,
+        }
+
+    @classmethod
+    def from_dict(cls, data, inliers=None):
+        """
+        Rebuilds a geometry saved with to_dict, without recomputing anything.
+        """
+        result = cls.__new__(cls)
+        result.city = data["city"]
+        result.latitude, result.longitude, result.radius = data["latitude"], data["longitude"], data["radius"]
+        result.farthest = tuple(tuple(point) for point in data["farthest"]) if data["farthest"] else None
+        result.search_radius = data["search_radius"]
+        result.inliers = np.zeros(0, dtype=bool) if inliers is None else np.asarray(inliers, dtype=bool)
+        return result
+
+    @property
+    def located(self):
+        """
+        True when the city has a midpoint and radius (at least one inlier).
+        """
+        return self.farthest is not None
+
+    @property
+    def midpoint(self):
+        return self.latitude, self.longitude
+
+    @property
+    def search_area(self):
+        """
+        (latitude, longitude, radius) of the Foursquare searches.
+        """
+        return self.latitude, self.longitude, self.search_radius
+
+def compute_city_geometry(df, threshold=OUTLIER_THRESHOLD, method="diameter"):
+    """
+    Computes the midpoint and radius of every city in one call: the DataFrame is grouped once,
+    outliers are flagged for all cities together, and each city becomes a CityGeometry.
+    Args:
+    - df: DataFrame with 'City', 'Latitude' and 'Longitude' columns.
+    - threshold: Outlier distance to the city centroid in meters.
+    - method: "diameter" or "mec" (see midpoint_and_radius).
+    Returns:
+    - DataFrame with one row per city: 'City', 'Latitude', 'Longitude', 'Radius' (meters),
+      'Points' (offices in the city) and 'Outliers' (offices dropped by the threshold).
+      Cities without any inlier get NaN coordinates and radius.
+    """
+    codes, cities = pd.factorize(df['City'], sort=True)
+    lat = df['Latitude'].to_numpy(dtype=float)
+    lon = df['Longitude'].to_numpy(dtype=float)
+
+    # Drop rows without a city, then flag the outliers of every city at once
+    known = codes >= 0
+    codes, lat, lon = codes[known], lat[known], lon[known]
+    inliers = inlier_mask(lat, lon, codes, threshold)
+    n_points = np.bincount(codes, minlength=len(cities))
+    n_outliers = np.bincount(codes[~inliers], minlength=len(cities))
+
+    # Sort the offices by city so each city is one contiguous slice
+    order = np.argsort(codes, kind="stable")
+    lat, lon, inliers = lat[order], lon[order], inliers[order]
+    bounds = np.concatenate([[0], np.cumsum(n_points)])
+
+    midpoints = np.full((len(cities), 3), np.nan)
+    for i, city in enumerate(cities):
+        part = slice(bounds[i], bounds[i + 1])
+        city_geometry = CityGeometry(city, lat[part], lon[part], method=method, inliers=inliers[part])
+        midpoints[i] = city_geometry.latitude, city_geometry.longitude, city_geometry.radius
+
+    return pd.DataFrame({
+        'City': cities,
+        'Latitude': midpoints[:, 0],
+        'Longitude': midpoints[:, 1],
+        'Radius': midpoints[:, 2],
+        'Points': n_points,
+        'Outliers': n_outliers,
+    })
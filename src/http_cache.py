@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from . import config
+
+# Time to live of the cached responses of each endpoint (seconds)
+DEFAULT_TTLS = {
+    "foursquare": 7 * 24 * 3600,
+    "geocode": 90 * 24 * 3600,
+}
+
+# Maximum number of cached responses; the least recently used are evicted first
+MAX_ENTRIES = 100_000
+
+# Coordinates are rounded to this many decimals in the cache key (4 decimals is about 11 m)
+COORDINATE_PRECISION = 4
+
+class OfflineCacheMiss(LookupError):
+    """
+    Raised in offline mode when a response is not in the cache.
+    """
+
+class ResponseCache:
+    """
+    Persistent cache of API responses in a SQLite file, shared by threads and processes.
+    Keys are the endpoint plus the normalized request parameters (strings lowercased and
+    stripped, floats rounded to the coordinate precision). Every endpoint has its own TTL,
+    the cache is bounded with least-recently-used eviction, and hits/misses are counted.
+    In offline mode only cached responses are served (even expired ones) and a miss raises
+    OfflineCacheMiss, so the pipeline can be replayed without network access.
+    Args:
+    - path: SQLite file (defaults to responses.sqlite in the context's cache directory).
+    - ttls: Dictionary {endpoint: seconds} overriding DEFAULT_TTLS.
+    - max_entries: Size limit of the cache.
+    - precision: Decimals kept from float parameters in the key.
+    - offline: Serve only from the cache.
+    """
+
+    def __init__(self, path=None, ttls=None, max_entries=MAX_ENTRIES, precision=COORDINATE_PRECISION, offline=False):
+        if path is None:
+            os.makedirs(config.get_context().cache_dir, exist_ok=True)
+            path = os.path.join(config.get_context().cache_dir, "responses.sqlite")
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.precision = precision
+        self.offline = offline
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+        with self._connection() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connection(self):
+        # One connection per thread; WAL lets readers and a writer work at the same time
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _normalize(self, value):
+        if isinstance(value, float):
+            return round(value, self.precision)
+        if isinstance(value, str):
+            return value.strip().lower()
+        return value
+
+    def key(self, endpoint, params):
+        """
+        Cache key of a request.
+        """
+        normalized = {name: self._normalize(value) for name, value in params.items()}
+        return hashlib.sha1(json.dumps([endpoint, normalized], sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, endpoint, params):
+        """
+        Returns the cached response of a request, or None if missing or expired (online mode).
+        """
+        key = self.key(endpoint, params)
+        connection = self._connection()
+        row = connection.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or (not self.offline and time.time() - row[1] > self.ttls.get(endpoint, 0)):
+            return None
+        with connection:
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, endpoint, params, body):
+        """
+        Stores the response of a request, evicting old entries when the cache is full.
+        """
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, body, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (self.key(endpoint, params), endpoint, json.dumps(body), now, now),
+            )
+        with self._lock:
+            self._writes += 1
+            # Checking the size on every write would cost a count query per response
+            check = self._writes % 100 == 1
+        if check:
+            self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries above max_entries.
+        Returns:
+        - Number of entries deleted.
+        """
+        connection = self._connection()
+        with connection:
+            excess = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess <= 0:
+                return 0
+            connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (excess,))
+        return excess
+
+    def fetch(self, endpoint, params, request, cacheable=None):
+        """
+        Returns the cached response of a request, calling request() on a miss and caching its result.
+        Args:
+        - endpoint: Name of the endpoint (selects the TTL).
+        - params: Dictionary of request parameters (the cache key).
+        - request: Function without arguments that performs the request and returns the JSON body.
+        - cacheable: Function telling whether a body may be cached, or None to cache every body.
+          Error and throttling bodies must not be served for the whole TTL of the endpoint;
+          a stored body it rejects (cached before the predicate existed) counts as a miss.
+        Returns:
+        - JSON body.
+        """
+        body = self.get(endpoint, params)
+        if body is not None and cacheable is not None and not cacheable(body):
+            body = None
+        with self._lock:
+            (self.hits if body is not None else self.misses)[endpoint] += 1
+        if body is not None:
+            return body
+        if self.offline:
+            raise OfflineCacheMiss(f"{endpoint} response not cached: {params}")
+        body = request()
+        if cacheable is None or cacheable(body):
+            self.put(endpoint, params, body)
+        return body
+
+    def stats(self):
+        """
+        Hit/miss counters of this process and number of stored responses per endpoint.
+        """
+        rows = self._connection().execute("SELECT endpoint, COUNT(*) FROM responses GROUP BY endpoint").fetchall()
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "entries": dict(rows),
+        }
+
+@config.memoize
+def get_response_cache():
+    """
+    Shared response cache of the current context.
+    """
+    return ResponseCache(offline=config.get_context().offline)
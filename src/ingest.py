@@ -0,0 +1,131 @@
+import math
+
+import pandas as pd
+
+from . import fetcher
+from . import foursquare
+from . import tiling
+
+# Default number of venues buffered per collection before a bulk write
+BUFFER_SIZE = 1000
+
+def normalize_venue(venue, category, city):
+    """
+    Flattens the fields used downstream out of a Foursquare venue, once, next to the raw fields:
+    category, city, chain, address, locality, latitude, longitude and the GeoJSON point.
+    Args:
+    - venue: Foursquare venue as returned by the place search.
+    - category: Collection name of the query (e.g. 'Bar').
+    - city: City whose search returned the venue.
+    Returns:
+    - Dictionary ready to be stored.
+    """
+    main = venue.get('geocodes', {}).get('main', {})
+    location = venue.get('location') or {}
+    chains = venue.get('chains') or []
+    doc = {key: value for key, value in venue.items() if key != '_id'}
+    doc.update({
+        'category': category,
+        'city': city,
+        'chain': chains[0].get('name') if chains else None,
+        'address': location.get('formatted_address'),
+        'locality': location.get('locality'),
+        'latitude': main.get('latitude'),
+        'longitude': main.get('longitude'),
+    })
+    point = foursquare.venue_point(venue)
+    if point:
+        doc[foursquare.GEO_FIELD] = point
+    return doc
+
+class RunningAggregates:
+    """
+    Per (city, category) aggregates updated one venue at a time: number of venues, venues of a
+    chain, centroid and bounding box. Memory grows with the number of (city, category) pairs only.
+    They describe what one run fetched; the venue counts of the analysis come from the stored
+    venues (foursquare.count_matrix), which also holds the venues of earlier runs.
+    """
+
+    def __init__(self):
+        self._stats = {}
+
+    def add(self, doc):
+        stats = self._stats.get((doc['city'], doc['category']))
+        if stats is None:
+            stats = self._stats[(doc['city'], doc['category'])] = {
+                'Count': 0, 'Chains': 0, 'Located': 0, 'Latitude': 0.0, 'Longitude': 0.0,
+                'South': math.inf, 'North': -math.inf, 'West': math.inf, 'East': -math.inf,
+            }
+        stats['Count'] += 1
+        stats['Chains'] += doc.get('chain') is not None
+        lat, lon = doc.get('latitude'), doc.get('longitude')
+        if lat is not None and lon is not None:
+            stats['Located'] += 1
+            # Running means of the coordinates
+            stats['Latitude'] += (lat - stats['Latitude']) / stats['Located']
+            stats['Longitude'] += (lon - stats['Longitude']) / stats['Located']
+            stats['South'], stats['North'] = min(stats['South'], lat), max(stats['North'], lat)
+            stats['West'], stats['East'] = min(stats['West'], lon), max(stats['East'], lon)
+
+    def to_frame(self):
+        """
+        One row per (city, category) with its count, chain count, centroid and bounding box.
+        """
+        rows = [{'City': city, 'Category': category, **stats} for (city, category), stats in self._stats.items()]
+        return pd.DataFrame(rows, columns=['City', 'Category', 'Count', 'Chains', 'Located', 'Latitude',
+                                           'Longitude', 'South', 'North', 'West', 'East'])
+
+def iter_pages(categories, areas, complete=False, fetcher_=None):
+    """
+    Streams the search results of every (category, city) pair as the responses arrive.
+    Args:
+    - categories: Dictionary {collection name: Foursquare query}.
+    - areas: Dictionary {city: (latitude, longitude, radius)} as returned by city_search_areas.
+    - complete: Crawl each city with adaptive tiling (tiling.iter_crawl) instead of one page per pair.
+    - fetcher_: Fetcher to use (defaults to the shared one).
+    Yields:
+    - Tuples (collection name, city, list of venues), one per response.
+    """
+    fetcher_ = fetcher_ or fetcher.get_fetcher()
+    if complete:
+        for c_name, query in categories.items():
+            for city, venues in tiling.iter_crawl(query, areas, fetcher=fetcher_):
+                yield c_name, city, venues
+        return
+
+    pairs = [(c_name, query, city, area) for c_name, query in categories.items() for city, area in areas.items()]
+    searches = ({"query": query, "lat": lat, "lon": lon, "radius": radius} for _, query, _, (lat, lon, radius) in pairs)
+    for i, response in fetcher_.iter_search(searches):
+        yield pairs[i][0], pairs[i][2], response['results']
+
+def ingest(categories, areas, complete=False, buffer_size=BUFFER_SIZE, store=True, fetcher_=None):
+    """
+    Fetches, normalizes and stores the venues of every category in every city in one pass.
+    Each response flows through normalize_venue into the buffered bulk writer of its collection
+    and the running aggregates, and is dropped: memory is bounded by the fetcher's window and the
+    write buffers whether 150 or millions of venues are ingested.
+    Args:
+    - categories: Dictionary {collection name: Foursquare query}.
+    - areas: Dictionary {city: (latitude, longitude, radius)} as returned by city_search_areas.
+    - complete: Crawl every city with adaptive tiling so the counts are not capped by the 50-result page.
+    - buffer_size: Number of venues per bulk_write call.
+    - store: Write the venues to MongoDB (False only aggregates them).
+    - fetcher_: Fetcher to use (defaults to the shared one).
+    Returns:
+    - Tuple (aggregates, writes): the RunningAggregates and {collection name: inserted/updated/unchanged counts}.
+    """
+    aggregates = RunningAggregates()
+    writers = {}
+    try:
+        for c_name, city, venues in iter_pages(categories, areas, complete, fetcher_):
+            if store and c_name not in writers:
+                writers[c_name] = foursquare.VenueWriter(c_name, buffer_size)
+            for venue in venues:
+                doc = normalize_venue(venue, c_name, city)
+                aggregates.add(doc)
+                if store:
+                    writers[c_name].write(doc)
+    finally:
+        for writer in writers.values():
+            writer.flush()
+    return aggregates, {c_name: writer.counts for c_name, writer in writers.items()}
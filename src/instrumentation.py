@@ -0,0 +1,304 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Instrumentation is off unless $INSTRUMENT is set (or enable() is called)
+_enabled = os.getenv("INSTRUMENT", "").lower() in ("1", "true", "yes")
+
+# Upper bounds of the HTTP latency histogram buckets (seconds); slower requests fall in the last bucket
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Events kept for the trace; the per-name statistics keep counting after the limit
+MAX_EVENTS = 100_000
+
+class Recorder:
+    """
+    Collects timing spans, MongoDB commands and HTTP requests of this process.
+    Every event updates the statistics of its name (count, total, max) and, up to MAX_EVENTS,
+    is kept with its start time and thread for the Chrome trace.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.origin = time.perf_counter()
+        self.started = time.time()
+        self.events = []
+        self.dropped = 0
+        self.stats = {}
+        self.http = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, category, start, duration, args=None):
+        """
+        Records an event.
+        Args:
+        - name: Name of the span (e.g. 'companies_gaming.top_cities', 'mongo.aggregate').
+        - category: 'function', 'mongo' or 'http'.
+        - start: time.perf_counter() at the start of the event.
+        - duration: Seconds.
+        - args: Dictionary of details shown in the trace.
+        """
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = {"category": category, "count": 0, "total": 0.0, "max": 0.0, "errors": 0}
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+            if args:
+                stats["errors"] += "error" in args
+                if "documents" in args:
+                    stats["documents"] = stats.get("documents", 0) + (args["documents"] or 0)
+            if len(self.events) < self.max_events:
+                self.events.append((name, category, start, duration, threading.get_ident(), args))
+            else:
+                self.dropped += 1
+
+    def add_http(self, api, status, start, duration):
+        """
+        Records an HTTP request in the latency and status histograms of its API.
+        """
+        with self._lock:
+            http = self.http.get(api)
+            if http is None:
+                http = self.http[api] = {"count": 0, "total": 0.0, "max": 0.0, "statuses": {},
+                                         "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            http["count"] += 1
+            http["total"] += duration
+            http["max"] = max(http["max"], duration)
+            http["statuses"][str(status)] = http["statuses"].get(str(status), 0) + 1
+            http["buckets"][bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+        self.add(f"http.{api}", "http", start, duration, {"status": status})
+
+    def _quantile(self, buckets, q):
+        # Upper bound of the bucket holding the quantile (None for the overflow bucket)
+        target, seen = q * sum(buckets), 0
+        for bound, count in zip(LATENCY_BUCKETS + (None,), buckets):
+            seen += count
+            if count and seen >= target:
+                return bound
+        return None
+
+    def report(self):
+        """
+        Statistics of every span name and HTTP API.
+        Returns:
+        - Dictionary with 'spans' {name: count, total, mean, max (seconds), errors and documents
+          returned for MongoDB commands}, sorted by total time, and 'http' {api: count, latency
+          statistics, status counts, histogram and approximate p50/p95/p99}.
+        """
+        with self._lock:
+            spans = {
+                name: {**stats, "mean": stats["total"] / stats["count"]}
+                for name, stats in sorted(self.stats.items(), key=lambda item: -item[1]["total"])
+            }
+            http = {}
+            for api, stats in self.http.items():
+                http[api] = {
+                    "count": stats["count"],
+                    "total": stats["total"],
+                    "mean": stats["total"] / stats["count"],
+                    "max": stats["max"],
+                    "statuses": dict(stats["statuses"]),
+                    "histogram": {f"<={bound}": count for bound, count in zip(LATENCY_BUCKETS, stats["buckets"])}
+                                 | {f">{LATENCY_BUCKETS[-1]}": stats["buckets"][-1]},
+                    **{f"p{int(q * 100)}": self._quantile(stats["buckets"], q) for q in (0.5, 0.95, 0.99)},
+                }
+            return {"started": self.started, "events": len(self.events), "dropped": self.dropped,
+                    "spans": spans, "http": http}
+
+    def chrome_trace(self):
+        """
+        Events in the Chrome trace event format (chrome://tracing, Perfetto).
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {"name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid,
+                 "ts": (start - self.origin) * 1e6, "dur": duration * 1e6, "args": args or {}}
+                for name, category, start, duration, tid, args in events
+            ],
+        }
+
+_recorder = Recorder()
+
+def enable():
+    """
+    Starts recording spans, MongoDB commands and HTTP requests.
+    """
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    """
+    Drops everything recorded so far.
+    """
+    global _recorder
+    _recorder = Recorder()
+
+def get_recorder():
+    return _recorder
+
+class _NullSpan:
+    # Returned while disabled: entering and leaving it does nothing
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _recorder.add(self.name, self.category, self.start, duration, self.args)
+        return False
+
+    def set(self, **args):
+        """
+        Adds details to the span (e.g. the number of rows produced).
+        """
+        self.args.update(args)
+
+def span(name, category="function", **args):
+    """
+    Context manager timing a block of code:
+        with instrumentation.span("geometry", city=city):
+            ...
+    While instrumentation is disabled it returns a shared object that does nothing.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, args)
+
+def traced(func=None, *, name=None):
+    """
+    Decorator timing every call of a function, under '<module>.<qualified name>' by default.
+    While instrumentation is disabled a call costs one extra function call and a flag check.
+    Usable bare (@traced) or with a name (@traced(name="...")).
+    """
+    if func is None:
+        return functools.partial(traced, name=name)
+    span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        with _Span(span_name, "function", {}):
+            return func(*args, **kwargs)
+    return wrapper
+
+def record_http(api, status, start, duration):
+    """
+    Records an HTTP request (status 0 for a connection error or timeout).
+    Args:
+    - api: Name of the API (e.g. 'foursquare').
+    - status: HTTP status code.
+    - start: time.perf_counter() before the request.
+    - duration: Seconds until the response.
+    """
+    if _enabled:
+        _recorder.add_http(api, status, start, duration)
+
+_command_listener = None
+
+def command_listener():
+    """
+    pymongo CommandListener recording the duration and number of returned documents of every
+    MongoDB command while instrumentation is enabled. Attached to the clients created by
+    config.Context; pymongo is only imported here.
+    """
+    global _command_listener
+    if _command_listener is not None:
+        return _command_listener
+    from pymongo import monitoring
+
+    class CommandListener(monitoring.CommandListener):
+
+        def __init__(self):
+            self._collections = {}
+
+        def started(self, event):
+            if _enabled:
+                target = event.command.get(event.command_name)
+                self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else None
+
+        def _record(self, event, args):
+            collection = self._collections.pop((event.connection_id, event.request_id), None)
+            duration = event.duration_micros / 1e6
+            args = {"database": event.database_name, "collection": collection, **args}
+            _recorder.add(f"mongo.{event.command_name}", "mongo", time.perf_counter() - duration, duration, args)
+
+        def succeeded(self, event):
+            if not _enabled:
+                self._collections.pop((event.connection_id, event.request_id), None)
+                return
+            reply = event.reply
+            cursor = reply.get("cursor")
+            if cursor is not None:
+                documents = len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+            else:
+                documents = reply.get("n")
+            self._record(event, {"documents": documents})
+
+        def failed(self, event):
+            if not _enabled:
+                self._collections.pop((event.connection_id, event.request_id), None)
+                return
+            self._record(event, {"error": str(event.failure.get("errmsg", event.failure))})
+
+    _command_listener = CommandListener()
+    return _command_listener
+
+def report():
+    """
+    Statistics of everything recorded (see Recorder.report).
+    """
+    return _recorder.report()
+
+def export_json(path):
+    """
+    Writes the report to a JSON file.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report(), f, indent=4)
+    return path
+
+def export_chrome_trace(path):
+    """
+    Writes the recorded events as a Chrome trace (open it in chrome://tracing or ui.perfetto.dev).
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(_recorder.chrome_trace(), f)
+    return path
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from . import config
+
+# Default size limit of the extraction cache (bytes); least recently used entries are evicted first
+MAX_CACHE_BYTES = 512 * 1024 ** 2
+
+def collection_fingerprint(collection, updated_field=None):
+    """
+    Cheap summary of a collection that changes whenever documents are inserted or deleted:
+    estimated document count (collection metadata) and largest _id (read from the _id index).
+    In-place updates are not seen; writers call invalidate() after them.
+    Args:
+    - collection: MongoDB collection.
+    - updated_field: Field with the last update time of a document, also summarized when given.
+      It must be indexed and hold BSON dates: sorting an unindexed field scans the collection, and
+      string timestamps (like the Crunchbase updated_at) sort alphabetically, not by time.
+    Returns:
+    - String fingerprint.
+    """
+    count = collection.estimated_document_count()
+    last = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    parts = [count, last["_id"] if last else None]
+    if updated_field:
+        updated = collection.find_one({updated_field: {"$exists": True}}, {"_id": 0, updated_field: 1},
+                                      sort=[(updated_field, -1)])
+        parts.append(updated[updated_field] if updated else None)
+    return json.dumps(parts, default=str)
+
+def _hash(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _cache_root(cache_dir):
+    root = os.path.join(cache_dir or config.get_context().cache_dir, "offices")
+    os.makedirs(root, exist_ok=True)
+    return root
+
+def _store(path, df):
+    """
+    Writes a DataFrame as one .npy file per column; text columns become fixed-width unicode
+    arrays (memory-mappable) with a separate mask for missing values.
+    """
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        if pd.api.types.is_numeric_dtype(values):
+            np.save(os.path.join(path, f"{i}.npy"), values.to_numpy())
+            columns.append({"name": name, "text": False})
+        else:
+            missing = values.isna().to_numpy()
+            np.save(os.path.join(path, f"{i}.npy"), values.fillna("").astype(str).to_numpy(dtype=str))
+            np.save(os.path.join(path, f"{i}.missing.npy"), missing)
+            columns.append({"name": name, "text": True})
+    with open(os.path.join(path, "columns.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f)
+
+def _load(path):
+    """
+    Memory-maps the column files written by _store back into a DataFrame.
+    """
+    with open(os.path.join(path, "columns.json"), encoding="utf-8") as f:
+        columns = json.load(f)
+    data = {}
+    for i, column in enumerate(columns):
+        values = np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r")
+        if column["text"]:
+            values = values.astype(object)
+            values[np.load(os.path.join(path, f"{i}.missing.npy"))] = None
+        data[column["name"]] = values
+    return pd.DataFrame(data)
+
+def _entry_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path))
+
+def evict(cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+    """
+    Removes the least recently used cache entries until the cache fits in max_bytes.
+    Args:
+    - cache_dir: Cache directory (defaults to the context's).
+    - max_bytes: Size limit in bytes.
+    Returns:
+    - Number of entries removed.
+    """
+    root = _cache_root(cache_dir)
+    entries = sorted((entry for entry in os.scandir(root) if entry.is_dir()), key=lambda entry: entry.stat().st_mtime)
+    sizes = [_entry_size(entry.path) for entry in entries]
+    total = sum(sizes)
+    removed = 0
+    for entry, size in zip(entries, sizes):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry.path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+def invalidate(collection, cache_dir=None):
+    """
+    Removes every cached extraction of a collection. Needed after in-place updates, which the
+    fingerprint cannot see (no document inserted or deleted).
+    Args:
+    - collection: MongoDB collection.
+    - cache_dir: Cache directory (defaults to the context's).
+    Returns:
+    - Number of entries removed.
+    """
+    root = _cache_root(cache_dir)
+    prefix = f"{_hash(collection.full_name)}-"
+    removed = 0
+    for entry in os.scandir(root):
+        if entry.name.startswith(prefix):
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
+
+def load_or_extract(collection, query, extract, cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+    """
+    Returns the result of an extraction from the cache, running it only when the query is new
+    or the collection changed since it was cached.
+    The key combines the collection name, the query (pipeline/projection) and the collection
+    fingerprint, so entries invalidate themselves; stale entries of the same query are removed.
+    Args:
+    - collection: MongoDB collection the extraction reads.
+    - query: JSON-serializable description of the query (e.g. the aggregation pipeline).
+    - extract: Function without arguments returning the DataFrame to cache.
+    - cache_dir: Cache directory (defaults to the context's).
+    - max_bytes: Size limit of the cache in bytes.
+    Returns:
+    - DataFrame.
+    """
+    root = _cache_root(cache_dir)
+    query_key = f"{_hash(collection.full_name)}-{_hash(query)}"
+    path = os.path.join(root, f"{query_key}-{_hash(collection_fingerprint(collection))}")
+
+    if os.path.isdir(path):
+        os.utime(path)  # Mark as recently used
+        return _load(path)
+
+    df = extract()
+
+    # Write into a temporary directory and rename it, so readers never see half an entry
+    tmp = tempfile.mkdtemp(dir=root, prefix=".tmp-")
+    try:
+        _store(tmp, df)
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Drop entries of the same query made against an older version of the collection
+    for entry in os.scandir(root):
+        if entry.name.startswith(f"{query_key}-") and entry.path != path:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    evict(cache_dir, max_bytes)
+    return df
@@ -0,0 +1,416 @@
+"""
+Batch entry point of the analysis: company extraction -> city geometry -> venue fetch ->
+counting -> scoring -> charts and maps, declared as a DAG of stages with cached artifacts.
+
+Run from the repository root:
+    python -m src.pipeline
+    python -m src.pipeline --weights Bar=0.5 Club=0.1
+    python -m src.pipeline --cities "San Francisco" "New York" London --out report --trace trace.json
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import pickle
+import re
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from . import companies_gaming
+from . import config
+from . import foursquare
+from . import geometry
+from . import ingest
+from . import instrumentation
+from . import office_cache
+from . import visualization
+from .scoring import ScoringEngine
+from .snapshot import Snapshot
+
+# Categories of the pie charts, in the order create_dual_pie_charts draws them
+CHART_CATEGORIES = ('Schools', 'Starbucks', 'Club', 'Bar')
+
+class Stage:
+    """
+    One step of the pipeline: func(*input values, **params) returns the stage's artifact.
+    The artifact is cached under a key hashing the stage's name, version, params and fingerprint
+    plus the content hash of every upstream artifact, so a stage runs again only when one of
+    them changed, and a stage whose upstream ran again but produced the same content is skipped.
+    Args:
+    - name: Unique name (e.g. 'fetch:Bar').
+    - func: Function computing the artifact (module-level when executor is "process").
+    - inputs: Names of the stages whose artifacts are passed to func, in order.
+    - after: Names of stages that must run first without passing their artifacts (side effects).
+    - params: Keyword arguments of func, part of the key (must be JSON serializable).
+    - fingerprint: Extra value hashed into the key, e.g. the state of a source collection.
+    - version: Bump it when func changes in a way that invalidates its artifacts.
+    - executor: "thread" (I/O bound), "process" (CPU bound) or "main" (the calling thread, e.g. for pyplot).
+    - files: The artifact is a list of output files; the stage runs again if one of them is missing.
+    """
+
+    def __init__(self, name, func, inputs=(), after=(), params=None, fingerprint=None, version=1,
+                 executor="thread", files=False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.after = tuple(after)
+        self.params = params or {}
+        self.fingerprint = fingerprint
+        self.version = version
+        self.executor = executor
+        self.files = files
+
+    def key(self, hashes):
+        """
+        Cache key given the content hashes of the upstream artifacts.
+        """
+        upstream = [hashes[name] for name in self.inputs + self.after]
+        payload = json.dumps([self.name, self.version, self.params, self.fingerprint, upstream],
+                             sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+class ArtifactStore:
+    """
+    Pickled artifacts under <root>/<stage>/<key>.pkl, next to a small JSON file with their content
+    hash, so cached stages are skipped without loading their artifacts. Files are written atomically.
+    Args:
+    - root: Directory of the artifacts (defaults to pipeline in the context's cache directory).
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(config.get_context().cache_dir, "pipeline")
+
+    def _path(self, stage, key, suffix):
+        return os.path.join(self.root, re.sub(r"[^\w.-]", "_", stage.name), f"{key}{suffix}")
+
+    def meta(self, stage, key):
+        """
+        Metadata of a cached artifact ({"hash", "seconds", "created"}), or None.
+        """
+        try:
+            with open(self._path(stage, key, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load(self, stage, key):
+        with open(self._path(stage, key, ".pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def save(self, stage, key, value, seconds):
+        """
+        Stores an artifact.
+        Returns:
+        - Its content hash.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {"hash": hashlib.sha1(data).hexdigest(), "seconds": seconds, "created": time.time()}
+        for suffix, payload in ((".pkl", data), (".json", json.dumps(meta).encode())):
+            path = self._path(stage, key, suffix)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        return meta["hash"]
+
+def _timed(name, func, args, params):
+    start = time.perf_counter()
+    with instrumentation.span(f"pipeline.{name}"):
+        value = func(*args, **params)
+    return value, time.perf_counter() - start
+
+class Pipeline:
+    """
+    Runs stages in dependency order. Stages whose key is cached are skipped (their artifacts are
+    only loaded if a stage that runs needs them); independent stages run concurrently, on a
+    thread pool or, for CPU bound ones, a process pool.
+    Args:
+    - stages: List of Stage objects, in any order.
+    - store: ArtifactStore (defaults to the context's).
+    - workers: Size of the worker pools (defaults to the number of CPUs).
+    - force: True to run every stage, or a list of stage names (or prefixes such as 'fetch:') to run again.
+    """
+
+    def __init__(self, stages, store=None, workers=None, force=False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.store = store or ArtifactStore()
+        self.workers = workers or os.cpu_count()
+        self.force = force
+        for stage in stages:
+            missing = [name for name in stage.inputs + stage.after if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+        self._values = {}
+        self.results = {}
+
+    def _forced(self, stage):
+        if self.force is True:
+            return True
+        return any(stage.name == name or (name.endswith(":") and stage.name.startswith(name))
+                   for name in self.force or ())
+
+    def value(self, name):
+        """
+        Artifact of a stage of the last run (loaded from the store if the stage was skipped).
+        """
+        if name not in self._values:
+            self._values[name] = self.store.load(self.stages[name], self.results[name]["key"])
+        return self._values[name]
+
+    def _cached(self, stage, key):
+        if self._forced(stage):
+            return None
+        meta = self.store.meta(stage, key)
+        if meta is None:
+            return None
+        if stage.files:
+            try:
+                files = self.store.load(stage, key)
+            except FileNotFoundError:
+                return None
+            if not all(os.path.exists(file) for file in files):
+                return None
+            self._values[stage.name] = files
+        return meta
+
+    def _finish(self, stage, key, value, seconds):
+        content_hash = self.store.save(stage, key, value, seconds)
+        self._values[stage.name] = value
+        self.results[stage.name] = {"key": key, "hash": content_hash, "status": "ran", "seconds": seconds}
+
+    def run(self):
+        """
+        Runs the stages that are not cached.
+        Returns:
+        - Dictionary {stage: {"key", "hash", "status" ("ran" or "cached"), "seconds"}}.
+        """
+        self._values, self.results = {}, {}
+        remaining = dict(self.stages)
+        running = {}
+        threads = ThreadPoolExecutor(self.workers)
+        processes = None
+        try:
+            while remaining or running:
+                hashes = {name: result["hash"] for name, result in self.results.items()}
+                main_thread = []
+                progress = True
+                while progress:
+                    progress = False
+                    for name, stage in list(remaining.items()):
+                        if any(dep not in hashes for dep in stage.inputs + stage.after):
+                            continue
+                        del remaining[name]
+                        progress = True
+                        key = stage.key(hashes)
+                        meta = self._cached(stage, key)
+                        if meta is not None:
+                            self.results[name] = {"key": key, "hash": meta["hash"], "status": "cached", "seconds": 0.0}
+                            hashes[name] = meta["hash"]
+                            continue
+                        args = [self.value(dep) for dep in stage.inputs]
+                        if stage.executor == "main":
+                            main_thread.append((stage, key, args))
+                        elif stage.executor == "process":
+                            processes = processes or ProcessPoolExecutor(self.workers)
+                            running[processes.submit(_timed, name, stage.func, args, stage.params)] = (stage, key)
+                        else:
+                            running[threads.submit(_timed, name, stage.func, args, stage.params)] = (stage, key)
+
+                # Stages bound to this thread run while the pools work on the others
+                for stage, key, args in main_thread:
+                    self._finish(stage, key, *_timed(stage.name, stage.func, args, stage.params))
+                if main_thread:
+                    continue
+                if not running:
+                    if remaining:
+                        raise ValueError(f"Dependency cycle between stages: {', '.join(remaining)}")
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, key = running.pop(future)
+                    self._finish(stage, key, *future.result())
+        finally:
+            threads.shutdown(wait=True, cancel_futures=True)
+            if processes is not None:
+                processes.shutdown(wait=True, cancel_futures=True)
+        return self.results
+
+# Stage functions (module level so the process pool can pickle them)
+
+def extract_offices(cities, tag):
+    return companies_gaming.cities_location(cities, tag=tag)
+
+def compute_geometry(offices, cities):
+    """
+    Geometry of every city: {city: {"geometry": CityGeometry.to_dict(), "inliers": mask of its offices}}.
+    """
+    missing = [city for city in cities if not (offices['City'] == city).any()]
+    if missing:
+        raise ValueError(f"No offices found in: {', '.join(missing)}")
+    result = {}
+    for city in cities:
+        city_geometry = geometry.CityGeometry.from_dataframe(offices, city)
+        result[city] = {"geometry": city_geometry.to_dict(), "inliers": city_geometry.inliers}
+    unlocated = [city for city in cities if result[city]["geometry"]["farthest"] is None]
+    if unlocated:
+        raise ValueError(f"Every office is an outlier in: {', '.join(unlocated)}")
+    return result
+
+def _search_areas(geometries):
+    return {city: geometry.CityGeometry.from_dict(entry["geometry"]).search_area for city, entry in geometries.items()}
+
+def fetch_category(geometries, c_name, query, complete):
+    """
+    Fetches and stores the venues of one category around every city; returns the counts of the
+    stored venues inside each search area.
+    """
+    areas = _search_areas(geometries)
+    ingest.ingest({c_name: query}, areas, complete)
+    return foursquare.count_matrix([c_name], areas)
+
+def merge_counts(*frames):
+    return functools.reduce(lambda left, right: pd.merge(left, right, on='City'), frames)
+
+def score_cities(counts, criteria):
+    return ScoringEngine(criteria).fit(counts).to_frame()
+
+def load_city_venues(geometries, city):
+    return foursquare.load_venues(area=_search_areas(geometries)[city]).assign(City=city)
+
+def _offices_with_inliers(offices, geometries):
+    return pd.concat([offices[offices['City'] == city].assign(Inlier=entry["inliers"])
+                      for city, entry in geometries.items()], ignore_index=True)
+
+def save_snapshot(scores, geometries, offices, *venues, criteria):
+    """
+    Saves the metrics snapshot read by the notebook's charts and maps; returns its directory.
+    """
+    snapshot = Snapshot(scores, {city: entry["geometry"] for city, entry in geometries.items()},
+                        _offices_with_inliers(offices, geometries), pd.concat(venues, ignore_index=True),
+                        criteria=criteria)
+    return snapshot.save()
+
+def render_charts(df, out_dir, categories, figures):
+    os.makedirs(out_dir, exist_ok=True)
+    return visualization.save_charts(out_dir, categories, Snapshot(df, {}, None, None, version="pipeline"), figures)
+
+def render_map(geometries, offices, venues, city, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    geometries = {city: geometries[city]}
+    snapshot = Snapshot(None, {city: geometries[city]["geometry"]}, _offices_with_inliers(offices, geometries), venues,
+                        version="pipeline")
+    # No file when the city has no map (see visualization.create_city_map)
+    file = visualization.save_city_map(out_dir, city, snapshot)
+    return [file] if file else []
+
+def build_stages(cities=companies_gaming.TOP_3_CITIES, criteria=None, categories=None, out_dir="report",
+                 tag="gaming", complete=False):
+    """
+    The stages of the analysis:
+    - offices: offices of the companies carrying the tag in the cities (keyed on the state of the collection);
+    - geometry: midpoint, radius, inliers and search area of every city;
+    - fetch:<category>: Foursquare venues of each category, stored in MongoDB and counted (in parallel);
+    - counts, scoring: the count matrix and the weighted scores;
+    - venues:<city>: the stored venues inside each city's search area;
+    - snapshot: the metrics snapshot (see snapshot.Snapshot);
+    - charts:counts, charts:score, map:<city>: the pie charts and one map per city (maps in parallel processes).
+    Maps and count charts do not depend on the scores: a change of weights only runs scoring,
+    snapshot and the score chart.
+    Args:
+    - cities: List of city names.
+    - criteria: Scoring criteria (defaults to config.SCORING_CRITERIA).
+    - categories: Dictionary {collection name: Foursquare query} (defaults to foursquare.CATEGORIES).
+    - out_dir: Directory of the charts and maps.
+    - tag: Tag of the companies.
+    - complete: Crawl every city with adaptive tiling (see ingest.ingest).
+    Returns:
+    - List of Stage objects.
+    """
+    cities = list(cities)
+    criteria = criteria or config.SCORING_CRITERIA
+    categories = categories or foursquare.CATEGORIES
+
+    stages = [
+        Stage("offices", extract_offices, params={"cities": cities, "tag": tag},
+              fingerprint=office_cache.collection_fingerprint(companies_gaming.get_collection())),
+        Stage("geometry", compute_geometry, inputs=["offices"], params={"cities": cities}),
+    ]
+    fetches = [f"fetch:{c_name}" for c_name in categories]
+    for c_name, query in categories.items():
+        stages.append(Stage(f"fetch:{c_name}", fetch_category, inputs=["geometry"],
+                            params={"c_name": c_name, "query": query, "complete": complete}))
+    stages += [
+        Stage("counts", merge_counts, inputs=fetches, executor="main"),
+        Stage("scoring", score_cities, inputs=["counts"], params={"criteria": criteria}, executor="main"),
+    ]
+    for city in cities:
+        stages.append(Stage(f"venues:{city}", load_city_venues, inputs=["geometry"], after=fetches, params={"city": city}))
+    venues = [f"venues:{city}" for city in cities]
+    stages += [
+        Stage("snapshot", save_snapshot, inputs=["scoring", "geometry", "offices"] + venues,
+              params={"criteria": criteria}, executor="main"),
+        # pyplot keeps global state: the charts are drawn on the calling thread. The count charts
+        # do not depend on the weights, only the score chart is drawn again when they change.
+        Stage("charts:counts", render_charts, inputs=["counts"],
+              params={"out_dir": out_dir, "categories": CHART_CATEGORIES, "figures": [1, 2]}, executor="main", files=True),
+        Stage("charts:score", render_charts, inputs=["scoring"],
+              params={"out_dir": out_dir, "categories": CHART_CATEGORIES, "figures": [3]}, executor="main", files=True),
+    ]
+    for city in cities:
+        stages.append(Stage(f"map:{city}", render_map, inputs=["geometry", "offices", f"venues:{city}"],
+                            params={"city": city, "out_dir": out_dir}, executor="process", files=True))
+    return stages
+
+def _criteria_with_weights(weights):
+    # NAME=VALUE pairs; NAME is a criterion ('Bar Count') or a category ('Bar')
+    criteria = {name: dict(spec) for name, spec in config.SCORING_CRITERIA.items()}
+    for item in weights or ():
+        name, _, value = item.partition("=")
+        name = name if name in criteria else f"{name} Count"
+        if name not in criteria:
+            raise SystemExit(f"Unknown criterion in --weights: {item} (known: {', '.join(criteria)})")
+        criteria[name]["weight"] = float(value)
+    return criteria
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.pipeline", description="Runs the office location analysis.")
+    parser.add_argument("--cities", nargs="+", default=companies_gaming.TOP_3_CITIES, help="cities to compare")
+    parser.add_argument("--weights", nargs="+", metavar="NAME=WEIGHT", help="scoring weights, e.g. Bar=0.5")
+    parser.add_argument("--tag", default="gaming", help="tag of the companies")
+    parser.add_argument("--complete", action="store_true", help="crawl every city with adaptive tiling")
+    parser.add_argument("--out", default="report", help="directory of the charts and maps")
+    parser.add_argument("--workers", type=int, default=None, help="size of the worker pools")
+    parser.add_argument("--force", nargs="*", metavar="STAGE",
+                        help="run stages again even if cached (all of them without names; 'fetch:' for every fetch)")
+    parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace to FILE and a report to FILE.report.json")
+    args = parser.parse_args(argv)
+
+    # Headless rendering, without importing matplotlib unless a chart is drawn
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    if args.trace:
+        instrumentation.enable()
+
+    start = time.perf_counter()
+    stages = build_stages(args.cities, _criteria_with_weights(args.weights), out_dir=args.out, tag=args.tag,
+                          complete=args.complete)
+    force = True if args.force == [] else (args.force or False)
+    results = Pipeline(stages, workers=args.workers, force=force).run()
+    elapsed = time.perf_counter() - start
+
+    for name, result in results.items():
+        print(f"{name:>24}  {result['status']:<6} {result['seconds']:8.2f} s  {result['hash'][:10]}")
+    ran = sum(result["status"] == "ran" for result in results.values())
+    print(f"{ran} of {len(results)} stages ran in {elapsed:.2f} s; outputs in {args.out}")
+
+    if args.trace:
+        instrumentation.export_chrome_trace(args.trace)
+        instrumentation.export_json(f"{args.trace}.report.json")
+
+if __name__ == "__main__":
+    main()
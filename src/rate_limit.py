@@ -0,0 +1,186 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from . import config
+
+# Request ceiling of every API: tokens per second, bucket size and calls per API key and UTC day
+# (None for no quota). geocode.xyz allows about one request per second without an API key.
+DEFAULT_LIMITS = {
+    "foursquare": {"rate": 50.0, "burst": 50, "daily_quota": None},
+    "geocode": {"rate": 1.0, "burst": 1, "daily_quota": None},
+}
+
+class QuotaExceeded(RuntimeError):
+    """
+    Raised when the calls charged to an API key today reach its daily quota.
+    """
+
+class RateLimiter:
+    """
+    Token bucket shared by all the threads and processes of a host through a SQLite file.
+    Every call takes a token and tokens refill at rate per second up to burst. A call that finds
+    the bucket empty reserves the next token and sleeps until it is due, so concurrent workers are
+    spaced at exactly the allowed rate without polling. block() pauses the bucket for every worker
+    (the Retry-After of a 429). Calls and throttled calls are counted per API key and UTC day,
+    against an optional daily quota.
+    Args:
+    - name: Name of the API (e.g. "foursquare"); every API and key pair has its own bucket.
+    - rate: Tokens per second.
+    - burst: Size of the bucket.
+    - key: API key the calls are charged to (only a hash of it is stored).
+    - daily_quota: Maximum calls per key and day, or None.
+    - path: SQLite file (defaults to rate_limit.sqlite in the context's cache directory).
+    """
+
+    def __init__(self, name, rate, burst=1, key=None, daily_quota=None, path=None):
+        if path is None:
+            os.makedirs(config.get_context().cache_dir, exist_ok=True)
+            path = os.path.join(config.get_context().cache_dir, "rate_limit.sqlite")
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.key = hashlib.sha1(f"{name}|{key or ''}".encode()).hexdigest()[:12]
+        self.daily_quota = daily_quota
+        self.path = path
+        self.calls = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self._started = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )""")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                key TEXT NOT NULL,
+                day TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                throttled INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (key, day)
+            )""")
+
+    def _connection(self):
+        # One connection per thread, in autocommit mode so transactions are opened explicitly
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _transaction(self, update):
+        # BEGIN IMMEDIATE takes the write lock up front: one process at a time reads and updates the bucket
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = update(connection, time.time())
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    def _bucket(self, connection, now):
+        # Tokens available now; 'updated' lies in the future while the bucket is blocked
+        row = connection.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.key,)).fetchone()
+        tokens, updated = row if row else (float(self.burst), now)
+        if now > updated:
+            tokens, updated = min(self.burst, tokens + (now - updated) * self.rate), now
+        return tokens, updated
+
+    def _count(self, connection, now, calls=0, throttled=0):
+        connection.execute(
+            "INSERT INTO usage (key, day, calls, throttled) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key, day) DO UPDATE SET calls = calls + excluded.calls, throttled = throttled + excluded.throttled",
+            (self.key, time.strftime("%Y-%m-%d", time.gmtime(now)), calls, throttled),
+        )
+
+    def acquire(self):
+        """
+        Takes a token, sleeping until it is due.
+        Raises:
+        - QuotaExceeded if the daily quota of the key is spent.
+        Returns:
+        - Seconds waited.
+        """
+        def update(connection, now):
+            if self.daily_quota is not None:
+                row = connection.execute("SELECT calls FROM usage WHERE key = ? AND day = ?",
+                                         (self.key, time.strftime("%Y-%m-%d", time.gmtime(now)))).fetchone()
+                if row and row[0] >= self.daily_quota:
+                    raise QuotaExceeded(f"{self.name}: daily quota of {self.daily_quota} calls spent")
+            tokens, updated = self._bucket(connection, now)
+            tokens -= 1
+            connection.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                               (self.key, tokens, updated))
+            self._count(connection, now, calls=1)
+            return now, (updated - now) + max(-tokens, 0) / self.rate
+
+        now, delay = self._transaction(update)
+        with self._lock:
+            self.calls += 1
+            self.waited += delay
+            self._started = self._started or now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def block(self, seconds):
+        """
+        Pauses the bucket for every worker for the given seconds (e.g. the Retry-After of a 429)
+        and empties it, so the workers resume at the allowed rate instead of all at once.
+        """
+        def update(connection, now):
+            tokens, updated = self._bucket(connection, now)
+            connection.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                               (self.key, min(tokens, 0.0), max(updated, now + seconds)))
+            self._count(connection, now, throttled=1)
+
+        self._transaction(update)
+        with self._lock:
+            self.throttled += 1
+
+    def usage(self):
+        """
+        Calls and throttled calls of every key and day, from all processes.
+        Returns:
+        - DataFrame with 'Key', 'Day', 'Calls' and 'Throttled'.
+        """
+        rows = self._connection().execute("SELECT key, day, calls, throttled FROM usage ORDER BY day, key").fetchall()
+        return pd.DataFrame(rows, columns=["Key", "Day", "Calls", "Throttled"])
+
+    def metrics(self):
+        """
+        Throughput of this process (calls, throttled calls, seconds spent waiting and calls per
+        second since the first call) and today's usage of the key across processes.
+        """
+        today = time.strftime("%Y-%m-%d", time.gmtime())
+        row = self._connection().execute("SELECT calls, throttled FROM usage WHERE key = ? AND day = ?",
+                                         (self.key, today)).fetchone() or (0, 0)
+        elapsed = time.time() - self._started if self._started else 0.0
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "waited": round(self.waited, 3),
+            "throughput": self.calls / elapsed if elapsed else 0.0,
+            "today": {"calls": row[0], "throttled": row[1], "quota": self.daily_quota},
+        }
+
+@config.memoize
+def get_limiter(name):
+    """
+    Shared rate limiter of an API (see DEFAULT_LIMITS), charged to the context's API key.
+    """
+    key = config.get_context().token if name == "foursquare" else None
+    return RateLimiter(name, key=key, **DEFAULT_LIMITS[name])
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from . import config
+
+def normalize(values, strategy="max", direction=1):
+    """
+    Normalizes the columns of a matrix so that higher is better.
+    Args:
+    - values: Array shaped (sites, criteria) or (sites,).
+    - strategy: "max" (x / max), "minmax" ((x - min) / (max - min)), "zscore" or "rank" (0 to 1).
+    - direction: 1 when more is better, -1 when less is better.
+    Returns:
+    - Float array with the same shape.
+    """
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if strategy == "max":
+            result = values / values.max(axis=0)
+        elif strategy == "minmax":
+            low = values.min(axis=0)
+            result = (values - low) / (values.max(axis=0) - low)
+        elif strategy == "zscore":
+            result = (values - values.mean(axis=0)) / values.std(axis=0)
+        elif strategy == "rank":
+            # Average ranks for ties, scaled to [0, 1]
+            ranks = pd.DataFrame(values.reshape(len(values), -1)).rank(axis=0).to_numpy().reshape(values.shape)
+            result = (ranks - 1) / max(len(values) - 1, 1)
+        else:
+            raise ValueError(f"Unknown normalization: {strategy}")
+    # Constant criteria do not discriminate between sites
+    result = np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+
+    if direction < 0:
+        result = -result if strategy == "zscore" else 1 - result
+    return result
+
+class ScoringEngine:
+    """
+    Multi-criteria scoring of sites (cities, grid cells, candidate offices).
+    Holds the raw (sites x criteria) matrix and its normalized version, so scores for any
+    number of sites come from one matrix product, a single refreshed criterion only
+    re-normalizes its own column, and many weight vectors can be evaluated at once.
+    Args:
+    - criteria: Dictionary {criterion: {"weight", "normalization", "direction"}} (defaults to config.SCORING_CRITERIA).
+    """
+
+    def __init__(self, criteria=None):
+        criteria = criteria or config.SCORING_CRITERIA
+        self.criteria = list(criteria)
+        self.weights = np.array([criteria[name].get("weight", 1.0) for name in self.criteria], dtype=float)
+        self.strategies = [criteria[name].get("normalization", "max") for name in self.criteria]
+        self.directions = [criteria[name].get("direction", 1) for name in self.criteria]
+        self.site_column = 'City'
+        self.sites = None
+        self.raw = None
+        self._dtypes = None
+        self.normalized = None
+        self._scores = None
+
+    def _normalize_column(self, j):
+        self.normalized[:, j] = normalize(self.raw[:, j], self.strategies[j], self.directions[j])
+
+    def _weight_vector(self, weights=None):
+        weights = self.weights if weights is None else np.asarray(weights, dtype=float)
+        return weights / weights.sum(axis=-1, keepdims=True)
+
+    def fit(self, df, site_column='City'):
+        """
+        Loads the criteria of every site.
+        Args:
+        - df: DataFrame with a site column and one column per criterion.
+        - site_column: Column identifying the sites.
+        Returns:
+        - The engine itself.
+        """
+        self.site_column = site_column
+        self.sites = df[site_column].to_numpy()
+        self.raw = np.array(df[self.criteria], dtype=float)
+        self._dtypes = df[self.criteria].dtypes.to_dict()
+        self.normalized = np.empty_like(self.raw)
+        for j in range(len(self.criteria)):
+            self._normalize_column(j)
+        self._scores = self.normalized @ self._weight_vector()
+        return self
+
+    def scores(self, weights=None):
+        """
+        Weighted score of every site (weights are rescaled to sum to 1).
+        Args:
+        - weights: Array of weights in criteria order (defaults to the configured ones).
+        Returns:
+        - Array of scores, one per site.
+        """
+        if weights is None:
+            return self._scores.copy()
+        return self.normalized @ self._weight_vector(weights)
+
+    def update(self, criterion, values):
+        """
+        Replaces the values of one criterion (e.g. after re-fetching one category) and updates
+        the scores incrementally.
+        Args:
+        - criterion: Name of the criterion.
+        - values: New values, one per site (same order as in fit).
+        """
+        j = self.criteria.index(criterion)
+        old = self.normalized[:, j].copy()
+        self.raw[:, j] = np.asarray(values, dtype=float)
+        self._normalize_column(j)
+        self._scores += self._weight_vector()[j] * (self.normalized[:, j] - old)
+
+    def sensitivity(self, weight_matrix):
+        """
+        Scores and ranks of every site under many weight vectors at once.
+        Args:
+        - weight_matrix: Array shaped (scenarios, criteria).
+        Returns:
+        - Tuple (scores, ranks) of arrays shaped (scenarios, sites); rank 1 is the best site.
+        """
+        scores = self._weight_vector(np.atleast_2d(weight_matrix)) @ self.normalized.T
+        ranks = (-scores).argsort(axis=1).argsort(axis=1) + 1
+        return scores, ranks
+
+    def random_weights(self, n, seed=0):
+        """
+        Draws n weight vectors uniformly from the simplex, for sensitivity analysis.
+        """
+        return np.random.default_rng(seed).dirichlet(np.ones(len(self.criteria)), size=n)
+
+    def to_frame(self):
+        """
+        Raw criteria, normalized criteria and weighted score of every site, best first.
+        """
+        df = pd.DataFrame(self.raw, columns=self.criteria).astype(self._dtypes)
+        df.insert(0, self.site_column, self.sites)
+        for j, name in enumerate(self.criteria):
+            df[f'{name} Normalized'] = self.normalized[:, j]
+        df['Weighted Score'] = self._scores
+        return df.sort_values(by='Weighted Score', ascending=False)
@@ -0,0 +1,196 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from . import companies_gaming
+from . import config
+from . import foursquare
+from . import geometry
+
+# Layout version of the snapshot files
+SCHEMA_VERSION = 1
+
+# Tables saved next to the metrics, in Parquet when pyarrow is installed and JSON otherwise
+TABLES = ("offices", "venues")
+
+def _snapshot_root(root=None):
+    return root or os.path.join(config.get_context().cache_dir, "snapshots")
+
+def _table_format():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "json"
+    return "parquet"
+
+class Snapshot:
+    """
+    Read-only metrics of one scoring run: the score of every city, the geometry and search area of
+    every city, and the offices and venues drawn on the maps. Charts and maps read only a snapshot,
+    so rendering never touches MongoDB or the Foursquare API, and a saved snapshot never changes:
+    every run gets a new version (creation time + content hash).
+    Args:
+    - scores: DataFrame returned by foursquare.weighted_count_merged_df.
+    - cities: Dictionary {city: geometry.CityGeometry.to_dict()}.
+    - offices: DataFrame of the offices with an 'Inlier' column.
+    - venues: DataFrame as returned by foursquare.load_venues plus a 'City' column.
+    - criteria: Scoring criteria the scores were computed with (defaults to config.SCORING_CRITERIA).
+    """
+
+    def __init__(self, scores, cities, offices, venues, criteria=None, version=None, created=None, path=None):
+        self.scores = scores
+        self.cities = cities
+        self.offices = offices
+        self.venues = venues
+        self.criteria = criteria or config.SCORING_CRITERIA
+        self.created = created or datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.version = version or self._version()
+        self.path = path
+
+    def _version(self):
+        digest = hashlib.sha1(json.dumps([self.scores.to_dict('list'), self.cities, self.criteria], default=str).encode())
+        for table in (self.offices, self.venues):
+            digest.update(pd.util.hash_pandas_object(table, index=False).to_numpy().tobytes())
+        return f"{self.created.replace('-', '').replace(':', '')}-{digest.hexdigest()[:8]}"
+
+    def city_geometry(self, city):
+        """
+        geometry.CityGeometry of a city, with the inlier mask of its offices, or None if the city
+        is not in the snapshot (no offices, or only outliers).
+        """
+        if city not in self.cities:
+            return None
+        offices = self.offices[self.offices['City'] == city]
+        return geometry.CityGeometry.from_dict(self.cities[city], inliers=offices['Inlier'].to_numpy())
+
+    def save(self, root=None):
+        """
+        Writes the snapshot to <root>/<version>/ (atomically) and makes it the latest one.
+        Args:
+        - root: Directory of the snapshots (defaults to snapshots in the context's cache directory).
+        Returns:
+        - Directory of the snapshot.
+        """
+        root = _snapshot_root(root)
+        os.makedirs(root, exist_ok=True)
+        path = os.path.join(root, self.version)
+        if not os.path.isdir(path):
+            table_format = _table_format()
+            tmp = tempfile.mkdtemp(dir=root, prefix=".tmp-")
+            try:
+                for name in TABLES:
+                    table = getattr(self, name)
+                    if table_format == "parquet":
+                        table.to_parquet(os.path.join(tmp, f"{name}.parquet"), index=False)
+                    else:
+                        table.to_json(os.path.join(tmp, f"{name}.json"), orient="split", index=False)
+                with open(os.path.join(tmp, "metrics.json"), "w", encoding="utf-8") as f:
+                    json.dump({
+                        "schema": SCHEMA_VERSION,
+                        "version": self.version,
+                        "created": self.created,
+                        "criteria": self.criteria,
+                        "cities": self.cities,
+                        "scores": json.loads(self.scores.to_json(orient="split", index=False)),
+                        "tables": table_format,
+                    }, f, indent=4)
+                os.replace(tmp, path)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+
+        # The pointer is replaced atomically too: readers see the old or the new snapshot, never half of one
+        fd, pointer = tempfile.mkstemp(dir=root, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.version)
+        os.replace(pointer, os.path.join(root, "LATEST"))
+        self.path = path
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a snapshot saved with save().
+        """
+        with open(os.path.join(path, "metrics.json"), encoding="utf-8") as f:
+            metrics = json.load(f)
+        if metrics["schema"] != SCHEMA_VERSION:
+            raise ValueError(f"Snapshot schema {metrics['schema']} is not supported (expected {SCHEMA_VERSION})")
+        tables = {}
+        for name in TABLES:
+            if metrics["tables"] == "parquet":
+                tables[name] = pd.read_parquet(os.path.join(path, f"{name}.parquet"))
+            else:
+                tables[name] = pd.read_json(os.path.join(path, f"{name}.json"), orient="split", convert_dates=False)
+        scores = metrics["scores"]
+        return cls(pd.DataFrame(scores["data"], columns=scores["columns"]), metrics["cities"], tables["offices"],
+                   tables["venues"], criteria=metrics["criteria"], version=metrics["version"],
+                   created=metrics["created"], path=path)
+
+def latest(root=None):
+    """
+    Loads the most recent snapshot.
+    Raises:
+    - FileNotFoundError if no snapshot was saved yet (see create_snapshot).
+    """
+    root = _snapshot_root(root)
+    with open(os.path.join(root, "LATEST")) as f:
+        return Snapshot.load(os.path.join(root, f.read().strip()))
+
+def create_snapshot(cities=companies_gaming.TOP_3_CITIES, complete=False, root=None):
+    """
+    Scoring stage: fetches and scores the cities, then saves everything the charts and maps need.
+    This is the only step that calls the Foursquare API and MongoDB.
+    Args:
+    - cities: List of city names.
+    - complete: Crawl every city with adaptive tiling (see foursquare.weighted_count_merged_df).
+    - root: Directory of the snapshots.
+    Returns:
+    - The saved Snapshot.
+    Raises:
+    - ValueError if no city has a search area (no offices, or only outliers), before any API call.
+    """
+    # No offices, or only outliers: the city has no search area and is not scored
+    located = {city: companies_gaming.city_geometry(city) for city in cities}
+    located = {city: result for city, result in located.items() if result is not None}
+    if not located:
+        raise ValueError(f"No offices to draw a search area around in: {', '.join(cities)}")
+
+    scores = foursquare.weighted_count_merged_df(complete=complete, cities=list(located))
+    offices = companies_gaming.get_offices()
+
+    city_geometry, city_offices, city_venues = {}, [], []
+    for city, result in located.items():
+        city_geometry[city] = result.to_dict()
+        rows = offices[offices['City'] == city].assign(Inlier=result.inliers)
+        city_offices.append(rows)
+        city_venues.append(foursquare.load_venues(area=result.search_area).assign(City=city))
+
+    snapshot = Snapshot(scores, city_geometry, pd.concat(city_offices, ignore_index=True),
+                        pd.concat(city_venues, ignore_index=True))
+    snapshot.save(root)
+    # Charts and maps pick up the new snapshot
+    get_snapshot.cache_clear()
+    return snapshot
+
+@config.memoize
+def get_snapshot(create=False):
+    """
+    Latest snapshot, loaded once.
+    Args:
+    - create: Run create_snapshot (Foursquare requests and MongoDB writes) when none was saved yet.
+    Raises:
+    - FileNotFoundError if no snapshot was saved yet and create is False.
+    """
+    try:
+        return latest()
+    except FileNotFoundError:
+        if not create:
+            raise FileNotFoundError(f"No metrics snapshot in {_snapshot_root()}: run `python -m src.pipeline` "
+                                    "or snapshot.create_snapshot() first") from None
+        return create_snapshot()
@@ -0,0 +1,149 @@
+import numpy as np
+
+from .geometry import EARTH_RADIUS, haversine
+
+class SpatialIndex:
+    """
+    In-memory spatial index over points on the sphere (a uniform lat/lon grid, like a geohash).
+    Points are sorted by grid cell and every occupied cell keeps the start of its slice, so a
+    query only measures the points in the few cells that overlap its search circle.
+    The index only holds NumPy arrays: build it once and pickle it to share between processes.
+    Args:
+    - lat, lon: Arrays with the point coordinates in degrees.
+    - cell_size: Grid cell size in degrees (0.01 is about 1.1 km of latitude).
+    - data: Optional DataFrame aligned with lat/lon, returned by rows() for query results.
+    """
+
+    def __init__(self, lat, lon, cell_size=0.01, data=None):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.cell_size = cell_size
+        self.data = data
+        self.n_rows = int(np.ceil(180 / cell_size)) + 1
+        self.n_cols = int(np.ceil(360 / cell_size))
+
+        # Sort the points by cell and remember where each occupied cell starts
+        cells = self._cell_ids(self._row(self.lat), self._col(self.lon))
+        self.order = np.argsort(cells, kind="stable")
+        self.cells, self.starts = np.unique(cells[self.order], return_index=True)
+        self.ends = np.append(self.starts[1:], len(self.order))
+
+    @classmethod
+    def from_dataframe(cls, df, cell_size=0.01):
+        """
+        Builds the index from a DataFrame with 'Latitude' and 'Longitude' columns,
+        such as the output of companies_gaming.top_3_cities_location().
+        """
+        df = df.reset_index(drop=True)
+        return cls(df['Latitude'].to_numpy(), df['Longitude'].to_numpy(), cell_size=cell_size, data=df)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell_size).astype(np.int64), 0, self.n_rows - 1)
+
+    def _col(self, lon):
+        return np.floor((np.asarray(lon) + 180) / self.cell_size).astype(np.int64) % self.n_cols
+
+    def _cell_ids(self, rows, cols):
+        return rows * self.n_cols + cols
+
+    def _candidates(self, lat, lon, radius):
+        """
+        Indices of the points in the grid cells overlapping a circle around one point.
+        """
+        if not len(self.cells):
+            return np.empty(0, dtype=np.int64)
+        dlat = np.degrees(radius / EARTH_RADIUS)
+        max_lat = min(abs(lat) + dlat, 90)
+        first_row, last_row = self._row(lat - dlat), self._row(lat + dlat)
+        dlon = dlat / np.cos(np.radians(max_lat)) if max_lat < 89.9 else 180
+        # Near the poles (or for very wide circles) every longitude is covered
+        if dlon >= 180 - self.cell_size:
+            first_col, span = 0, self.n_cols - 1
+        else:
+            first_col = self._col(lon - dlon)
+            span = (self._col(lon + dlon) - first_col) % self.n_cols
+
+        if (last_row - first_row + 1) * (span + 1) > len(self.cells):
+            # Wide circles: test the occupied cells instead of enumerating the grid
+            rows, cols = np.divmod(self.cells, self.n_cols)
+            found = np.flatnonzero((rows >= first_row) & (rows <= last_row) & ((cols - first_col) % self.n_cols <= span))
+        else:
+            rows = np.arange(first_row, last_row + 1)
+            cols = (first_col + np.arange(span + 1)) % self.n_cols
+            wanted = self._cell_ids(rows[:, None], cols[None, :]).ravel()
+            found = np.minimum(np.searchsorted(self.cells, wanted), len(self.cells) - 1)
+            found = found[self.cells[found] == wanted]
+
+        # Concatenate the slices of the occupied cells without a Python loop
+        lengths = self.ends[found] - self.starts[found]
+        offsets = np.repeat(self.starts[found] - np.cumsum(lengths) + lengths, lengths)
+        return self.order[np.arange(lengths.sum()) + offsets]
+
+    def within_radius(self, lat, lon, radius, return_distance=False):
+        """
+        Finds every indexed point within a distance of each query point.
+        Args:
+        - lat, lon: Query coordinates in degrees (scalars or arrays for a batch).
+        - radius: Search radius in meters (scalar or one per query point).
+        - return_distance: Also return the distances in meters.
+        Returns:
+        - List with one array of point indices per query point (sorted by distance),
+          plus a matching list of distance arrays if return_distance is True.
+        """
+        lat, lon = np.atleast_1d(lat).astype(float), np.atleast_1d(lon).astype(float)
+        radius = np.broadcast_to(np.asarray(radius, dtype=float), lat.shape)
+
+        indices, distances = [], []
+        for q_lat, q_lon, q_radius in zip(lat, lon, radius):
+            candidates = self._candidates(q_lat, q_lon, q_radius)
+            d = haversine(q_lat, q_lon, self.lat[candidates], self.lon[candidates])
+            keep = d <= q_radius
+            order = np.argsort(d[keep], kind="stable")
+            indices.append(candidates[keep][order])
+            distances.append(d[keep][order])
+        return (indices, distances) if return_distance else indices
+
+    def k_nearest(self, lat, lon, k):
+        """
+        Finds the k nearest indexed points of each query point.
+        The search circle starts at about one grid cell and doubles until it holds k points.
+        Args:
+        - lat, lon: Query coordinates in degrees (scalars or arrays for a batch).
+        - k: Number of neighbours.
+        Returns:
+        - Tuple (distances, indices) of arrays shaped (queries, k), nearest first.
+          If the index holds fewer than k points the rows are padded with inf / -1.
+        """
+        lat, lon = np.atleast_1d(lat).astype(float), np.atleast_1d(lon).astype(float)
+        distances = np.full((len(lat), k), np.inf)
+        indices = np.full((len(lat), k), -1, dtype=np.int64)
+        k_found = min(k, len(self))
+        if k_found == 0:
+            return distances, indices
+
+        start_radius = self.cell_size * np.pi / 180 * EARTH_RADIUS
+        for q, (q_lat, q_lon) in enumerate(zip(lat, lon)):
+            radius = start_radius
+            while True:
+                candidates = self._candidates(q_lat, q_lon, radius)
+                d = haversine(q_lat, q_lon, self.lat[candidates], self.lon[candidates])
+                # Only points inside the circle are guaranteed to beat everything outside it
+                inside = d <= radius
+                if inside.sum() >= k_found or radius > np.pi * EARTH_RADIUS:
+                    break
+                radius *= 2
+            nearest = np.argsort(d, kind="stable")[:k_found]
+            distances[q, :k_found] = d[nearest]
+            indices[q, :k_found] = candidates[nearest]
+        return distances, indices
+
+    def rows(self, indices):
+        """
+        Returns the DataFrame rows (see data) for an array of point indices.
+        """
+        if self.data is None:
+            raise ValueError("The index was built without data")
+        return self.data.iloc[np.asarray(indices)[np.asarray(indices) >= 0]]
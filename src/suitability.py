@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+from . import companies_gaming
+from . import config
+from . import foursquare
+from .geometry import project, unproject
+from .scoring import ScoringEngine
+
+# Default side of the grid cells and bandwidth of the Gaussian kernel (meters)
+CELL_SIZE = 100
+BANDWIDTH = 400
+
+# The kernel is truncated at this many bandwidths
+KERNEL_TRUNCATE = 3
+
+def gaussian_kernel(bandwidth, cell_size, truncate=KERNEL_TRUNCATE):
+    """
+    One-dimensional Gaussian weights sampled at the cell centers (peak 1).
+    """
+    half = int(np.ceil(truncate * bandwidth / cell_size))
+    offsets = np.arange(-half, half + 1) * cell_size
+    return np.exp(-0.5 * (offsets / bandwidth) ** 2)
+
+class SuitabilitySurface:
+    """
+    Suitability raster over the circle of a city: a square grid of cells in a local metric
+    projection, one kernel density layer per criterion (amenity category or gaming offices)
+    and their weighted combination.
+    Points are binned onto the grid in one pass (bincount) and the Gaussian kernel is applied
+    as two one-dimensional convolutions, so a layer costs O(points + cells x kernel width)
+    and a few grids of memory, whatever the number of points.
+    Args:
+    - lat, lon: Center of the circle (the city's midpoint).
+    - radius: Radius of the circle in meters.
+    - cell_size: Side of the cells in meters.
+    - bandwidth: Standard deviation of the Gaussian kernel in meters.
+    - criteria: Dictionary {layer: {"weight", "normalization", "direction"}} (defaults to config.SUITABILITY_CRITERIA).
+    """
+
+    def __init__(self, lat, lon, radius, cell_size=CELL_SIZE, bandwidth=BANDWIDTH, criteria=None):
+        self.lat, self.lon, self.radius = float(lat), float(lon), float(radius)
+        self.cell_size = cell_size
+        self.bandwidth = bandwidth
+        self.criteria = criteria or config.SUITABILITY_CRITERIA
+        self.kernel = gaussian_kernel(bandwidth, cell_size)
+        # Points up to this distance outside the circle still weigh on its cells
+        self.reach = len(self.kernel) // 2 * cell_size
+
+        self.size = max(int(np.ceil(2 * self.radius / cell_size)), 1)
+        center_x, center_y = project(self.lat, self.lon, self.lat)
+        self.x0 = center_x - self.size * cell_size / 2
+        self.y0 = center_y - self.size * cell_size / 2
+        offsets = (np.arange(self.size) + 0.5) * cell_size - self.size * cell_size / 2
+        # Rows follow the latitude, columns the longitude
+        self.mask = offsets[:, None] ** 2 + offsets[None, :] ** 2 <= self.radius ** 2
+
+        self.layers = {}
+        self.score = None
+
+    def rasterize(self, lat, lon):
+        """
+        Number of points in every cell of the grid padded by the kernel's half width.
+        """
+        half = len(self.kernel) // 2
+        size = self.size + 2 * half
+        x, y = project(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float), self.lat)
+        col = np.floor((x - self.x0) / self.cell_size).astype(np.int64) + half
+        row = np.floor((y - self.y0) / self.cell_size).astype(np.int64) + half
+        keep = (col >= 0) & (col < size) & (row >= 0) & (row < size)
+        return np.bincount(row[keep] * size + col[keep], minlength=size * size).reshape(size, size).astype(float)
+
+    def density(self, lat, lon):
+        """
+        Kernel-weighted number of points around every cell (a point at the cell center counts 1).
+        Args:
+        - lat, lon: Arrays of point coordinates.
+        Returns:
+        - Array shaped (size, size).
+        """
+        counts = self.rasterize(lat, lon)
+        # Separable convolution, keeping only the cells of the unpadded grid
+        rows = np.zeros((self.size, counts.shape[1]))
+        for t, weight in enumerate(self.kernel):
+            rows += weight * counts[t:t + self.size]
+        result = np.zeros((self.size, self.size))
+        for t, weight in enumerate(self.kernel):
+            result += weight * rows[:, t:t + self.size]
+        return result
+
+    def add_layer(self, name, lat, lon):
+        """
+        Adds (or replaces) the density layer of a criterion.
+        """
+        self.layers[name] = self.density(lat, lon)
+        return self
+
+    def evaluate(self):
+        """
+        Combines the layers into the suitability score of every cell inside the circle
+        (NaN outside), normalized and weighted as declared in the criteria.
+        """
+        criteria = {name: spec for name, spec in self.criteria.items() if name in self.layers}
+        cells = pd.DataFrame({name: self.layers[name][self.mask] for name in criteria})
+        cells.insert(0, 'Cell', np.flatnonzero(self.mask))
+        score = np.full((self.size, self.size), np.nan)
+        score[self.mask] = ScoringEngine(criteria).fit(cells, site_column='Cell').scores()
+        self.score = score
+        return self
+
+    def cell_centers(self, rows=None, cols=None):
+        """
+        Latitude and longitude of cell centers (of the whole grid by default).
+        """
+        if rows is None:
+            rows, cols = np.indices((self.size, self.size))
+        x = self.x0 + (np.asarray(cols) + 0.5) * self.cell_size
+        y = self.y0 + (np.asarray(rows) + 0.5) * self.cell_size
+        return unproject(x, y, self.lat)
+
+    def to_frame(self):
+        """
+        One row per cell inside the circle: center, density of every layer and suitability.
+        """
+        rows, cols = np.nonzero(self.mask)
+        lat, lon = self.cell_centers(rows, cols)
+        df = pd.DataFrame({'Latitude': lat, 'Longitude': lon})
+        for name, layer in self.layers.items():
+            df[name] = layer[rows, cols]
+        if self.score is not None:
+            df['Suitability'] = self.score[rows, cols]
+        return df
+
+    def top_cells(self, k=10, min_distance=None):
+        """
+        The k best cells as candidate office sites, at least min_distance apart so the
+        candidates are not all neighbours of the same peak.
+        Args:
+        - k: Number of sites.
+        - min_distance: Minimum distance between sites in meters (defaults to the bandwidth).
+        Returns:
+        - DataFrame with the center, layer densities and suitability of the sites, best first.
+        """
+        if self.score is None:
+            self.evaluate()
+        min_distance = self.bandwidth if min_distance is None else min_distance
+        reach = int(min_distance // self.cell_size)
+        score = np.where(self.mask, self.score, -np.inf).ravel()
+
+        # Only the best cells can be selected: each selection blocks at most (2 reach + 1)^2 cells
+        n_candidates = min(k * (2 * reach + 1) ** 2 + k, int(self.mask.sum()))
+        candidates = np.argpartition(-score, n_candidates - 1)[:n_candidates] if n_candidates else []
+        candidates = sorted(candidates, key=lambda cell: -score[cell])
+
+        selected = []
+        for cell in candidates:
+            if len(selected) == k:
+                break
+            row, col = divmod(int(cell), self.size)
+            if all((row - r) ** 2 + (col - c) ** 2 > reach ** 2 for r, c in selected):
+                selected.append((row, col))
+
+        rows = np.array([r for r, _ in selected], dtype=int)
+        cols = np.array([c for _, c in selected], dtype=int)
+        lat, lon = self.cell_centers(rows, cols)
+        df = pd.DataFrame({'Latitude': lat, 'Longitude': lon})
+        for name, layer in self.layers.items():
+            df[name] = layer[rows, cols]
+        df['Suitability'] = self.score[rows, cols]
+        return df
+
+def city_surface(city, cell_size=CELL_SIZE, bandwidth=BANDWIDTH, radius=None, criteria=None):
+    """
+    Suitability surface of a city from the stored Foursquare venues and the gaming offices.
+    Args:
+    - city: City name.
+    - cell_size: Side of the cells in meters.
+    - bandwidth: Kernel bandwidth in meters.
+    - radius: Radius of the surface in meters (defaults to, and at most, the radius of the city's
+      Foursquare searches: venues are only fetched there, so farther cells would lack amenities).
+    - criteria: Layers and weights (defaults to config.SUITABILITY_CRITERIA).
+    Returns:
+    - Evaluated SuitabilitySurface, or None if the city has no data.
+    """
+    city_geometry = companies_gaming.city_geometry(city)
+    if city_geometry is None:
+        return None
+    # The circle the venues were fetched in (see foursquare.city_search_areas)
+    lat, lon, search_radius = city_geometry.search_area
+    surface = SuitabilitySurface(lat, lon, min(radius, search_radius) if radius else search_radius,
+                                 cell_size, bandwidth, criteria)
+
+    db = foursquare.get_db()
+    for c_name in foursquare.CATEGORIES:
+        if f'{c_name} Count' in surface.criteria:
+            points = foursquare.venue_coordinates(db[c_name], lat, lon, surface.radius + surface.reach)
+            surface.add_layer(f'{c_name} Count', *points)
+
+    offices = companies_gaming.get_offices()
+    offices = offices[offices['City'] == city]
+    surface.add_layer('Gaming Companies Count', offices['Latitude'], offices['Longitude'])
+    return surface.evaluate()
+
+def top_sites(cities=companies_gaming.TOP_3_CITIES, k=10, **kwargs):
+    """
+    Candidate office sites of every city (see SuitabilitySurface.top_cells).
+    Args:
+    - cities: List of city names.
+    - k: Number of sites per city.
+    - kwargs: Passed to city_surface (cell_size, bandwidth, radius, criteria).
+    Returns:
+    - DataFrame with the 'City' and rank of every site plus its center, densities and suitability.
+    """
+    frames = []
+    for city in cities:
+        surface = city_surface(city, **kwargs)
+        if surface is None:
+            continue
+        sites = surface.top_cells(k)
+        sites.insert(0, 'Rank', np.arange(1, len(sites) + 1))
+        sites.insert(0, 'City', city)
+        frames.append(sites)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -0,0 +1,117 @@
+import math
+
+import pandas as pd
+
+from .fetcher import get_fetcher
+from .geometry import EARTH_RADIUS, haversine
+
+# Tiles are not split below this radius (meters); a full page there is accepted as is
+MIN_TILE_RADIUS = 50
+
+# Relative enlargement of the sub-tiles so they overlap slightly
+COVER_MARGIN = 0.02
+
+def split_tile(lat, lon, radius):
+    """
+    Splits a search circle into seven circles of half its radius that cover it (hexagonal
+    subdivision: one at the center and six around it at sqrt(3)/2 of the radius).
+    Halving the radius costs 7 calls, against 16 with four quadrant circles of radius r / sqrt(2).
+    Args:
+    - lat, lon: Center of the circle.
+    - radius: Radius in meters.
+    Returns:
+    - List of seven (latitude, longitude, radius) tuples.
+    """
+    # A small margin keeps the covering tight despite rounding at the shared boundaries
+    child_radius = radius / 2 * (1 + COVER_MARGIN)
+    ring = radius * math.sqrt(3) / 2
+    children = [(lat, lon, child_radius)]
+    for k in range(6):
+        angle = math.radians(60 * k)
+        dlat = math.degrees(ring * math.cos(angle) / EARTH_RADIUS)
+        dlon = math.degrees(ring * math.sin(angle) / (EARTH_RADIUS * math.cos(math.radians(lat))))
+        children.append((lat + dlat, lon + dlon, child_radius))
+    return children
+
+def _venue_distance(venue, lat, lon):
+    main = venue.get('geocodes', {}).get('main', {})
+    if main.get('latitude') is None or main.get('longitude') is None:
+        return math.inf
+    return float(haversine(lat, lon, main['latitude'], main['longitude']))
+
+def iter_crawl(query, areas, limit=50, max_depth=8, min_radius=MIN_TILE_RADIUS, fetcher=None, stats=None):
+    """
+    Streaming version of crawl: yields the new venues of every tile as its response arrives.
+    Only the fsq_id of the venues already seen is kept, not the venues themselves.
+    Args:
+    - query, areas, limit, max_depth, min_radius, fetcher: See crawl.
+    - stats: Dictionary filled with {city: {'Tiles', 'Saturated', 'Depth', 'Venues'}} as the crawl goes.
+    Yields:
+    - Tuples (city, list of venues not yielded before).
+    """
+    fetcher = fetcher or get_fetcher()
+    seen = {city: set() for city in areas}
+    stats = {} if stats is None else stats
+    for city in areas:
+        stats[city] = {'Tiles': 0, 'Saturated': 0, 'Depth': 0, 'Venues': 0}
+
+    # Frontier of (city, depth, tile) still to query, one level at a time
+    frontier = [(city, 0, area) for city, area in areas.items()]
+    while frontier:
+        searches = [
+            {"query": query, "lat": lat, "lon": lon, "radius": int(math.ceil(radius)), "limit": limit}
+            for _, _, (lat, lon, radius) in frontier
+        ]
+
+        next_frontier = []
+        for i, response in fetcher.iter_search(searches):
+            city, depth, (lat, lon, radius) = frontier[i]
+            city_lat, city_lon, city_radius = areas[city]
+            results = response['results']
+            stats[city]['Tiles'] += 1
+            stats[city]['Depth'] = max(stats[city]['Depth'], depth)
+
+            # Sub-tiles overlap the edge of the city: keep only venues inside its circle
+            new = []
+            for venue in results:
+                if _venue_distance(venue, city_lat, city_lon) > city_radius:
+                    continue
+                key = venue.get('fsq_id')
+                if key is None or key not in seen[city]:
+                    seen[city].add(key)
+                    new.append(venue)
+            stats[city]['Venues'] += len(new)
+            if new:
+                yield city, new
+
+            if len(results) >= limit and depth < max_depth and radius / 2 >= min_radius:
+                stats[city]['Saturated'] += 1
+                for child in split_tile(lat, lon, radius):
+                    # Skip sub-tiles that lie entirely outside the city's circle
+                    if haversine(city_lat, city_lon, child[0], child[1]) - child[2] < city_radius:
+                        next_frontier.append((city, depth + 1, child))
+        frontier = next_frontier
+
+def crawl(query, areas, limit=50, max_depth=8, min_radius=MIN_TILE_RADIUS, fetcher=None):
+    """
+    Collects the complete set of venues of a query in every city, past the page limit of the API.
+    Each city's search circle is queried; every tile that returns a full page is split into seven
+    sub-tiles of half its radius (see split_tile) and queried again, until no tile is saturated. The tiles of all cities
+    at the same depth are fetched concurrently, and venues are deduplicated by fsq_id.
+    Args:
+    - query: Foursquare search query.
+    - areas: Dictionary {city: (latitude, longitude, radius)} as returned by city_search_areas.
+    - limit: Page size of the API (a tile with this many results is saturated).
+    - max_depth: Maximum number of splits.
+    - min_radius: Tiles smaller than this (meters) are not split.
+    - fetcher: Fetcher to use (defaults to the shared one).
+    Returns:
+    - Tuple (venues, stats): {city: list of venues} and a DataFrame with, per city, the tiles
+      visited ('Tiles'), tiles split ('Saturated'), deepest level ('Depth') and venues found.
+    """
+    stats = {}
+    venues = {city: [] for city in areas}
+    for city, new in iter_crawl(query, areas, limit, max_depth, min_radius, fetcher, stats):
+        venues[city].extend(new)
+    stats = pd.DataFrame([{'City': city, **city_stats} for city, city_stats in stats.items()])
+    return venues, stats
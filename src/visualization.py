@@ -1,27 +1,150 @@
 from . import companies_gaming
-from . import foursquare
-from shapely.geometry import Point
-import folium
-import itertools
-import matplotlib.pyplot as plt
-from pymongo import MongoClient
+from . import geometry
+from . import instrumentation
+from .snapshot import Snapshot, get_snapshot
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
-client = MongoClient("localhost:27017")
-db = client["Project_III"]
+# folium and matplotlib are imported inside the drawing functions: they are slow to
+# import and workers that only need the data functions should not pay for them
 
-df_companies_gaming = companies_gaming.top_3_cities_location()
-foursquare.foursq_top3_cities_query
+# Maps up to this many points (all layers together) are drawn as individual markers; larger ones are clustered in the browser
+MAX_MARKERS = 2000
 
-def create_city_map(df_companies_gaming, city_name):
+# Hard cap on the points written to the HTML of a layer: above it, points are merged per map cell
+MAX_POINTS = 100_000
+
+# Side in screen pixels of the cells points are merged into (see decimate)
+CELL_PIXELS = 8
+
+@instrumentation.traced
+def decimate(points, zoom, cell_pixels=CELL_PIXELS):
+    """
+    Merges the points that fall in the same cell_pixels x cell_pixels square of the Web Mercator
+    map at a zoom level, so the layer keeps at most one point per cell.
+    Args:
+    - points: DataFrame with 'Latitude', 'Longitude' and 'Popup'.
+    - zoom: Zoom level.
+    - cell_pixels: Side of the cells in pixels.
+    Returns:
+    - DataFrame with one row per occupied cell: mean position, 'Count' and 'Popup' (the point's own
+      popup when it is alone in its cell, the number of points otherwise).
+    """
+    lat = points['Latitude'].to_numpy(dtype=float)
+    lon = points['Longitude'].to_numpy(dtype=float)
+    scale = 256 * 2 ** zoom / cell_pixels
+    phi = np.radians(np.clip(lat, -85.05, 85.05))
+    x = np.floor((lon + 180) / 360 * scale).astype(np.int64)
+    y = np.floor((1 - np.log(np.tan(phi) + 1 / np.cos(phi)) / np.pi) / 2 * scale).astype(np.int64)
+    _, first, inverse, counts = np.unique(x * (int(scale) + 1) + y, return_index=True, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    return pd.DataFrame({
+        'Latitude': np.bincount(inverse, weights=lat) / counts,
+        'Longitude': np.bincount(inverse, weights=lon) / counts,
+        'Count': counts,
+        'Popup': np.where(counts == 1, points['Popup'].to_numpy(dtype=object)[first], [f'{count} places' for count in counts]),
+    })
+
+def map_mode(mode, n_points):
+    """
+    Resolves mode='auto' for a whole map: individual markers while its n_points fit in MAX_MARKERS,
+    cluster above. Maps with several layers resolve it once on their total, so the cap is not
+    applied to each layer separately.
+    """
+    if mode != 'auto':
+        return mode
+    return 'markers' if n_points <= MAX_MARKERS else 'cluster'
+
+@instrumentation.traced
+def add_points(map, df, name, color='blue', icon='info-circle', popup=None, mode='auto', zoom=None, max_points=MAX_POINTS):
+    """
+    Adds a layer of points to a map, built from the columns of df at once instead of row by row.
+    Args:
+    - map: Folium map.
+    - df: DataFrame with 'Latitude' and 'Longitude'.
+    - name: Name of the layer in the layer control.
+    - color, icon: Marker color and Font Awesome icon.
+    - popup: Series of popup HTML aligned with df, or None.
+    - mode: "markers" (one folium.Marker per point), "cluster" (FastMarkerCluster: the markers are
+      created and clustered in the browser), "geojson" (one GeoJSON FeatureCollection of circle
+      markers) or "auto" (markers up to MAX_MARKERS points, cluster above; see map_mode for maps
+      with several layers).
+    - zoom: Merge the points per CELL_PIXELS cell at this zoom level before drawing (see decimate), or None.
+    - max_points: Hard cap on the points written; the zoom of the merge is lowered until the layer fits.
+    Returns:
+    - The layer added to the map.
+    """
+    import folium
+    from folium import plugins
+
+    points = pd.DataFrame({
+        'Latitude': df['Latitude'].to_numpy(dtype=float),
+        'Longitude': df['Longitude'].to_numpy(dtype=float),
+        'Popup': popup.to_numpy(dtype=object) if popup is not None else '',
+    }).dropna(subset=['Latitude', 'Longitude'])
+
+    # Server-side decimation, down to the cap
+    merged = decimate(points, zoom) if zoom is not None else points
+    zoom = 18 if zoom is None else zoom
+    while len(merged) > max_points and zoom > 0:
+        zoom -= 1
+        merged = decimate(points, zoom)
+    # About one meter of precision is plenty on a map and keeps the HTML small
+    points = merged.round({'Latitude': 5, 'Longitude': 5})
+
+    mode = map_mode(mode, len(points))
+
+    if mode == 'markers':
+        layer = folium.FeatureGroup(name=name)
+        for lat, lon, text in zip(points['Latitude'], points['Longitude'], points['Popup']):
+            folium.Marker(
+                location=[lat, lon],
+                popup=text or None,
+                icon=folium.Icon(color=color, icon_color='white', icon=icon, prefix='fa'),
+            ).add_to(layer)
+    elif mode == 'cluster':
+        # Rows are [lat, lon, popup]; the browser builds the markers from the array
+        callback = """function (row) {
+            var icon = L.AwesomeMarkers.icon({icon: %s, markerColor: %s, iconColor: 'white', prefix: 'fa'});
+            var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+            if (row[2]) { marker.bindPopup(row[2]); }
+            return marker;
+        }""" % (json.dumps(icon), json.dumps(color))
+        layer = plugins.FastMarkerCluster(points[['Latitude', 'Longitude', 'Popup']].values.tolist(), callback=callback, name=name)
+    elif mode == 'geojson':
+        features = {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": {"popup": text}}
+            for lat, lon, text in zip(points['Latitude'].tolist(), points['Longitude'].tolist(), points['Popup'].tolist())
+        ]}
+        layer = folium.GeoJson(
+            features,
+            name=name,
+            marker=folium.CircleMarker(radius=4, color=color, fill=True, fill_opacity=0.7),
+            popup=folium.GeoJsonPopup(fields=['popup'], labels=False) if popup is not None else None,
+        )
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+    layer.add_to(map)
+    return layer
+
+@instrumentation.traced
+def create_city_map(df_companies_gaming, city_name, mode='auto', zoom=None, max_points=MAX_POINTS, city_geometry=None):
     """
     Generates a map for a specified city with markers for the two farthest points within a threshold distance,
-    the midpoint between these points, and a polygon covering all the points within the threshold.
+    the midpoint between these points, and the circle searched on Foursquare around it.
+    Nothing is computed here: the midpoint, radius, farthest pair and outliers come from a
+    geometry.CityGeometry, the same object the Foursquare search areas are built from.
     Args:
     - df: DataFrame containing the data.
     - city_name: Name of the city to generate the map for.
+    - mode, zoom, max_points: Rendering of the company markers (see add_points).
+    - city_geometry: geometry.CityGeometry of the city in df (computed from df when None).
     Returns:
-    - Folium map object.
+    - Folium map object, or None if the city has no offices or only outliers.
     """
 
     # Filter DataFrame for entries corresponding to the specified city
@@ -32,86 +155,90 @@ def create_city_map(df_companies_gaming, city_name):
         print(f"No data available for {city_name}.")
         return None
 
-    # Initialize map centered on the average coordinates of the city
-    initial_centroid = Point(city_df['Longitude'].mean(), city_df['Latitude'].mean())
-    map = folium.Map(location=[initial_centroid.y, initial_centroid.x], zoom_start=12)
-
-    # Add markers for each company
-    for _, row in city_df.iterrows():
-        icon = folium.Icon(
-            color="darkblue",
-            icon_color="white",
-            icon="fa-building",
-            prefix="fa",
-        )
-        folium.Marker(
-            location=[row["Latitude"], row["Longitude"]],
-            popup=f"{row['Company Name']}<br>{row['Street']}",
-            icon=icon
-        ).add_to(map)
-
-    # Set threshold for maximum allowable distance from initial centroid (for filtering outliers)
-    threshold_distance = 0.05  # Equivalent to approximately 5 km
-
-    # Exclude points beyond the threshold distance from initial centroid
-    filtered_df = city_df[city_df.apply(lambda row: Point(row['Longitude'], row['Latitude']).distance(initial_centroid) < threshold_distance, axis=1)]
+    import folium
 
-    # Identify two points in the filtered dataset that are farthest from each other
-    max_distance = 0
-    point1, point2 = None, None
-    for (lat1, lon1), (lat2, lon2) in itertools.combinations(filtered_df[['Latitude', 'Longitude']].values, 2):
-        distance = Point(lon1, lat1).distance(Point(lon2, lat2))
-        if distance > max_distance:
-            max_distance, point1, point2 = distance, (lat1, lon1), (lat2, lon2)
+    if city_geometry is None:
+        city_geometry = geometry.CityGeometry.from_dataframe(city_df, city_name)
+    # Inliers and outliers share the marker cap
+    mode = map_mode(mode, len(city_df))
+    if not city_geometry.located:
+        # Every office is an outlier: there is no midpoint to center the map on
+        print(f"No data available for {city_name}.")
+        return None
 
-    # Compute midpoint of the two farthest points to represent the city center
-    midpoint_lat = (point1[0] + point2[0]) / 2
-    midpoint_lon = (point1[1] + point2[1]) / 2
+    # Initialize map centered on the midpoint of the city
+    map = folium.Map(location=list(city_geometry.midpoint), zoom_start=12)
 
-    # Calculate radius from midpoint to farthest point, convert to meters for map visualization
-    radius_in_meters = (max_distance / 4) * 111320  # Rough conversion from degrees to meters
+    # Add markers for each company; offices beyond geometry.OUTLIER_THRESHOLD meters from the centroid in grey
+    popup = city_df['Company Name'].astype(str) + '<br>' + city_df['Street'].astype(str)
+    inliers = city_geometry.inliers
+    add_points(map, city_df[inliers], 'Gaming companies', color='darkblue', icon='fa-building', popup=popup[inliers],
+               mode=mode, zoom=zoom, max_points=max_points)
+    if not inliers.all():
+        add_points(map, city_df[~inliers], 'Outliers', color='lightgray', icon='fa-building', popup=popup[~inliers],
+                   mode=mode, zoom=zoom, max_points=max_points)
 
     # Add markers for the farthest points and midpoint to the map
-    folium.Marker([point1[0], point1[1]], popup='Point 1').add_to(map)
-    folium.Marker([point2[0], point2[1]], popup='Point 2').add_to(map)
-    folium.Marker([midpoint_lat, midpoint_lon], popup='Midpoint').add_to(map)
+    point1, point2 = city_geometry.farthest
+    folium.Marker(list(point1), popup='Point 1').add_to(map)
+    folium.Marker(list(point2), popup='Point 2').add_to(map)
+    folium.Marker(list(city_geometry.midpoint), popup='Midpoint').add_to(map)
 
-    # Draw a circle around the midpoint to represent the coverage radius
-    folium.Circle([midpoint_lat, midpoint_lon], radius=radius_in_meters, color='red', fill=True, fill_opacity=0.2).add_to(map)
+    # Draw the Foursquare search area around the midpoint
+    folium.Circle(list(city_geometry.midpoint), radius=city_geometry.search_radius, color='red', fill=True, fill_opacity=0.2).add_to(map)
 
     return map
 
 
 
+@instrumentation.traced
+def city_map(city_name, snapshot=None, **kwargs):
+    """
+    Map of a city's gaming companies drawn from a metrics snapshot (no MongoDB or API access).
+    Args:
+    - city_name: Name of the city.
+    - snapshot: snapshot.Snapshot to draw from (defaults to the latest one).
+    - kwargs: Passed to create_city_map (mode, zoom, max_points).
+    Returns:
+    - Folium map object.
+    """
+    snapshot = snapshot or get_snapshot()
+    offices = snapshot.offices[snapshot.offices['City'] == city_name]
+    return create_city_map(offices, city_name, city_geometry=snapshot.city_geometry(city_name), **kwargs)
+
+@instrumentation.traced
 def city_map_san_francisco_companies():
     """
     Generates and returns a Folium map for the city of San Francisco.
     The map includes markers for the two farthest points within a threshold distance, 
-    the midpoint between these points, and a polygon covering nearly all the points within the threshold.
+    the midpoint between these points, and the Foursquare search area around it.
     """
-    city_map_san_francisco = create_city_map(df_companies_gaming, 'San Francisco')
+    city_map_san_francisco = city_map('San Francisco')
     return city_map_san_francisco
 
+@instrumentation.traced
 def city_map_new_york_companies():
     """
     Generates and returns a Folium map for the city of New York.
     The map includes markers for the two farthest points within a threshold distance, 
-    the midpoint between these points, and a polygon covering nearly all the points within the threshold.
+    the midpoint between these points, and the Foursquare search area around it.
     """
-    city_map_new_york = create_city_map(df_companies_gaming, 'New York')
+    city_map_new_york = city_map('New York')
     return city_map_new_york
 
+@instrumentation.traced
 def city_map_london_companies():
     """
     Generates and returns a Folium map for the city of London.
     The map includes markers for the two farthest points within a threshold distance, 
-    the midpoint between these points, and a polygon covering nearly all the points within the threshold.
+    the midpoint between these points, and the Foursquare search area around it.
     """
-    city_map_london = create_city_map(df_companies_gaming, 'London')
+    city_map_london = city_map('London')
     return city_map_london
 
 
-def create_dual_pie_charts(category1, category2, category3, category4):
+@instrumentation.traced
+def create_dual_pie_charts(category1, category2, category3, category4, snapshot=None, figures=(1, 2, 3)):
     """
     Creates two separate figures, each with two pie charts, to visualize the distribution 
     of four different data categories. This function also includes a third figure showing 
@@ -123,11 +250,29 @@ def create_dual_pie_charts(category1, category2, category3, category4):
     - category2: Second data category for the first figure.
     - category3: First data category for the second figure.
     - category4: Second data category for the second figure.
+    - snapshot: snapshot.Snapshot to draw from (defaults to the latest one).
+    - figures: Figures to draw (1 and 2 only need the counts, 3 needs the 'Weighted Score').
     
-    The function fetches data using foursquare.weighted_count_merged_df(), then creates 
+    The function reads the scores of a metrics snapshot (no API calls or MongoDB writes), then creates 
     pie charts with both count and percentage for each category and city.
     """
-    df_companies_gaming = foursquare.weighted_count_merged_df()
+    import matplotlib.pyplot as plt
+
+    draw_pie_figures(category1, category2, category3, category4, snapshot=snapshot, figures=figures)
+
+    # Show the figures
+    return plt
+
+def draw_pie_figures(category1, category2, category3, category4, snapshot=None, figures=(1, 2, 3)):
+    """
+    Draws the figures of create_dual_pie_charts.
+    Returns:
+    - Dictionary {figure number in figures: matplotlib Figure}.
+    """
+    import matplotlib.pyplot as plt
+
+    df_companies_gaming = (snapshot or get_snapshot()).scores
+    drawn = {}
 
     # Function for autopct to show count and percentage
     def make_autopct(values):
@@ -137,119 +282,152 @@ def create_dual_pie_charts(category1, category2, category3, category4):
             return f'{count} ({pct:.1f}%)'
         return my_autopct
 
-    # Create two figures, each with three subplots
-    fig1, axes1 = plt.subplots(nrows=1, ncols=2, figsize=(16, 8))
-    fig2, axes2 = plt.subplots(nrows=1, ncols=2, figsize=(16, 8))
-    fig3, axes3 = plt.subplots(nrows=1, ncols=1, figsize=(8, 8))
-
-
     # First figure
-    axes1[0].pie(df_companies_gaming[category1 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category1 + ' Count']), startangle=140)
-    axes1[0].set_title(f'Distribution of {category1}')
+    if 1 in figures:
+        drawn[1], axes1 = plt.subplots(nrows=1, ncols=2, figsize=(16, 8))
+        axes1[0].pie(df_companies_gaming[category1 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category1 + ' Count']), startangle=140)
+        axes1[0].set_title(f'Distribution of {category1}')
 
-    axes1[1].pie(df_companies_gaming[category2 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category2 + ' Count']), startangle=140)
-    axes1[1].set_title(f'Distribution of {category2}')
+        axes1[1].pie(df_companies_gaming[category2 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category2 + ' Count']), startangle=140)
+        axes1[1].set_title(f'Distribution of {category2}')
 
     # Second figure
-    axes2[0].pie(df_companies_gaming[category3 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category3 + ' Count']), startangle=140)
-    axes2[0].set_title(f'Distribution of {category3}')
+    if 2 in figures:
+        drawn[2], axes2 = plt.subplots(nrows=1, ncols=2, figsize=(16, 8))
+        axes2[0].pie(df_companies_gaming[category3 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category3 + ' Count']), startangle=140)
+        axes2[0].set_title(f'Distribution of {category3}')
 
-    axes2[1].pie(df_companies_gaming[category4 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category4 + ' Count']), startangle=140)
-    axes2[1].set_title(f'Distribution of {category4}')
+        axes2[1].pie(df_companies_gaming[category4 + ' Count'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming[category4 + ' Count']), startangle=140)
+        axes2[1].set_title(f'Distribution of {category4}')
 
     # Third figure
+    if 3 in figures:
+        drawn[3], axes3 = plt.subplots(nrows=1, ncols=1, figsize=(8, 8))
+        axes3.pie(df_companies_gaming['Weighted Score'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming['Weighted Score']), startangle=140)
+        axes3.set_title('Distribution of Weighted Score')
 
-    axes3.pie(df_companies_gaming['Weighted Score'], labels=df_companies_gaming['City'], autopct=make_autopct(df_companies_gaming['Weighted Score']), startangle=140)
-    axes3.set_title('Distribution of Weighted Score')
-
-    # Show the figures
-    return plt
+    return drawn
 
-def build_map():
+@instrumentation.traced
+def build_map(mode='auto', zoom=None, max_points=MAX_POINTS, city_name='New York', snapshot=None):
     """
-    Builds and returns a Folium map for New York City, with additional markers for 
+    Builds and returns a Folium map for New York City (or city_name), with additional markers for 
     various categories such as Starbucks, Bars, Clubs, and Schools. Each category 
     is represented with a unique icon and color.
 
-    The function fetches data from MongoDB collections for each category, combines 
-    them into a single DataFrame, and then plots each location on the map with a 
+    The function takes the venues of every category inside the city's search area from 
+    a metrics snapshot (see snapshot.create_snapshot), and then plots each location on the map with a 
     customized icon. This map provides a visual representation of different 
     points of interest within the city.
+
+    Every category is drawn as one layer built from its columns (see add_points): with
+    mode='auto' the companies and every category are clustered in the browser once the map
+    holds more than MAX_MARKERS points, zoom merges nearby points before drawing and max_points
+    caps the size of each layer.
     """
+    import folium
 
-    map = city_map_new_york_companies()
-    def create_df_from_collection(collection):
-        data = []
-        for doc in collection.find():
-            # Extracting latitude and longitude
-            lat = doc.get('geocodes', {}).get('main', {}).get('latitude')
-            lon = doc.get('geocodes', {}).get('main', {}).get('longitude')
-
-            # Extracting name
-            chains = doc.get('chains', [])
-            if chains:
-                name = chains[0].get('name')  # Use name from 'chains' if available
-            else:
-                name = doc.get('name')  # Otherwise, use the 'name' field
-
-            # Extracting address and locality
-            address = doc.get('location', {}).get('formatted_address')
-            locality = doc.get('location', {}).get('locality')
-
-            # Append data if all information is present
-            if lat and lon and name and address and locality:
-                data.append({'Name': name, 'Address': address, 'Locality': locality, 'Latitude': lat, 'Longitude': lon})
-
-        return pd.DataFrame(data)
-
-    def combined_df():
-        # Create DataFrames for each category
-        df_starbucks = create_df_from_collection(db.get_collection("Starbucks"))
-        df_bar = create_df_from_collection(db.get_collection("Bar"))
-        df_club = create_df_from_collection(db.get_collection("Club"))
-        df_schools = create_df_from_collection(db.get_collection("Schools"))
-
-        # Combine all DataFrames
-        return pd.concat([df_starbucks, df_bar, df_club, df_schools], ignore_index=True)
-
-    df = combined_df()
-
-    groups = {
-        'Starbucks': folium.FeatureGroup(name='Starbucks'),
-        'Bar': folium.FeatureGroup(name='Bar'),
-        'Club': folium.FeatureGroup(name='Club'),
-        'School': folium.FeatureGroup(name='School')
-    }
+    snapshot = snapshot or get_snapshot()
 
-    for _, row in df.iterrows():
-        # Determine the icon and group based on the category
-        if 'Starbucks' in row['Name']:
-            icon_color, icon, group = "green", "coffee", groups['Starbucks']
-        elif 'Bar' in row['Name']:
-            icon_color, icon, group = "blue", "fa-id-card", groups['Bar']
-        elif 'Club' in row['Name']:
-            icon_color, icon, group = "black", "music", groups['Club']
-        elif 'School' in row['Name']:
-            icon_color, icon, group = "red", "fa-graduation-cap", groups['School']
-        else:
-            continue  # Skip if the category is not recognized
-
-        # Create a folium Icon
-        folium_icon = folium.Icon(color=icon_color, icon=icon, prefix='fa')
-
-        # Create a Marker within the appropriate group
-        folium.Marker(
-            location=[row["Latitude"], row["Longitude"]],
-            popup=f"{row['Name']}<br>{row['Address']}",
-            icon=folium_icon
-        ).add_to(group)
-
-    # Add each FeatureGroup to the map
-    for group in groups.values():
-        group.add_to(map)
+    # Venues of the city's search area, tagged with the collection they come from
+    df = snapshot.venues[snapshot.venues['City'] == city_name]
+
+    # One marker budget for the whole map, companies included
+    mode = map_mode(mode, len(df) + int((snapshot.offices['City'] == city_name).sum()))
+    map = city_map(city_name, snapshot, mode=mode, zoom=zoom, max_points=max_points)
+    if map is None:
+        return None
+
+    styles = {
+        'Starbucks': ("green", "coffee"),
+        'Bar': ("blue", "fa-id-card"),
+        'Club': ("black", "music"),
+        'Schools': ("red", "fa-graduation-cap"),
+    }
+    for category, (icon_color, icon) in styles.items():
+        rows = df[df['Category'] == category]
+        add_points(map, rows, category, color=icon_color, icon=icon,
+                   popup=rows['Name'].astype(str) + '<br>' + rows['Address'].astype(str),
+                   mode=mode, zoom=zoom, max_points=max_points)
 
     # Add LayerControl to toggle groups
     folium.LayerControl().add_to(map)
 
     return map
 
+# Snapshot of the current render_report worker process
+_worker_snapshot = None
+
+def _init_worker(path):
+    global _worker_snapshot
+    import matplotlib
+    # Headless rendering: no display, no GUI event loop
+    matplotlib.use("Agg")
+    _worker_snapshot = Snapshot.load(path)
+
+def save_charts(out_dir, categories=('Schools', 'Starbucks', 'Club', 'Bar'), snapshot=None, figures=(1, 2, 3)):
+    """
+    Draws figures of create_dual_pie_charts and saves them as chart_<figure>.png files.
+    Returns:
+    - List of the files written.
+    """
+    import matplotlib.pyplot as plt
+
+    # The figure objects themselves: other open figures (e.g. in a notebook) are left alone
+    files = []
+    for figure, fig in sorted(draw_pie_figures(*categories, snapshot=snapshot, figures=figures).items()):
+        files.append(os.path.join(out_dir, f"chart_{figure}.png"))
+        fig.savefig(files[-1], bbox_inches="tight")
+        plt.close(fig)
+    return files
+
+def save_city_map(out_dir, city_name, snapshot=None, mode='cluster'):
+    """
+    Builds the map of a city (see build_map) and saves it as map_<city>.html.
+    Report maps cluster every layer by default: thousands of folium.Marker objects dominated
+    the render time, while the clustered layers are built from one array in the browser.
+    Returns:
+    - Path of the file written, or None if the city has no map (see create_city_map).
+    """
+    map = build_map(mode=mode, city_name=city_name, snapshot=snapshot)
+    if map is None:
+        return None
+    file = os.path.join(out_dir, f"map_{city_name.lower().replace(' ', '_')}.html")
+    map.save(file)
+    return file
+
+def _render(task):
+    kind, city_name, out_dir, categories = task
+    if kind == "charts":
+        return save_charts(out_dir, categories, _worker_snapshot)
+    file = save_city_map(out_dir, city_name, _worker_snapshot)
+    return [file] if file else []
+
+@instrumentation.traced
+def render_report(out_dir="report", snapshot=None, categories=('Schools', 'Starbucks', 'Club', 'Bar'), processes=None):
+    """
+    Renders every chart and every city map of a metrics snapshot to files, on a pool of processes
+    with the Agg backend. Only the snapshot is read: no MongoDB queries and no API calls.
+    Args:
+    - out_dir: Output directory.
+    - snapshot: snapshot.Snapshot to render (defaults to the latest one).
+    - categories: The four categories of create_dual_pie_charts.
+    - processes: Size of the process pool (defaults to the number of CPUs).
+    Returns:
+    - List of the files written.
+    """
+    snapshot = snapshot or get_snapshot()
+    if snapshot.path is None:
+        snapshot.save()
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Workers load the snapshot from disk once instead of receiving it with every task
+    tasks = [("charts", None, out_dir, categories)] + [("map", city, out_dir, categories) for city in snapshot.cities]
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(snapshot.path,)) as executor:
+        return [file for files in executor.map(_render, tasks) for file in files]
+
+def __getattr__(name):
+    # Former module-level global, now computed on first access
+    if name == "df_companies_gaming":
+        return companies_gaming.get_offices()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
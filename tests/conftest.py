@@ -0,0 +1,41 @@
+import os
+import uuid
+
+import mongomock
+import pytest
+
+from src import config
+
+@pytest.fixture
+def context(tmp_path):
+    """
+    Context with its own cache directory and an in-memory mongomock client, restored afterwards.
+    """
+    context = config.Context(cache_dir=str(tmp_path / "cache"), token="stub", client=mongomock.MongoClient())
+    previous = config.set_context(context)
+    yield context
+    config.set_context(previous)
+
+@pytest.fixture
+def mongod(tmp_path):
+    """
+    Context on a real MongoDB server ($TEST_MONGO_URI, default localhost:27017) with throwaway
+    databases, dropped afterwards. Skipped when no server answers.
+    """
+    pymongo = pytest.importorskip("pymongo")
+    uri = os.getenv("TEST_MONGO_URI", "localhost:27017")
+    client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        client.close()
+        pytest.skip(f"No MongoDB server at {uri}")
+    suffix = uuid.uuid4().hex[:8]
+    context = config.Context(cache_dir=str(tmp_path / "cache"), token="stub", client=client,
+                             companies_db=f"test_companies_{suffix}", venues_db=f"test_venues_{suffix}")
+    previous = config.set_context(context)
+    yield context
+    config.set_context(previous)
+    client.drop_database(context.companies_db)
+    client.drop_database(context.venues_db_name)
+    client.close()
@@ -0,0 +1,72 @@
+import mongomock
+import pandas as pd
+import pytest
+
+from src import companies_gaming
+from src import config
+
+def company(name, offices, tags="gaming"):
+    return {"name": name, "tag_list": tags, "offices": [
+        {"city": city, "address1": "1 Main Street", "latitude": lat, "longitude": lon}
+        for city, lat, lon in offices
+    ]}
+
+@pytest.fixture
+def companies(context):
+    # build_tag_index tokenizes with $reduce, which mongomock lacks: the tokens and index are stored upfront
+    collection = context.companies
+    collection.create_index(companies_gaming.TAG_FIELD)
+
+    def insert(*docs):
+        for doc in docs:
+            tokens = [tag.strip().lower() for tag in doc["tag_list"].split(",")]
+            collection.insert_one({**doc, companies_gaming.TAG_FIELD: tokens})
+        return collection
+    return insert
+
+def test_city_whose_offices_are_all_outliers(companies, capsys):
+    # Two San Francisco offices 20 km apart are both outliers; New York has a circle
+    companies(
+        company("Far", [("San Francisco", 37.60, -122.40), ("San Francisco", 37.78, -122.40)]),
+        company("Near", [("New York", 40.70, -74.00), ("New York", 40.72, -74.01)]),
+    )
+    assert companies_gaming.midpoint_coordinates_radius_sf() == (None, None, None)
+    assert "No data available for San Francisco" in capsys.readouterr().out
+    assert companies_gaming.midpoint_coordinates_radius_ldn() == (None, None, None)
+    lat, lon, radius = companies_gaming.midpoint_coordinates_radius_ny()
+    assert lat == pytest.approx(40.71) and radius > 0
+
+    offices = companies_gaming.get_offices()
+    assert companies_gaming.get_city_midpoint_and_radius(offices, "San Francisco") == (None, None, None)
+    assert companies_gaming.get_city_midpoint_and_radius(offices, "London") == (None, None, None)
+
+def test_cities_location(companies):
+    collection = companies(
+        company("Studio", [("New York", 40.70, -74.0), ("New York", 40.70, -74.0), ("Boston", 42.36, -71.06),
+                           ("New York", float("nan"), -74.0), ("New York", None, -74.0), ("New York", "40.7", -74.0)]),
+        company("Social", [("London", 51.50, -0.12)], tags="Social-Gaming, iPhone"),
+        company("Bank", [("New York", 40.75, -73.98)], tags="finance"),
+    )
+    df = companies_gaming.cities_location(["New York", "London"], collection=collection, use_cache=False)
+    assert list(df.columns) == ["Company Name", "City", "Street", "Latitude", "Longitude"]
+    # Other cities, other tags, missing or non-numeric coordinates and duplicates are dropped
+    assert df[["Company Name", "City", "Latitude", "Longitude"]].values.tolist() == [
+        ["Social", "London", 51.50, -0.12],
+        ["Studio", "New York", 40.70, -74.0],
+    ]
+    assert df["Latitude"].dtype == float
+    # The top_cities DataFrame is accepted as well
+    top = pd.DataFrame({"City": ["London"], "Count": [1]})
+    assert companies_gaming.cities_location(top, collection=collection, use_cache=False)["City"].tolist() == ["London"]
+
+def test_tag_index_is_checked_again_in_a_new_context(companies, context):
+    collection = companies(company("Studio", [("New York", 40.70, -74.0)]))
+    companies_gaming.build_tag_index(collection)
+    assert collection.full_name in companies_gaming._tag_indexed
+    # Another client with the same database and collection names has no index yet
+    previous = config.set_context(config.Context(cache_dir=context.cache_dir, client=mongomock.MongoClient()))
+    try:
+        assert companies_gaming.get_collection().full_name == collection.full_name
+        assert collection.full_name not in companies_gaming._tag_indexed
+    finally:
+        config.set_context(previous)
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+import requests
+
+from src import geometry
+from src import rate_limit
+from src import tiling
+from src.fetcher import Fetcher
+from benchmarks.stub_foursquare import StubFoursquare
+
+@pytest.fixture
+def fetcher_for(context):
+    fetchers = []
+
+    def make(stub, **kwargs):
+        kwargs = {"base_url": stub.url, "token": "stub", "backoff": 0.001, **kwargs}
+        fetchers.append(Fetcher(**kwargs))
+        return fetchers[-1]
+
+    yield make
+    for fetcher in fetchers:
+        fetcher.close()
+
+def test_search_returns_the_page(fetcher_for):
+    with StubFoursquare(latency=0) as stub:
+        response = fetcher_for(stub).search("Bar", 40.71, -74.0, radius=1000)
+    assert len(response["results"]) == 50
+    assert stub.requests == 1
+
+@pytest.mark.parametrize("statuses", [[500], [502, 503], [504, 429, 500]])
+def test_retries_transient_errors(fetcher_for, statuses):
+    with StubFoursquare(latency=0, statuses=statuses, retry_after=0.01) as stub:
+        response = fetcher_for(stub, retries=3).search("Bar", 40.71, -74.0, radius=1000)
+    assert len(response["results"]) == 50
+    assert stub.requests == len(statuses) + 1
+
+def test_gives_up_after_the_last_retry(fetcher_for):
+    with StubFoursquare(latency=0, statuses=[503] * 5, retry_after=0.01) as stub:
+        with pytest.raises(requests.HTTPError):
+            fetcher_for(stub, retries=2).search("Bar", 40.71, -74.0)
+    assert stub.requests == 3
+
+def test_client_errors_are_not_retried(fetcher_for):
+    with StubFoursquare(latency=0, statuses=[400]) as stub:
+        with pytest.raises(requests.HTTPError):
+            fetcher_for(stub, retries=3).search("Bar", 40.71, -74.0)
+    assert stub.requests == 1
+
+def test_honors_retry_after(fetcher_for):
+    with StubFoursquare(latency=0, statuses=[429], retry_after=0.3) as stub:
+        start = time.perf_counter()
+        fetcher_for(stub, retries=1).search("Bar", 40.71, -74.0)
+        elapsed = time.perf_counter() - start
+    # The backoff alone would wait about a millisecond
+    assert elapsed >= 0.3
+    assert stub.requests == 2
+
+def test_429_blocks_the_shared_limiter(fetcher_for, tmp_path):
+    limiter = rate_limit.RateLimiter("stub", rate=1000, burst=10, path=str(tmp_path / "limits.sqlite"))
+    with StubFoursquare(latency=0, statuses=[429], retry_after=0.3) as stub:
+        start = time.perf_counter()
+        fetcher_for(stub, retries=1, limiter=limiter).search("Bar", 40.71, -74.0)
+        elapsed = time.perf_counter() - start
+    assert elapsed >= 0.3
+    assert limiter.throttled == 1
+    assert limiter.calls == 2
+
+def test_timeouts_are_retried_then_raised(fetcher_for):
+    with StubFoursquare(latency=0.5) as stub:
+        start = time.perf_counter()
+        with pytest.raises(requests.Timeout):
+            fetcher_for(stub, retries=1, timeout=0.05).search("Bar", 40.71, -74.0)
+        elapsed = time.perf_counter() - start
+    # Two attempts timed out; neither waited for the slow response
+    assert 0.1 <= elapsed < 0.5
+
+def test_search_many_keeps_the_order(fetcher_for):
+    searches = [{"query": "Bar", "lat": 40.0 + i / 100, "lon": -74.0, "radius": 200} for i in range(40)]
+    with StubFoursquare(latency=0.01) as stub:
+        fetcher = fetcher_for(stub, max_workers=8)
+        ordered = fetcher.search_many(searches)
+        streamed = dict(fetcher.iter_search(iter(searches), window=4))
+    assert sorted(streamed) == list(range(len(searches)))
+    assert [streamed[i] for i in range(len(searches))] == ordered
+    # Every fake venue lies around the center of its own search
+    for search, response in zip(searches, ordered):
+        assert response["results"]
+        assert all(abs(venue["geocodes"]["main"]["latitude"] - search["lat"]) < 0.01 for venue in response["results"])
+
+def test_crawl_pages_past_the_result_cap(fetcher_for):
+    # About 300 fake venues in the circle against pages of 50: the crawl has to split tiles
+    areas = {"Stub City": (40.71, -74.0, 1000)}
+    with StubFoursquare(latency=0) as stub:
+        venues, stats = tiling.crawl("Bar", areas, limit=50, fetcher=fetcher_for(stub))
+    venues = venues["Stub City"]
+    stats = stats.set_index("City").loc["Stub City"]
+    assert len(venues) > 50
+    assert len({venue["fsq_id"] for venue in venues}) == len(venues)
+    assert stats["Saturated"] > 0 and stats["Depth"] > 0
+    assert stats["Tiles"] == stub.requests
+    lat = [venue["geocodes"]["main"]["latitude"] for venue in venues]
+    lon = [venue["geocodes"]["main"]["longitude"] for venue in venues]
+    assert geometry.haversine(40.71, -74.0, lat, lon).max() <= 1000
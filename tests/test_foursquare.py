@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+from pymongo import InsertOne, UpdateOne
+
+from src import config
+from src import foursquare
+
+AREAS = {"San Francisco": (37.77, -122.42, 1000), "New York": (40.71, -74.0, 2000)}
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+
+    def bulk_write(self, requests, ordered=True):
+        # Every UpdateOne matches an existing venue, unchanged
+        self.db.batches.append(requests)
+        upserts = sum(isinstance(request, UpdateOne) for request in requests)
+        return SimpleNamespace(upserted_count=0, inserted_count=len(requests) - upserts, modified_count=0,
+                               matched_count=upserts)
+
+    def aggregate(self, pipeline):
+        self.db.pipelines.append((self.name, pipeline))
+        return iter([self.db.facets])
+
+class FakeDB:
+    def __init__(self, facets):
+        self.facets = facets
+        self.pipelines = []
+        self.batches = []
+
+    def get_collection(self, name):
+        return FakeCollection(self, name)
+
+    __getitem__ = get_collection
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    def make(facets):
+        db = FakeDB(facets)
+        monkeypatch.setattr(foursquare, "get_db", lambda: db)
+        monkeypatch.setattr(foursquare, "build_geo_index", lambda collection: None)
+        monkeypatch.setattr(foursquare, "build_key_index", lambda collection: None)
+        return db
+    return make
+
+def test_count_matrix_pipeline_and_matrix(fake_db):
+    db = fake_db({"city0": [{"_id": "Club", "n": 2}, {"_id": "Bar", "n": 5}], "city1": [{"_id": "Bar", "n": 7}]})
+    df = foursquare.count_matrix(["Bar", "Club"], AREAS)
+
+    assert df.to_dict("list") == {"City": ["San Francisco", "New York"], "Bar Count": [5, 7], "Club Count": [2, 0]}
+    # One aggregation on the first collection: its filter, the other collection merged in, one facet per city
+    [(name, pipeline)] = db.pipelines
+    assert name == "Bar"
+    assert [next(iter(stage)) for stage in pipeline] == ["$match", "$project", "$unionWith", "$facet"]
+    assert len(pipeline[0]["$match"]["$or"]) == len(AREAS)
+    assert pipeline[2]["$unionWith"]["coll"] == "Club"
+    assert pipeline[2]["$unionWith"]["pipeline"][1]["$project"]["category"] == {"$literal": "Club"}
+    facet = pipeline[3]["$facet"]
+    assert list(facet) == ["city0", "city1"]
+    # $centerSphere takes radians
+    center, radius = facet["city1"][0]["$match"][foursquare.GEO_FIELD]["$geoWithin"]["$centerSphere"]
+    assert center == [-74.0, 40.71] and radius == pytest.approx(2000 / foursquare.EARTH_RADIUS)
+
+@pytest.mark.parametrize("c_names, areas, shape", [
+    (["Bar", "Club"], {}, (0, 3)),
+    ([], AREAS, (2, 1)),
+])
+def test_count_matrix_without_cities_or_categories(fake_db, c_names, areas, shape):
+    db = fake_db({})
+    df = foursquare.count_matrix(c_names, areas)
+    assert df.shape == shape
+    assert list(df.columns) == ["City"] + [f"{c_name} Count" for c_name in c_names]
+    assert db.pipelines == []
+
+def venue(fsq_id, name="Venue", lat=40.71, lon=-74.0):
+    return {"fsq_id": fsq_id, "name": name, "geocodes": {"main": {"latitude": lat, "longitude": lon}}}
+
+def test_venue_writer_batches(fake_db):
+    db = fake_db({})
+    with foursquare.VenueWriter("Bar", buffer_size=2) as writer:
+        writer.write({**venue("a"), "_id": "dropped"})
+        writer.write(venue("b"))
+        assert len(db.batches) == 1
+        writer.write({"name": "No key", "geocodes": {}})
+    # The last partial batch is written on exit
+    assert [len(batch) for batch in db.batches] == [2, 1]
+    first, second = db.batches
+    assert isinstance(first[0], UpdateOne) and isinstance(second[0], InsertOne)
+    assert first[0]._filter == {"fsq_id": "a"}
+    document = first[0]._doc["$set"]
+    assert "_id" not in document
+    assert document[foursquare.GEO_FIELD] == {"type": "Point", "coordinates": [-74.0, 40.71]}
+    assert foursquare.GEO_FIELD not in second[0]._doc
+    assert writer.counts == {"inserted": 1, "updated": 0, "unchanged": 2}
+
+def test_upserts_are_idempotent(mongod):
+    venues = [venue("a"), venue("b"), {"name": "No key"}]
+    assert foursquare.upload_collection("Bar", venues, batch_size=2) == {"inserted": 3, "updated": 0, "unchanged": 0}
+    renamed = [venue("a"), venue("b", name="Renamed")]
+    assert foursquare.upload_collection("Bar", renamed) == {"inserted": 0, "updated": 1, "unchanged": 1}
+    collection = foursquare.get_db()["Bar"]
+    assert collection.count_documents({}) == 3
+    assert collection.find_one({"fsq_id": "b"})["name"] == "Renamed"
+    assert collection.count_documents({foursquare.GEO_FIELD: {"$exists": True}}) == 2
+
+def test_key_index_removes_duplicates(mongod):
+    collection = foursquare.get_db()["Club"]
+    collection.insert_many([{"_id": 2, "fsq_id": "a", "copy": "new"}, {"_id": 1, "fsq_id": "a", "copy": "old"},
+                            {"_id": 3, "fsq_id": "b"}, {"_id": 4}, {"_id": 5}])
+    foursquare.build_key_index(collection)
+    # The oldest copy is kept; venues without a key are left alone
+    assert sorted(doc["_id"] for doc in collection.find()) == [1, 3, 4, 5]
+    assert collection.find_one({"fsq_id": "a"})["copy"] == "old"
+    index = collection.index_information()["fsq_id_1"]
+    assert index["unique"]
+
+def test_geo_index_is_built_again_in_a_new_context(context):
+    foursquare.build_geo_index(foursquare.get_db()["Bar"])
+    previous = config.set_context(config.Context(cache_dir=context.cache_dir, client=mongomock.MongoClient()))
+    try:
+        # Same database and collection names, other client: the index must be created there too
+        collection = foursquare.get_db()["Bar"]
+        foursquare.build_geo_index(collection)
+        assert f"{foursquare.GEO_FIELD}_2dsphere" in collection.index_information()
+    finally:
+        config.set_context(previous)
+
+def test_key_index_is_built_again_in_a_new_context(context, monkeypatch):
+    built = []
+    monkeypatch.setattr(foursquare.get_db()["Bar"].__class__, "create_index",
+                        lambda self, *args, **kwargs: built.append(self.full_name))
+    foursquare.build_key_index(foursquare.get_db()["Bar"])
+    foursquare.build_key_index(foursquare.get_db()["Bar"])
+    assert built == ["Project_III.Bar"]
+    previous = config.set_context(config.Context(cache_dir=context.cache_dir, client=mongomock.MongoClient()))
+    try:
+        foursquare.build_key_index(foursquare.get_db()["Bar"])
+    finally:
+        config.set_context(previous)
+    assert built == ["Project_III.Bar"] * 2
@@ -0,0 +1,71 @@
+import pytest
+
+from src import geocoding
+from src import rate_limit
+
+class FakeResponse:
+
+    def __init__(self, status, body=None, headers=None):
+        self.status_code = status
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        import requests
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+class FakeSession:
+    """
+    Answers the scripted responses in order, then coordinates derived from the address.
+    """
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        if self.script:
+            return self.script.pop(0)
+        return FakeResponse(200, {"latt": "40.7", "longt": "-74.0"})
+
+@pytest.fixture
+def session(context, monkeypatch):
+    monkeypatch.setitem(rate_limit.DEFAULT_LIMITS, "geocode", {"rate": 1000.0, "burst": 10, "daily_quota": None})
+    session = FakeSession()
+    monkeypatch.setattr(geocoding, "_session", lambda: session)
+    return session
+
+def test_429_is_retried_after_blocking_the_limiter(session):
+    session.script = [FakeResponse(429, {"error": "Throttled"}, {"Retry-After": "0.01"})]
+    assert geocoding.parse_coordinates(geocoding.geocode("1 Main St, New York")) == (40.7, -74.0)
+    assert len(session.urls) == 2
+    assert rate_limit.get_limiter("geocode").throttled == 1
+
+def test_5xx_is_retried(session):
+    session.script = [FakeResponse(503), FakeResponse(502)]
+    assert geocoding.parse_coordinates(geocoding.geocode("1 Main St", backoff=0.001)) == (40.7, -74.0)
+    assert len(session.urls) == 3
+
+def test_geocode_many_reports_persistent_throttling_without_caching_it(session):
+    throttled = FakeResponse(429, {"error": "Throttled"}, {"Retry-After": "0.01"})
+    session.script = [throttled] * 3
+    first = geocoding.geocode_many(["1 Main St"])
+    assert first["Source"].isna().all()
+    # The failure was not cached: the next run asks again and succeeds
+    second = geocoding.geocode_many(["1 Main St"])
+    assert list(second["Source"]) == ["geocode"]
+    third = geocoding.geocode_many(["  1 main st "])
+    assert list(third["Source"]) == ["cache"]
+    assert len(session.urls) == 4
+
+def test_geocode_many_uses_known_coordinates(session):
+    known = {geocoding.normalize_address("1 Main St, New York"): (1.0, 2.0)}
+    result = geocoding.geocode_many(["1 Main St,New York", None], known=known)
+    assert result.loc[0, "Source"] == "offices" and result["Source"].isna()[1]
+    assert (result.loc[0, "Latitude"], result.loc[0, "Longitude"]) == (1.0, 2.0)
+    assert session.urls == []
@@ -0,0 +1,70 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from src import geometry
+
+def brute_force_diameter(lat, lon):
+    # Largest haversine distance over every pair of points
+    return max(geometry.haversine(lat[i], lon[i], lat[j], lon[j])
+               for i, j in itertools.combinations(range(len(lat)), 2))
+
+def pair_distance(lat, lon, pair):
+    i, j = pair
+    return geometry.haversine(lat[i], lon[i], lat[j], lon[j])
+
+def test_parallelogram_diameter():
+    # Two pairs of parallel hull edges whose caliper areas tie exactly
+    lat = np.array([40.71, 40.68, 40.68, 40.71])
+    lon = np.array([-74.02, -74.01, -73.98, -73.99])
+    pair = geometry.farthest_pair(lat, lon)
+    assert sorted(pair) == [0, 2]
+    assert pair_distance(lat, lon, pair) == pytest.approx(4743.4, abs=1)
+    _, _, radius = geometry.midpoint_and_radius(lat, lon)
+    assert radius == pytest.approx(2371.7, rel=1e-3)
+
+@pytest.mark.parametrize("lat, lon", [
+    # Rectangle and square: every edge has a parallel twin
+    ([40.70, 40.70, 40.72, 40.72], [-74.00, -73.97, -73.97, -74.00]),
+    ([40.70, 40.70, 40.71, 40.71], [-74.00, -73.99, -73.99, -74.00]),
+    # Regular hexagon
+    (40.7 + 0.01 * np.sin(np.arange(6) * np.pi / 3), -74.0 + 0.01 * np.cos(np.arange(6) * np.pi / 3)),
+    # Collinear points, with duplicates
+    ([40.70, 40.70, 40.70, 40.70, 40.70], [-74.00, -73.99, -73.97, -73.99, -74.00]),
+    ([40.70, 40.71, 40.72, 40.73], [-74.00, -73.99, -73.98, -73.97]),
+    # Identical points
+    ([40.70, 40.70, 40.70], [-74.00, -74.00, -74.00]),
+])
+def test_tied_and_degenerate_inputs(lat, lon):
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    distance = pair_distance(lat, lon, geometry.farthest_pair(lat, lon))
+    assert distance == pytest.approx(brute_force_diameter(lat, lon), rel=1e-9, abs=1e-6)
+
+def test_rounded_coordinates_match_brute_force():
+    # Coordinates rounded to a grid produce many collinear points and parallel edges
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        n = int(rng.integers(2, 25))
+        lat = np.round(40.7 + rng.normal(0, 0.02, n), 2)
+        lon = np.round(-74.0 + rng.normal(0, 0.02, n), 2)
+        distance = pair_distance(lat, lon, geometry.farthest_pair(lat, lon))
+        assert distance == pytest.approx(brute_force_diameter(lat, lon), rel=1e-9, abs=1e-6)
+
+def test_mec_encloses_every_point():
+    rng = np.random.default_rng(1)
+    lat = 37.77 + rng.normal(0, 0.02, 500)
+    lon = -122.42 + rng.normal(0, 0.02, 500)
+    mid_lat, mid_lon, radius = geometry.midpoint_and_radius(lat, lon, method="mec")
+    assert geometry.haversine(mid_lat, mid_lon, lat, lon).max() <= radius * (1 + 1e-9)
+    _, _, diameter_radius = geometry.midpoint_and_radius(lat, lon)
+    assert radius >= diameter_radius * (1 - 1e-3)
+
+def test_city_without_inliers_is_not_located():
+    # Two offices 20 km apart are both 10 km from their centroid, beyond the outlier threshold
+    city = geometry.CityGeometry("Split", [40.6, 40.78], [-74.0, -74.0])
+    assert not city.inliers.any()
+    assert not city.located
+    assert city.farthest is None and np.isnan(city.radius)
+    restored = geometry.CityGeometry.from_dict(city.to_dict())
+    assert not restored.located
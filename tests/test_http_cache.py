@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from src import http_cache
+
+@pytest.fixture
+def cache(tmp_path):
+    return http_cache.ResponseCache(path=str(tmp_path / "responses.sqlite"), ttls={"test": 60})
+
+def counting(body):
+    calls = []
+
+    def request():
+        calls.append(1)
+        return body
+    return request, calls
+
+def test_fetch_caches_by_normalized_params(cache):
+    request, calls = counting({"results": [1]})
+    assert cache.fetch("test", {"query": "Bar", "lat": 40.712345}, request) == {"results": [1]}
+    # Same key after normalization: case, surrounding spaces and digits past the precision
+    assert cache.fetch("test", {"query": " bar ", "lat": 40.71234501}, request) == {"results": [1]}
+    assert len(calls) == 1
+    assert cache.stats() == {"hits": {"test": 1}, "misses": {"test": 1}, "entries": {"test": 1}}
+
+def test_expired_entries_are_fetched_again(cache):
+    request, calls = counting({"results": []})
+    cache.fetch("test", {"q": 1}, request)
+    cache.ttls["test"] = 0
+    time.sleep(0.01)
+    cache.fetch("test", {"q": 1}, request)
+    assert len(calls) == 2
+
+def test_rejected_bodies_are_not_cached(cache):
+    request, calls = counting({"error": "Throttled! See geocode.xyz/pricing"})
+    ok = lambda body: "error" not in body
+    cache.fetch("test", {"where": "x"}, request, cacheable=ok)
+    cache.fetch("test", {"where": "x"}, request, cacheable=ok)
+    assert len(calls) == 2
+    assert cache.get("test", {"where": "x"}) is None
+
+def test_previously_stored_rejected_bodies_are_misses(cache):
+    cache.put("test", {"where": "x"}, {"error": "Throttled"})
+    request, calls = counting({"latt": "1", "longt": "2"})
+    body = cache.fetch("test", {"where": "x"}, request, cacheable=lambda body: "error" not in body)
+    assert body == {"latt": "1", "longt": "2"} and len(calls) == 1
+    assert cache.get("test", {"where": "x"}) == body
+
+def test_offline_serves_expired_entries_and_raises_on_misses(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    http_cache.ResponseCache(path=path).put("test", {"q": 1}, {"results": [1]})
+    offline = http_cache.ResponseCache(path=path, ttls={"test": 0}, offline=True)
+    assert offline.fetch("test", {"q": 1}, lambda: pytest.fail("no request offline")) == {"results": [1]}
+    with pytest.raises(http_cache.OfflineCacheMiss):
+        offline.fetch("test", {"q": 2}, lambda: pytest.fail("no request offline"))
+
+def test_evict_keeps_the_most_recently_used(cache):
+    cache.max_entries = 3
+    for i in range(5):
+        cache.put("test", {"q": i}, {"i": i})
+        time.sleep(0.002)
+    cache.get("test", {"q": 0})  # Touch the oldest entry
+    assert cache.evict() == 2
+    kept = [i for i in range(5) if cache.get("test", {"q": i}) is not None]
+    assert kept == [0, 3, 4]
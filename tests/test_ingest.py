@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from src import foursquare
+from src import ingest
+from src.fetcher import Fetcher
+from benchmarks.stub_foursquare import StubFoursquare
+
+AREAS = {"San Francisco": (37.77, -122.42, 1000), "New York": (40.71, -74.0, 1000)}
+CATEGORIES = {"Bar": "bar", "Club": "club"}
+
+def raw_venue(lat=40.71, lon=-74.0, chains=(), **fields):
+    return {"fsq_id": "a", "name": "Venue", "chains": [{"name": name} for name in chains],
+            "geocodes": {"main": {"latitude": lat, "longitude": lon}},
+            "location": {"formatted_address": "1 Main Street", "locality": "New York"}, **fields}
+
+@pytest.fixture
+def stub_fetcher():
+    # Requested after context (or mongod), so the rate limiter files go to its cache directory
+    with StubFoursquare(latency=0) as stub:
+        fetcher = Fetcher(base_url=stub.url, token="stub", backoff=0.001)
+        yield fetcher
+        fetcher.close()
+
+def test_normalize_venue():
+    doc = ingest.normalize_venue(raw_venue(chains=["Starbucks"], _id="dropped"), "Starbucks", "New York")
+    assert "_id" not in doc
+    assert doc["geocodes"] == {"main": {"latitude": 40.71, "longitude": -74.0}}  # Raw fields are kept
+    assert {key: doc[key] for key in ("category", "city", "chain", "address", "locality", "latitude", "longitude")} == {
+        "category": "Starbucks", "city": "New York", "chain": "Starbucks", "address": "1 Main Street",
+        "locality": "New York", "latitude": 40.71, "longitude": -74.0,
+    }
+    assert doc[foursquare.GEO_FIELD] == {"type": "Point", "coordinates": [-74.0, 40.71]}
+
+def test_normalize_venue_without_location():
+    doc = ingest.normalize_venue({"fsq_id": "b", "chains": None, "location": None}, "Bar", "London")
+    assert (doc["chain"], doc["address"], doc["latitude"], doc["longitude"]) == (None, None, None, None)
+    assert foursquare.GEO_FIELD not in doc
+
+def test_running_aggregates():
+    aggregates = ingest.RunningAggregates()
+    for lat, lon, chains in [(40.70, -74.02, ["Starbucks"]), (40.72, -74.00, []), (None, None, [])]:
+        aggregates.add(ingest.normalize_venue(raw_venue(lat, lon, chains), "Bar", "New York"))
+    aggregates.add(ingest.normalize_venue(raw_venue(51.5, -0.12), "Bar", "London"))
+
+    df = aggregates.to_frame().set_index(["City", "Category"])
+    new_york = df.loc[("New York", "Bar")]
+    assert (new_york["Count"], new_york["Chains"], new_york["Located"]) == (3, 1, 2)
+    assert new_york["Latitude"] == pytest.approx(40.71) and new_york["Longitude"] == pytest.approx(-74.01)
+    assert (new_york["South"], new_york["North"], new_york["West"], new_york["East"]) == (40.70, 40.72, -74.02, -74.00)
+    assert df.loc[("London", "Bar"), "Count"] == 1
+    assert ingest.RunningAggregates().to_frame().empty
+
+def test_ingest_without_storing(context, stub_fetcher, monkeypatch):
+    monkeypatch.setattr(foursquare, "VenueWriter", lambda *args: pytest.fail("venues were stored"))
+    aggregates, writes = ingest.ingest(CATEGORIES, AREAS, store=False, fetcher_=stub_fetcher)
+    assert writes == {}
+    df = aggregates.to_frame()
+    # One page of 50 venues per (category, city) pair, each centered on its city
+    assert sorted(zip(df["City"], df["Category"])) == sorted((city, c_name) for city in AREAS for c_name in CATEGORIES)
+    assert (df["Count"] == 50).all() and (df["Located"] == 50).all()
+    for row in df.itertuples():
+        lat, lon, radius = AREAS[row.City]
+        assert math.dist((row.Latitude, row.Longitude), (lat, lon)) < radius / 111_320
+
+def test_ingest_complete_crawl(context, stub_fetcher):
+    # The stub holds 314 venues per circle of 1000 m: the crawl goes past the page of 50
+    aggregates, _ = ingest.ingest({"Bar": "bar"}, {"New York": AREAS["New York"]}, complete=True, store=False,
+                                  fetcher_=stub_fetcher)
+    assert aggregates.to_frame()["Count"].iloc[0] > 50
+
+def test_ingest_stores_and_counts_once(mongod, stub_fetcher):
+    _, writes = ingest.ingest(CATEGORIES, AREAS, buffer_size=30, fetcher_=stub_fetcher)
+    assert writes == {c_name: {"inserted": 100, "updated": 0, "unchanged": 0} for c_name in CATEGORIES}
+    # A second (or resumed) run upserts the same venues: the stored counts do not grow
+    _, writes = ingest.ingest(CATEGORIES, AREAS, fetcher_=stub_fetcher)
+    assert writes == {c_name: {"inserted": 0, "updated": 0, "unchanged": 100} for c_name in CATEGORIES}
+    counts = foursquare.count_matrix(list(CATEGORIES), AREAS)
+    assert counts.to_dict("list") == {"City": list(AREAS), "Bar Count": [50, 50], "Club Count": [50, 50]}
@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import instrumentation
+
+@pytest.fixture
+def recorder(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_enabled", True)
+    instrumentation.reset()
+    yield instrumentation.get_recorder()
+    instrumentation.reset()
+
+@instrumentation.traced
+def traced_sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+@instrumentation.traced(name="custom.name")
+def traced_failure():
+    raise KeyError("missing")
+
+def trace_events(path):
+    with open(path, encoding="utf-8") as f:
+        trace = json.load(f)
+    assert trace["displayTimeUnit"] == "ms"
+    return {event["name"]: event for event in trace["traceEvents"]}
+
+def test_nested_spans_in_the_chrome_trace(recorder, tmp_path):
+    with instrumentation.span("outer", city="X") as outer:
+        traced_sleep(0.01)
+        with instrumentation.span("inner", category="mongo"):
+            time.sleep(0.01)
+        outer.set(rows=3)
+    with pytest.raises(KeyError):
+        traced_failure()
+
+    events = trace_events(instrumentation.export_chrome_trace(str(tmp_path / "trace.json")))
+    assert set(events) == {"outer", "test_instrumentation.traced_sleep", "inner", "custom.name"}
+    for event in events.values():
+        assert event["ph"] == "X" and event["tid"] == threading.get_ident()
+        assert event["ts"] >= 0 and event["dur"] > 0
+    # Complete events nest by time on a thread: the children lie inside their parent, one after the other
+    outer, child, inner = events["outer"], events["test_instrumentation.traced_sleep"], events["inner"]
+    for event in (child, inner):
+        assert outer["ts"] <= event["ts"] and event["ts"] + event["dur"] <= outer["ts"] + outer["dur"]
+    assert child["ts"] + child["dur"] <= inner["ts"]
+    assert child["dur"] >= 0.01 * 1e6 and outer["dur"] >= 0.02 * 1e6
+    assert outer["args"] == {"city": "X", "rows": 3}
+    assert (inner["cat"], child["cat"]) == ("mongo", "function")
+    assert events["custom.name"]["args"] == {"error": "KeyError"}
+
+def test_report(recorder, tmp_path):
+    for seconds in (0.001, 0.002):
+        traced_sleep(seconds)
+    instrumentation.record_http("foursquare", 200, time.perf_counter(), 0.03)
+    instrumentation.record_http("foursquare", 429, time.perf_counter(), 20.0)
+
+    with open(instrumentation.export_json(str(tmp_path / "report.json")), encoding="utf-8") as f:
+        report = json.load(f)
+    spans = report["spans"]
+    assert spans["test_instrumentation.traced_sleep"]["count"] == 2
+    assert spans["test_instrumentation.traced_sleep"]["mean"] == pytest.approx(
+        spans["test_instrumentation.traced_sleep"]["total"] / 2)
+    assert spans["http.foursquare"]["count"] == 2
+    http = report["http"]["foursquare"]
+    assert http["statuses"] == {"200": 1, "429": 1}
+    assert http["histogram"]["<=0.05"] == 1 and http["histogram"][">10.0"] == 1
+    assert (http["p50"], http["p99"]) == (0.05, None)
+
+def test_disabled_records_nothing(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_enabled", False)
+    instrumentation.reset()
+    with instrumentation.span("ignored") as span:
+        span.set(rows=1)
+    assert traced_sleep(0) == 0
+    assert instrumentation.report()["spans"] == {}
+
+def test_event_limit(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_recorder", instrumentation.Recorder(max_events=2))
+    monkeypatch.setattr(instrumentation, "_enabled", True)
+    for _ in range(3):
+        traced_sleep(0)
+    report = instrumentation.report()
+    assert (report["events"], report["dropped"]) == (2, 1)
+    assert report["spans"]["test_instrumentation.traced_sleep"]["count"] == 3
+
+def command_event(name, request_id, **fields):
+    return SimpleNamespace(command_name=name, command={name: "Bar"}, connection_id=("localhost", 27017),
+                           request_id=request_id, database_name="Project_III", duration_micros=1500, **fields)
+
+def test_command_listener(recorder):
+    listener = instrumentation.command_listener()
+    listener.started(command_event("aggregate", 1))
+    listener.succeeded(command_event("aggregate", 1, reply={"cursor": {"firstBatch": [{}, {}, {}]}}))
+    listener.started(command_event("insert", 2))
+    listener.failed(command_event("insert", 2, failure={"errmsg": "duplicate key"}))
+
+    spans = instrumentation.report()["spans"]
+    assert spans["mongo.aggregate"]["documents"] == 3
+    assert spans["mongo.aggregate"]["total"] == pytest.approx(0.0015)
+    assert spans["mongo.insert"]["errors"] == 1
+    events = {event["name"]: event for event in recorder.chrome_trace()["traceEvents"]}
+    assert events["mongo.aggregate"]["args"] == {"database": "Project_III", "collection": "Bar", "documents": 3}
+    assert events["mongo.insert"]["args"]["error"] == "duplicate key"
+    assert events["mongo.aggregate"]["cat"] == "mongo"
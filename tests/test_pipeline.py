@@ -0,0 +1,194 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src import geometry
+from src import pipeline
+from src.pipeline import ArtifactStore, Pipeline, Stage
+
+calls = []
+
+def source(n):
+    calls.append("source")
+    return list(range(n))
+
+def parity(numbers):
+    calls.append("parity")
+    return [number % 2 for number in numbers]
+
+def total(values, offset=0):
+    calls.append("total")
+    return sum(values) + offset
+
+def square(value):
+    # Module level so the process pool can pickle it
+    return value * value
+
+def write_file(value, path):
+    calls.append("write")
+    with open(path, "w") as f:
+        f.write(str(value))
+    return [path]
+
+def split_offices():
+    # Two offices 20 km apart: both are outliers and the city has no map
+    return pd.DataFrame({"Company Name": ["A", "B"], "City": "Split", "Street": "Main Street",
+                         "Latitude": [40.6, 40.78], "Longitude": [-74.0, -74.0]})
+
+def split_geometry(offices):
+    city_geometry = geometry.CityGeometry.from_dataframe(offices, "Split")
+    return {"Split": {"geometry": city_geometry.to_dict(), "inliers": city_geometry.inliers}}
+
+def no_venues():
+    return pd.DataFrame(columns=["Name", "Address", "Category", "Latitude", "Longitude", "City"])
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+def stages(n=4, offset=0):
+    return [
+        Stage("source", source, params={"n": n}),
+        Stage("parity", parity, inputs=["source"]),
+        Stage("total", total, inputs=["parity"], params={"offset": offset}, executor="main"),
+    ]
+
+def run(store, *args, **kwargs):
+    force = kwargs.pop("force", False)
+    return Pipeline(stages(*args, **kwargs), store=store, workers=2, force=force).run()
+
+def statuses(results):
+    return {name: result["status"] for name, result in results.items()}
+
+def test_stage_key():
+    stage = Stage("total", total, inputs=["parity"], params={"offset": 1})
+    key = stage.key({"parity": "a"})
+    assert key == Stage("total", total, inputs=["parity"], params={"offset": 1}).key({"parity": "a"})
+    assert key != stage.key({"parity": "b"})
+    assert key != Stage("total", total, inputs=["parity"], params={"offset": 2}).key({"parity": "a"})
+    assert key != Stage("total", total, inputs=["parity"], params={"offset": 1}, version=2).key({"parity": "a"})
+    assert key != Stage("total", total, inputs=["parity"], params={"offset": 1}, fingerprint=3).key({"parity": "a"})
+
+def test_artifact_store(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    stage = Stage("fetch:Bar", source)
+    assert store.meta(stage, "key") is None
+    content_hash = store.save(stage, "key", {"venues": [1, 2]}, seconds=0.5)
+    assert store.load(stage, "key") == {"venues": [1, 2]}
+    assert store.meta(stage, "key")["hash"] == content_hash
+    assert store.meta(stage, "key")["seconds"] == 0.5
+    # Equal content, equal hash; the stage name is made safe for the file system
+    assert store.save(stage, "other", {"venues": [1, 2]}, seconds=1.0) == content_hash
+    assert os.listdir(tmp_path) == ["fetch_Bar"]
+
+def test_default_store_is_in_the_context_cache(context):
+    assert ArtifactStore().root == os.path.join(context.cache_dir, "pipeline")
+
+def test_cached_stages_are_skipped(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    first = run(store)
+    assert statuses(first) == {"source": "ran", "parity": "ran", "total": "ran"}
+    assert sorted(calls) == ["parity", "source", "total"]
+
+    calls.clear()
+    pipe = Pipeline(stages(), store=store)
+    second = pipe.run()
+    assert statuses(second) == {"source": "cached", "parity": "cached", "total": "cached"}
+    assert calls == []
+    assert {name: result["hash"] for name, result in second.items()} == \
+           {name: result["hash"] for name, result in first.items()}
+    # Artifacts of skipped stages are loaded on demand
+    assert pipe.value("total") == 2
+
+def test_changes_rerun_only_the_stages_they_reach(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    run(store, n=4)
+    calls.clear()
+    # parity of range(6) differs from range(4): everything downstream runs again
+    assert statuses(run(store, n=6)) == {"source": "ran", "parity": "ran", "total": "ran"}
+    calls.clear()
+    run(store, n=4)
+    calls.clear()
+    # A param change only reruns its stage and the stages whose inputs changed
+    assert statuses(run(store, n=4, offset=1)) == {"source": "cached", "parity": "cached", "total": "ran"}
+    assert calls == ["total"]
+
+def test_early_cutoff(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    run(store)
+    calls.clear()
+    # The fingerprint of source changes, it runs again and returns the same artifact: parity is skipped
+    changed = stages()
+    changed[0].fingerprint = "new state"
+    results = Pipeline(changed, store=store).run()
+    assert statuses(results) == {"source": "ran", "parity": "cached", "total": "cached"}
+    assert calls == ["source"]
+
+def test_force(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    run(store)
+    calls.clear()
+    assert statuses(run(store, force=["parity"])) == {"source": "cached", "parity": "ran", "total": "cached"}
+    calls.clear()
+    assert statuses(run(store, force=True)) == {"source": "ran", "parity": "ran", "total": "ran"}
+
+def test_force_by_prefix(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    fetches = [Stage(f"fetch:{name}", source, params={"n": n}) for name, n in (("Bar", 1), ("Club", 2))]
+    Pipeline(fetches + [Stage("other", source, params={"n": 3})], store=store).run()
+    results = Pipeline(fetches + [Stage("other", source, params={"n": 3})], store=store, force=["fetch:"]).run()
+    assert statuses(results) == {"fetch:Bar": "ran", "fetch:Club": "ran", "other": "cached"}
+
+def test_missing_output_file_reruns_the_stage(tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"))
+    path = str(tmp_path / "out.txt")
+    stage_list = stages() + [Stage("write", write_file, inputs=["total"], params={"path": path}, files=True)]
+    Pipeline(stage_list, store=store).run()
+    assert statuses(Pipeline(stage_list, store=store).run())["write"] == "cached"
+    os.remove(path)
+    calls.clear()
+    assert statuses(Pipeline(stage_list, store=store).run())["write"] == "ran"
+    assert calls == ["write"]
+    assert os.path.exists(path)
+
+def test_process_stage(tmp_path):
+    stage_list = [Stage("value", total, params={"values": [1, 2]}), Stage("square", square, inputs=["value"], executor="process")]
+    pipe = Pipeline(stage_list, store=ArtifactStore(str(tmp_path)), workers=1)
+    pipe.run()
+    assert pipe.value("square") == 9
+
+def test_invalid_graphs(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    with pytest.raises(ValueError, match="unknown stages"):
+        Pipeline([Stage("parity", parity, inputs=["source"])], store=store)
+    cycle = [Stage("a", source, after=["b"]), Stage("b", source, after=["a"])]
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline(cycle, store=store).run()
+
+def test_build_stages_declares_a_valid_graph(monkeypatch):
+    # The fingerprint of the offices stage reads MongoDB; the graph itself does not
+    monkeypatch.setattr(pipeline.office_cache, "collection_fingerprint", lambda collection: "fingerprint")
+    monkeypatch.setattr(pipeline.companies_gaming, "get_collection", lambda: None)
+    stage_list = pipeline.build_stages(cities=["A", "B"], categories={"Bar": "bar", "Club": "club"})
+    Pipeline(stage_list, store=ArtifactStore("unused"))
+    names = {stage.name for stage in stage_list}
+    assert {"fetch:Bar", "fetch:Club", "venues:A", "map:B", "charts:counts", "charts:score"} <= names
+    # A change of weights only reaches scoring, the snapshot and the score chart
+    assert [stage.name for stage in stage_list if "scoring" in stage.inputs] == ["snapshot", "charts:score"]
+
+def test_city_without_a_map(tmp_path, capsys):
+    stage_list = [
+        Stage("offices", split_offices),
+        Stage("geometry", split_geometry, inputs=["offices"]),
+        Stage("venues", no_venues),
+        Stage("map", pipeline.render_map, inputs=["geometry", "offices", "venues"],
+              params={"city": "Split", "out_dir": str(tmp_path / "report")}, files=True),
+    ]
+    store = ArtifactStore(str(tmp_path / "store"))
+    pipe = Pipeline(stage_list, store=store)
+    pipe.run()
+    assert pipe.value("map") == []
+    assert "No data available for Split" in capsys.readouterr().out
+    # The empty list of files is a valid cached artifact
+    assert statuses(Pipeline(stage_list, store=store).run())["map"] == "cached"
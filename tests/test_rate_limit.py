@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from src import rate_limit
+from src.rate_limit import QuotaExceeded, RateLimiter
+
+class FakeClock:
+    """
+    Stands in for the time module: the clock only moves when a test advances it, and sleeps are recorded.
+    """
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+    def gmtime(self, seconds=None):
+        return time.gmtime(self.now if seconds is None else seconds)
+
+    def strftime(self, format, t):
+        return time.strftime(format, t)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    def make(rate=2.0, burst=2, **kwargs):
+        return RateLimiter("test", rate, burst=burst, path=str(tmp_path / "rate_limit.sqlite"), **kwargs)
+    return make
+
+def test_burst_then_refill(limiter, clock):
+    bucket = limiter(rate=2.0, burst=2)
+    assert [bucket.acquire() for _ in range(2)] == [0, 0]
+    # An empty bucket reserves the next tokens: callers are spaced at the rate without polling
+    assert [bucket.acquire() for _ in range(2)] == [pytest.approx(0.5), pytest.approx(1.0)]
+    assert clock.sleeps == [pytest.approx(0.5), pytest.approx(1.0)]
+    # The refill is capped at the burst
+    clock.now += 60
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, pytest.approx(0.5)]
+
+def test_bucket_is_shared_through_the_file(limiter):
+    first, second = limiter(rate=1.0, burst=1), limiter(rate=1.0, burst=1)
+    assert first.acquire() == 0
+    assert second.acquire() == pytest.approx(1.0)
+    # Another key has a bucket of its own
+    assert limiter(rate=1.0, burst=1, key="other").acquire() == 0
+
+def test_block_pauses_and_empties_the_bucket(limiter, clock):
+    bucket = limiter(rate=2.0, burst=2)
+    bucket.block(3)
+    # Paused for 3 s, then the bucket starts empty
+    assert bucket.acquire() == pytest.approx(3.5)
+    clock.now += 10
+    bucket.block(1)
+    assert bucket.acquire() == pytest.approx(1.5)
+    usage = bucket.usage()
+    assert usage[["Calls", "Throttled"]].values.tolist() == [[2, 2]]
+    assert bucket.metrics()["throttled"] == 2
+
+def test_daily_quota(limiter, clock):
+    bucket = limiter(rate=100.0, burst=100, key="secret", daily_quota=2)
+    bucket.acquire()
+    bucket.acquire()
+    with pytest.raises(QuotaExceeded):
+        bucket.acquire()
+    assert bucket.metrics()["today"] == {"calls": 2, "throttled": 0, "quota": 2}
+    # The quota is per key and UTC day
+    limiter(rate=100.0, burst=100, key="other", daily_quota=2).acquire()
+    clock.now += 24 * 3600
+    bucket.acquire()
+    usage = bucket.usage()
+    assert usage.groupby("Key")["Calls"].sum().sort_values().tolist() == [1, 3]
+    assert "secret" not in "".join(usage["Key"])  # Only a hash of the key is stored
+
+def test_concurrent_callers_get_distinct_slots(limiter):
+    # BEGIN IMMEDIATE serializes the read-modify-write: no two callers get the same token
+    bucket = limiter(rate=10.0, burst=5)
+    delays = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(10):
+            delay = bucket.acquire()
+            with lock:
+                delays.append(delay)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    expected = [max(i - 4, 0) / 10.0 for i in range(80)]
+    assert sorted(delays) == pytest.approx(expected)
+    assert bucket.metrics()["calls"] == 80
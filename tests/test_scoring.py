@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import config
+from src.scoring import ScoringEngine, normalize
+
+@pytest.fixture
+def counts():
+    return pd.DataFrame({
+        'City': ['San Francisco', 'New York', 'London'],
+        'Schools Count': [50, 50, 40],
+        'Starbucks Count': [30, 45, 10],
+        'Club Count': [12, 20, 25],
+        'Bar Count': [50, 120, 80],
+    })
+
+def test_scores_match_the_weighted_sum_of_max_normalized_counts(counts):
+    engine = ScoringEngine().fit(counts)
+    expected = sum(counts[name] / counts[name].max() * criterion["weight"]
+                   for name, criterion in config.SCORING_CRITERIA.items())
+    np.testing.assert_allclose(engine.scores(), expected)
+    frame = engine.to_frame()
+    assert list(frame['City']) == list(counts.loc[np.argsort(-expected.to_numpy()), 'City'])
+    assert frame['Bar Count'].dtype == counts['Bar Count'].dtype
+
+def test_update_matches_a_refit(counts):
+    engine = ScoringEngine().fit(counts)
+    engine.update('Bar Count', [10, 20, 300])
+    refit = ScoringEngine().fit(counts.assign(**{'Bar Count': [10, 20, 300]}))
+    np.testing.assert_allclose(engine.scores(), refit.scores())
+
+def test_sensitivity_matches_scores(counts):
+    engine = ScoringEngine().fit(counts)
+    weights = engine.random_weights(50)
+    scores, ranks = engine.sensitivity(weights)
+    for i in (0, 17, 49):
+        np.testing.assert_allclose(scores[i], engine.scores(weights[i]))
+        assert list(ranks[i]) == list(np.argsort(np.argsort(-scores[i])) + 1)
+
+@pytest.mark.parametrize("strategy", ["max", "minmax", "zscore", "rank"])
+def test_direction_reverses_the_order(strategy):
+    values = np.array([3.0, 1.0, 2.0, 5.0])
+    up, down = normalize(values, strategy, 1), normalize(values, strategy, -1)
+    assert list(np.argsort(up)) == list(np.argsort(values))
+    assert list(np.argsort(down)) == list(np.argsort(-values))
+
+def test_constant_criteria_score_zero():
+    np.testing.assert_array_equal(normalize(np.zeros(3)), np.zeros(3))
+    np.testing.assert_array_equal(normalize(np.full(3, 7.0), "minmax"), np.zeros(3))
+    with pytest.raises(ValueError):
+        normalize(np.ones(3), "median")
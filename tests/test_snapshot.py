@@ -0,0 +1,82 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from src import geometry, snapshot
+from src.snapshot import Snapshot
+
+def make_snapshot(bars=(10, 20), created="2026-01-01T00:00:00Z"):
+    offices = pd.DataFrame({"Company Name": ["A", "B", "C"], "City": ["X", "X", "Y"], "Street": ["1 St", None, "3 St"],
+                            "Latitude": [40.70, 40.71, 51.50], "Longitude": [-74.0, -74.01, -0.12]})
+    cities = {}
+    for city in ("X", "Y"):
+        city_geometry = geometry.CityGeometry.from_dataframe(offices, city)
+        cities[city] = city_geometry.to_dict()
+        offices.loc[offices['City'] == city, "Inlier"] = city_geometry.inliers
+    scores = pd.DataFrame({"City": ["X", "Y"], "Bar Count": list(bars), "Weighted Score": [0.5, 1.0]})
+    venues = pd.DataFrame({"Name": ["Bar 1"], "Category": ["Bar"], "Latitude": [40.7], "Longitude": [-74.0], "City": ["X"]})
+    return Snapshot(scores, cities, offices.astype({"Inlier": bool}), venues, created=created)
+
+def test_round_trip(context):
+    saved = make_snapshot()
+    path = saved.save()
+    assert os.path.dirname(path) == os.path.join(context.cache_dir, "snapshots")
+    assert os.path.basename(path) == saved.version
+
+    loaded = Snapshot.load(path)
+    assert (loaded.version, loaded.created, loaded.path) == (saved.version, saved.created, path)
+    assert loaded.criteria == saved.criteria and loaded.cities == json.loads(json.dumps(saved.cities))
+    for name in ("scores", "offices", "venues"):
+        pd.testing.assert_frame_equal(getattr(loaded, name), getattr(saved, name), check_dtype=False)
+    # Geometries come back without recomputation, with the inlier mask of the offices
+    assert loaded.city_geometry("X").search_area == saved.city_geometry("X").search_area
+    assert loaded.city_geometry("X").inliers.tolist() == [True, True]
+    assert loaded.city_geometry("Z") is None
+
+def test_versions():
+    assert make_snapshot().version == make_snapshot().version
+    assert make_snapshot().version.startswith("20260101T000000Z-")
+    assert make_snapshot(bars=(10, 21)).version != make_snapshot().version
+    assert make_snapshot(created="2026-01-02T00:00:00Z").version != make_snapshot().version
+
+def test_latest(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        snapshot.latest(str(tmp_path))
+    first = make_snapshot()
+    first.save(str(tmp_path))
+    second = make_snapshot(bars=(1, 2))
+    second.save(str(tmp_path))
+    assert snapshot.latest(str(tmp_path)).version == second.version
+    # Saving an existing version again only moves the pointer back to it
+    first.save(str(tmp_path))
+    assert snapshot.latest(str(tmp_path)).version == first.version
+    assert sorted(name for name in os.listdir(tmp_path) if not name.startswith(".")) == \
+           sorted(["LATEST", first.version, second.version])
+
+def test_unsupported_schema(tmp_path):
+    path = make_snapshot().save(str(tmp_path))
+    with open(os.path.join(path, "metrics.json"), encoding="utf-8") as f:
+        metrics = json.load(f)
+    metrics["schema"] = snapshot.SCHEMA_VERSION + 1
+    with open(os.path.join(path, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(metrics, f)
+    with pytest.raises(ValueError, match="schema"):
+        Snapshot.load(path)
+
+def test_get_snapshot_does_not_create_one(context, monkeypatch):
+    monkeypatch.setattr(snapshot, "create_snapshot", lambda: pytest.fail("create_snapshot was called"))
+    with pytest.raises(FileNotFoundError, match="python -m src.pipeline"):
+        snapshot.get_snapshot()
+    saved = make_snapshot()
+    saved.save()
+    snapshot.get_snapshot.cache_clear()
+    assert snapshot.get_snapshot().version == saved.version
+
+def test_create_snapshot_without_located_cities(context, monkeypatch):
+    monkeypatch.setattr(snapshot.companies_gaming, "city_geometry", lambda city: None)
+    monkeypatch.setattr(snapshot.foursquare, "weighted_count_merged_df",
+                        lambda **kwargs: pytest.fail("Foursquare was queried"))
+    with pytest.raises(ValueError, match="X, Y"):
+        snapshot.create_snapshot(["X", "Y"])
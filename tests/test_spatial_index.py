@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import geometry
+from src.spatial_index import SpatialIndex
+
+def points(n, lat0, lon0, spread, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = np.clip(lat0 + rng.normal(0, spread, n), -90, 90)
+    lon = (lon0 + rng.normal(0, spread, n) + 180) % 360 - 180
+    return lat, lon
+
+# Around a city, across the antimeridian and near a pole
+@pytest.mark.parametrize("lat0, lon0, spread", [(40.71, -74.0, 0.05), (0.0, 179.99, 0.05), (89.9, 0.0, 0.05)])
+def test_within_radius_matches_brute_force(lat0, lon0, spread):
+    lat, lon = points(2000, lat0, lon0, spread)
+    index = SpatialIndex(lat, lon, cell_size=0.01)
+    q_lat, q_lon = points(20, lat0, lon0, spread, seed=1)
+    found, distances = index.within_radius(q_lat, q_lon, 2500, return_distance=True)
+    for i in range(len(q_lat)):
+        d = geometry.haversine(q_lat[i], q_lon[i], lat, lon)
+        assert sorted(found[i]) == sorted(np.flatnonzero(d <= 2500))
+        assert np.all(np.diff(distances[i]) >= 0)
+
+@pytest.mark.parametrize("lat0, lon0", [(40.71, -74.0), (0.0, 179.99)])
+def test_k_nearest_matches_brute_force(lat0, lon0):
+    lat, lon = points(3000, lat0, lon0, 0.1)
+    index = SpatialIndex(lat, lon, cell_size=0.01)
+    q_lat, q_lon = points(20, lat0, lon0, 0.2, seed=2)
+    distances, indices = index.k_nearest(q_lat, q_lon, 7)
+    for i in range(len(q_lat)):
+        d = geometry.haversine(q_lat[i], q_lon[i], lat, lon)
+        np.testing.assert_allclose(distances[i], np.sort(d)[:7])
+        np.testing.assert_allclose(d[indices[i]], distances[i])
+
+def test_k_nearest_pads_small_indexes():
+    index = SpatialIndex([40.7, 40.8], [-74.0, -74.1])
+    distances, indices = index.k_nearest(40.7, -74.0, 4)
+    assert list(indices[0, 2:]) == [-1, -1]
+    assert np.isinf(distances[0, 2:]).all()
+    assert indices[0, 0] == 0
+
+def test_rows_maps_back_to_the_dataframe():
+    df = pd.DataFrame({'Company Name': ['a', 'b', 'c'], 'Latitude': [40.70, 40.71, 41.5],
+                       'Longitude': [-74.0, -74.0, -74.0]}, index=[10, 11, 12])
+    index = SpatialIndex.from_dataframe(df)
+    found = index.within_radius(40.70, -74.0, 2000)[0]
+    assert list(index.rows(found)['Company Name']) == ['a', 'b']
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from src import config
+from src.geometry import haversine
+from src.suitability import SuitabilitySurface
+
+CENTER = (40.7128, -74.0060)
+
+def venues(n, seed):
+    rng = np.random.default_rng(seed)
+    return CENTER[0] + rng.normal(0, 0.01, n), CENTER[1] + rng.normal(0, 0.01, n)
+
+def test_density_matches_the_kernel_sum():
+    surface = SuitabilitySurface(*CENTER, 2000, cell_size=100, bandwidth=200)
+    lat, lon = venues(500, 0)
+    density = surface.density(lat, lon)
+
+    # Brute force over the binned points: a Gaussian of the distance between cell centers
+    counts = surface.rasterize(lat, lon)
+    half = len(surface.kernel) // 2
+    rows, cols = np.nonzero(counts)
+    rng = np.random.default_rng(1)
+    for row, col in rng.integers(0, surface.size, (30, 2)):
+        dr, dc = rows - half - row, cols - half - col
+        near = (np.abs(dr) <= half) & (np.abs(dc) <= half)
+        d2 = ((dr ** 2 + dc ** 2) * surface.cell_size ** 2)[near]
+        expected = np.sum(counts[rows, cols][near] * np.exp(-0.5 * d2 / surface.bandwidth ** 2))
+        assert density[row, col] == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+def test_scores_cover_the_circle_only():
+    surface = SuitabilitySurface(*CENTER, 1500, cell_size=100, bandwidth=200)
+    for seed, name in enumerate(config.SUITABILITY_CRITERIA):
+        surface.add_layer(name, *venues(300, seed))
+    surface.evaluate()
+    assert np.isnan(surface.score[~surface.mask]).all()
+    assert not np.isnan(surface.score[surface.mask]).any()
+    frame = surface.to_frame()
+    assert haversine(*CENTER, frame['Latitude'], frame['Longitude']).max() <= 1500 + 100
+
+def test_top_cells_are_apart_and_best_first():
+    surface = SuitabilitySurface(*CENTER, 3000, cell_size=100, bandwidth=300)
+    for seed, name in enumerate(config.SUITABILITY_CRITERIA):
+        surface.add_layer(name, *venues(400, seed))
+    sites = surface.top_cells(5, min_distance=500)
+    assert len(sites) == 5
+    assert sites['Suitability'].is_monotonic_decreasing
+    assert sites['Suitability'].iloc[0] == np.nanmax(surface.score)
+    for i in range(5):
+        d = haversine(sites['Latitude'][i], sites['Longitude'][i], sites['Latitude'], sites['Longitude'])
+        assert (np.delete(d, i) > 500 - 100).all()
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from src import geometry
+from src import tiling
+
+@pytest.mark.parametrize("lat, radius", [(40.71, 4000), (51.5, 500), (-33.9, 100)])
+def test_split_tile_covers_the_circle(lat, radius):
+    lon = -74.0
+    children = tiling.split_tile(lat, lon, radius)
+    assert len(children) == 7
+    assert all(child_radius < radius for _, _, child_radius in children)
+
+    # Random points of the parent circle, denser at its edge where the children barely overlap
+    rng = np.random.default_rng(0)
+    distance = radius * np.sqrt(rng.random(20000)) ** 0.25
+    angle = rng.random(20000) * 2 * np.pi
+    p_lat = lat + np.degrees(distance * np.cos(angle) / geometry.EARTH_RADIUS)
+    p_lon = lon + np.degrees(distance * np.sin(angle) / (geometry.EARTH_RADIUS * np.cos(np.radians(lat))))
+    inside = geometry.haversine(lat, lon, p_lat, p_lon) <= radius
+    covered = np.zeros(len(p_lat), dtype=bool)
+    for c_lat, c_lon, c_radius in children:
+        covered |= geometry.haversine(c_lat, c_lon, p_lat, p_lon) <= c_radius
+    assert covered[inside].all()
@@ -0,0 +1,60 @@
+import folium
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import geometry, visualization
+from src.snapshot import Snapshot
+
+def offices(lat, lon, city="Split"):
+    return pd.DataFrame({"City": city, "Company Name": [f"Company {i}" for i in range(len(lat))],
+                         "Street": "Main Street", "Latitude": lat, "Longitude": lon})
+
+def test_map_of_city_without_inliers(capsys):
+    df = offices([40.6, 40.78], [-74.0, -74.0])
+    assert visualization.create_city_map(df, "Split") is None
+    assert "No data available for Split" in capsys.readouterr().out
+
+def test_map_of_city():
+    df = offices([40.70, 40.71, 40.72], [-74.0, -74.01, -74.0])
+    assert visualization.create_city_map(df, "Split") is not None
+
+def snapshot(n_offices, n_venues):
+    # Offices and venues of every category scattered around one point
+    rng = np.random.default_rng(0)
+    df = offices(40.71 + rng.normal(0, 0.005, n_offices), -74.0 + rng.normal(0, 0.005, n_offices))
+    city_geometry = geometry.CityGeometry.from_dataframe(df, "Split")
+    categories = np.repeat(["Starbucks", "Bar", "Club", "Schools"], n_venues)
+    venues = pd.DataFrame({"City": "Split", "Category": categories, "Name": "Venue", "Address": "Main Street",
+                           "Latitude": 40.71 + rng.normal(0, 0.005, len(categories)),
+                           "Longitude": -74.0 + rng.normal(0, 0.005, len(categories))})
+    return Snapshot(None, {"Split": city_geometry.to_dict()}, df.assign(Inlier=city_geometry.inliers), venues,
+                    version="test")
+
+def count_markers(element):
+    return isinstance(element, folium.Marker) + sum(count_markers(child) for child in element._children.values())
+
+@pytest.mark.parametrize("n_offices, n_venues, clustered", [(100, 100, False), (600, 600, True)])
+def test_marker_cap_applies_to_the_whole_map(n_offices, n_venues, clustered):
+    # 600 points per layer fit the cap one layer at a time, but not the 3000 of the map together
+    map = visualization.build_map(city_name="Split", snapshot=snapshot(n_offices, n_venues))
+    markers = count_markers(map)
+    assert markers <= visualization.MAX_MARKERS + 4  # Farthest pair, midpoint and search circle
+    assert (markers == 4) == clustered
+
+def test_save_charts_ignores_other_open_figures(tmp_path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    scores = pd.DataFrame({"City": ["A", "B"], "Schools Count": [1, 2], "Starbucks Count": [3, 4],
+                           "Club Count": [5, 6], "Bar Count": [7, 8], "Weighted Score": [0.4, 0.6]})
+    other = plt.figure()
+    try:
+        files = visualization.save_charts(str(tmp_path), snapshot=Snapshot(scores, {}, None, None, version="test"),
+                                          figures=[3])
+        assert files == [str(tmp_path / "chart_3.png")]
+        # The chart was saved from its own figure, which is closed; the open one is untouched
+        assert plt.get_fignums() == [other.number]
+    finally:
+        plt.close(other)